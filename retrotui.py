@@ -8,10 +8,43 @@ import curses
 import sys
 import time
 import os
+import re
+import stat
+import errno
+import hashlib
+import mmap
+import fnmatch
+import pwd
+import grp
 import locale
 import termios
 import shutil
 import subprocess
+import select
+import signal
+import heapq
+import json
+import argparse
+import tempfile
+import tracemalloc
+import threading
+import struct
+import tarfile
+import zipfile
+import zlib
+import ctypes
+import ctypes.util
+from array import array, typecodes
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from itertools import accumulate, count, groupby, islice
+
+try:
+    from lzma import LZMAError
+except ImportError:     # Python built without liblzma: no .tar.xz either
+    LZMAError = OSError
 
 # Ensure UTF-8
 locale.setlocale(locale.LC_ALL, '')
@@ -141,6 +174,21 @@ def safe_addstr(win, y, x, text, attr=0):
         pass
 
 
+def safe_vline(win, y, x, ch, n, attr=0):
+    """Draw ch on n consecutive rows of column x, clipped like safe_addstr."""
+    h, w = win.getmaxyx()
+    if y < 0:
+        n += y
+        y = 0
+    n = min(n, h - y)
+    if n <= 0 or x < 0 or x >= w - 1:
+        return
+    try:
+        win.vline(y, x, ch, n, attr)
+    except curses.error:
+        pass
+
+
 def draw_box(win, y, x, h, w, attr=0, double=True):
     """Draw a box with double or single line borders."""
     if double:
@@ -149,12 +197,231 @@ def draw_box(win, y, x, h, w, attr=0, double=True):
         tl, tr, bl, br, hz, vt = SB_TL, SB_TR, SB_BL, SB_BR, SB_H, SB_V
 
     safe_addstr(win, y, x, tl + hz * (w - 2) + tr, attr)
-    for i in range(1, h - 1):
-        safe_addstr(win, y + i, x, vt, attr)
-        safe_addstr(win, y + i, x + w - 1, vt, attr)
+    safe_vline(win, y + 1, x, vt, h - 2, attr)
+    safe_vline(win, y + 1, x + w - 1, vt, h - 2, attr)
     safe_addstr(win, y + h - 1, x, bl + hz * (w - 2) + br, attr)
 
 
+def rect_intersect(a, b):
+    """Intersect two (x, y, w, h) rects. Returns the overlap or None."""
+    x0 = max(a[0], b[0])
+    y0 = max(a[1], b[1])
+    x1 = min(a[0] + a[2], b[0] + b[2])
+    y1 = min(a[1] + a[3], b[1] + b[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def rect_union(a, b):
+    """Bounding rect of two (x, y, w, h) rects."""
+    x0 = min(a[0], b[0])
+    y0 = min(a[1], b[1])
+    x1 = max(a[0] + a[2], b[0] + b[2])
+    y1 = max(a[1] + a[3], b[1] + b[3])
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def rect_subtract(a, b):
+    """Parts of rect a not covered by rect b, as a list of up to 4 rects."""
+    inter = rect_intersect(a, b)
+    if inter is None:
+        return [a]
+    ax, ay, aw, ah = a
+    ix, iy, iw, ih = inter
+    out = []
+    if iy > ay:                              # Band above
+        out.append((ax, ay, aw, iy - ay))
+    if iy + ih < ay + ah:                    # Band below
+        out.append((ax, iy + ih, aw, ay + ah - iy - ih))
+    if ix > ax:                              # Left of overlap
+        out.append((ax, iy, ix - ax, ih))
+    if ix + iw < ax + aw:                    # Right of overlap
+        out.append((ix + iw, iy, ax + aw - ix - iw, ih))
+    return out
+
+
+class ClipView:
+    """Stand-in for a curses window that only lets writes inside a rect through.
+
+    Drawing code keeps calling safe_addstr(); the compositor hands it a
+    ClipView so repainting a layer never spills outside the damaged region."""
+
+    def __init__(self, win, rect):
+        self.win = win
+        self.rect = rect
+
+    def getmaxyx(self):
+        return self.win.getmaxyx()
+
+    def addnstr(self, y, x, text, n, attr=0):
+        cx, cy, cw, ch = self.rect
+        if y < cy or y >= cy + ch:
+            return
+        if x < cx:
+            skip = cx - x
+            text = text[skip:]
+            n -= skip
+            x = cx
+        n = min(n, cx + cw - x, len(text))
+        if n > 0:
+            self.win.addnstr(y, x, text, n, attr)
+
+    def vline(self, y, x, ch, n, attr=0):
+        rx, ry, rw, rh = self.rect
+        if x < rx or x >= rx + rw:
+            return
+        y0 = max(y, ry)
+        n = min(y + n, ry + rh) - y0
+        if n > 0:
+            self.win.vline(y0, x, ch, n, attr)
+
+
+# Array typecode for one character per cell ('u' is deprecated since 3.13)
+CELL_TYPECODE = 'w' if 'w' in typecodes else 'u'
+# Right half of a double-width character (never drawn itself)
+WIDE_CONT = '\0'
+# Characters the terminal draws two cells wide (CJK, emoji); approximate wcwidth
+WIDE_CHARS = re.compile(
+    '[\u1100-\u115f\u231a\u231b\u2329\u232a\u23e9-\u23ec\u23f0\u23f3\u25fd\u25fe'
+    '\u2614\u2615\u2648-\u2653\u267f\u2693\u26a1\u26aa\u26ab\u26bd\u26be\u26c4\u26c5'
+    '\u26ce\u26d4\u26ea\u26f2-\u26f5\u26fa\u26fd\u2705\u270a\u270b\u2728\u274c\u274e'
+    '\u2753-\u2755\u2757\u2795-\u2797\u27b0\u27bf\u2b1b\u2b1c\u2b50\u2b55'
+    '\u2e80-\u303e\u3041-\u33ff\u3400-\u4dbf\u4e00-\u9fff\ua000-\ua4cf\ua960-\ua97f'
+    '\uac00-\ud7a3\uf900-\ufaff\ufe10-\ufe19\ufe30-\ufe6f\uff00-\uff60\uffe0-\uffe6'
+    '\U0001f004\U0001f0cf\U0001f18e\U0001f191-\U0001f19a\U0001f200-\U0001f251'
+    '\U0001f300-\U0001f64f\U0001f680-\U0001f6ff\U0001f7e0-\U0001f7eb'
+    '\U0001f90c-\U0001f9ff\U0001fa70-\U0001faff\U00020000-\U0003fffd]')
+
+
+class FrameBuffer:
+    """In-memory grid of characters and attributes with the subset of the
+    curses window API the drawing code uses (getmaxyx, addnstr, vline,
+    erase, overwrite).
+
+    Each row is a pair of compact arrays, so writes and blits are slice
+    assignments. flush() pushes the rows that differ from another buffer
+    to a real curses window, one addnstr per changed same-attribute run.
+    (ox, oy) is the screen position of cell (0, 0): drawing code written in
+    screen coordinates can render straight into a window's backing pad."""
+
+    def __init__(self, h, w):
+        self.h = max(1, h)
+        self.w = max(1, w)
+        self.ox = 0
+        self.oy = 0
+        self._blank = array(CELL_TYPECODE, ' ' * self.w)
+        self._zero = array('I', bytes(4 * self.w))
+        self.chars = [array(CELL_TYPECODE, self._blank) for _ in range(self.h)]
+        self.attrs = [array('I', self._zero) for _ in range(self.h)]
+
+    def getmaxyx(self):
+        return (self.oy + self.h, self.ox + self.w)
+
+    def erase(self):
+        for row in self.chars:
+            row[:] = self._blank
+        for row in self.attrs:
+            row[:] = self._zero
+
+    def addnstr(self, y, x, text, n, attr=0):
+        y -= self.oy
+        x -= self.ox
+        w = self.w
+        if y < 0 or y >= self.h or x >= w:
+            return
+        if x < 0:
+            text = text[-x:]
+            n += x
+            x = 0
+        if n < len(text):
+            text = text[:n]
+        if not text.isascii() and WIDE_CHARS.search(text):
+            text = WIDE_CHARS.sub(lambda m: m.group() + WIDE_CONT, text)
+        n = len(text)
+        if x + n > w:
+            n = w - x
+            text = text[:n - 1] + (' ' if text[n] == WIDE_CONT else text[n - 1])
+        if n <= 0:
+            return
+        row = self.chars[y]
+        end = x + n
+        if x and row[x] == WIDE_CONT:
+            row[x - 1] = ' '        # Left neighbour loses its right half
+        row[x:end] = array(CELL_TYPECODE, text)
+        self.attrs[y][x:end] = array('I', (attr,)) * n
+        if end < w and row[end] == WIDE_CONT:
+            row[end] = ' '          # Its left half was overwritten
+
+    def vline(self, y, x, ch, n, attr=0):
+        y -= self.oy
+        x -= self.ox
+        if x < 0 or x >= self.w:
+            return
+        for row in range(max(y, 0), min(y + n, self.h)):
+            chars = self.chars[row]
+            if x and chars[x] == WIDE_CONT:
+                chars[x - 1] = ' '
+            chars[x] = ch
+            self.attrs[row][x] = attr
+            if x + 1 < self.w and chars[x + 1] == WIDE_CONT:
+                chars[x + 1] = ' '
+
+    def overwrite(self, dest, sminrow, smincol, dminrow, dmincol, dmaxrow, dmaxcol):
+        """Copy a rectangle into another FrameBuffer, like curses overwrite()."""
+        rows = min(dmaxrow - dminrow + 1, self.h - sminrow, dest.h - dminrow)
+        cols = min(dmaxcol - dmincol + 1, self.w - smincol, dest.w - dmincol)
+        if rows <= 0 or cols <= 0 or min(sminrow, smincol, dminrow, dmincol) < 0:
+            return
+        send = smincol + cols
+        dend = dmincol + cols
+        for i in range(rows):
+            src = self.chars[sminrow + i]
+            row = dest.chars[dminrow + i]
+            if dmincol and row[dmincol] == WIDE_CONT:
+                row[dmincol - 1] = ' '
+            row[dmincol:dend] = src[smincol:send]
+            dest.attrs[dminrow + i][dmincol:dend] = self.attrs[sminrow + i][smincol:send]
+            # Wide chars cut in half by the rect edges
+            if row[dmincol] == WIDE_CONT:
+                row[dmincol] = ' '
+            if send < self.w and src[send] == WIDE_CONT:
+                row[dend - 1] = ' '
+            if dend < dest.w and row[dend] == WIDE_CONT:
+                row[dend] = ' '
+
+    def flush(self, win, front):
+        """Write what differs from front (a copy of what win holds) to win,
+        then bring front up to date. Returns the number of addnstr calls."""
+        calls = 0
+        for y in range(min(self.h, front.h)):
+            chars, attrs = self.chars[y], self.attrs[y]
+            fchars, fattrs = front.chars[y], front.attrs[y]
+            if chars == fchars and attrs == fattrs:
+                continue
+            x = 0
+            for attr, run in groupby(attrs):
+                end = x + len(list(run))
+                if chars[x:end] != fchars[x:end] or attrs[x:end] != fattrs[x:end]:
+                    text = chars[x:end].tounicode()
+                    if WIDE_CONT in text:
+                        text = text.replace(WIDE_CONT, '')
+                    try:
+                        win.addnstr(y, x, text, len(text), attr)
+                    except curses.error:
+                        pass  # Bottom-right cell: written, but the cursor can't advance
+                    calls += 1
+                x = end
+            fchars[:] = chars
+            fattrs[:] = attrs
+        return calls
+
+
+def new_pad(h, w):
+    """Create an off-screen backing store of h rows by w columns."""
+    return FrameBuffer(h, w)
+
+
 def check_unicode_support():
     """Check if terminal supports Unicode."""
     try:
@@ -198,6 +465,32 @@ class Window:
         self.resize_edge = None
         # Optional per-window menu bar (set by subclasses)
         self.window_menu = None
+        # Bumped on content edits so the compositor knows to repaint
+        self._revision = 0
+        # Off-screen copy of frame + body (see backing_pad)
+        self._pad = None
+        self._pad_key = None
+
+    def invalidate(self):
+        """Mark window content as changed (damages its rect next frame)."""
+        self._revision += 1
+
+    def close(self):
+        """Called once when the window is closed (stop background work)."""
+
+    def render_state(self):
+        """Snapshot of everything besides geometry that affects how the window looks."""
+        menu = self.window_menu
+        menu_state = (menu.active, menu.selected_menu, menu.selected_item) if menu else None
+        return (self.title, self.active, self.maximized, self.scroll_offset,
+                self._revision, menu_state)
+
+    def screen_rects(self):
+        """Screen areas painted by draw(): the frame plus any open dropdown."""
+        rects = [(self.x, self.y, self.w, self.h)]
+        if self.window_menu and self.window_menu.active:
+            rects.append(self.window_menu.get_dropdown_rect(self.x, self.y, self.w))
+        return rects
 
     def close_button_pos(self):
         """Return (x, y) of the close button."""
@@ -357,19 +650,57 @@ class Window:
             sb_x = self.x + self.w - 2
             total = len(self.content)
             thumb_pos = int(self.scroll_offset / max(1, total - bh) * (bh - 1))
-            for i in range(bh):
-                ch = '█' if i == thumb_pos else '░'
-                safe_addstr(stdscr, by + i, sb_x, ch, curses.color_pair(C_SCROLLBAR))
+            safe_vline(stdscr, by, sb_x, '░', bh, curses.color_pair(C_SCROLLBAR))
+            safe_addstr(stdscr, by + thumb_pos, sb_x, '█', curses.color_pair(C_SCROLLBAR))
 
-    def draw(self, stdscr):
-        """Draw the window."""
-        if not self.visible:
-            return
+    def draw_contents(self, stdscr):
+        """Draw frame and body (everything that is cached in the pad)."""
         body_attr = self.draw_frame(stdscr)
         self.draw_body(stdscr, body_attr)
+
+    def draw_overlays(self, stdscr):
+        """Draw parts that may spill outside the window rect (menu dropdown)."""
         if self.window_menu:
             self.window_menu.draw_dropdown(stdscr, self.x, self.y, self.w)
 
+    def draw(self, stdscr):
+        """Draw the window."""
+        if not self.visible:
+            return
+        self.draw_contents(stdscr)
+        self.draw_overlays(stdscr)
+
+    def backing_pad(self):
+        """Frame + body rendered into an off-screen pad. Only re-rendered when
+        the size or render_state() changes, so moving the window is a blit."""
+        key = (self.w, self.h, self.render_state())
+        if self._pad is not None and self._pad_key == key:
+            return self._pad
+        if self._pad is None or self._pad_key[:2] != key[:2]:
+            # One spare column: safe_addstr never writes the last one
+            self._pad = new_pad(self.h, self.w + 1)
+        else:
+            self._pad.erase()
+        self._pad.ox, self._pad.oy = self.x, self.y
+        self.draw_contents(self._pad)
+        self._pad_key = key
+        return self._pad
+
+    def paint(self, scr, clip):
+        """Compositor painter: blit the cached pad, then draw overlays on top."""
+        if not self.visible:
+            return
+        area = rect_intersect(clip, (self.x, self.y, self.w, self.h))
+        if area:
+            x, y, w, h = area
+            try:
+                self.backing_pad().overwrite(scr, y - self.y, x - self.x,
+                                             y, x, y + h - 1, x + w - 1)
+            except curses.error:
+                pass
+        if self.window_menu and self.window_menu.active:
+            self.draw_overlays(ClipView(scr, clip))
+
     def scroll_up(self):
         if self.scroll_offset > 0:
             self.scroll_offset -= 1
@@ -394,6 +725,7 @@ class Menu:
                 ('New Window',    'new_window'),
                 ('Notepad',       'notepad'),
                 ('File Manager',  'filemanager'),
+                ('Find Files',    'find'),
                 ('ASCII Video',   'asciivideo'),
                 ('Terminal',      'terminal'),
                 ('─────────────', None),
@@ -616,6 +948,18 @@ class WindowMenu:
             else:
                 safe_addstr(stdscr, y + 1 + i, x, f' {label.ljust(dropdown_w - 2)} ', attr)
 
+    def get_dropdown_rect(self, win_x, win_y, win_w):
+        """Return (x, y, w, h) of the active dropdown area, or None."""
+        if not self.active:
+            return None
+        items = self.items[self.menu_names[self.selected_menu]]
+        x = self.get_menu_x_positions(win_x)[self.selected_menu]
+        max_item_len = max(len(item[0]) for item in items)
+        dropdown_w = max_item_len + 4
+        if x - 1 + dropdown_w + 2 > win_x + win_w:
+            x = max(win_x + 2, win_x + win_w - dropdown_w - 2)
+        return (x - 1, self.menu_bar_row(win_y) + 1, dropdown_w + 2, len(items) + 2)
+
     def on_menu_bar(self, mx, my, win_x, win_y, win_w):
         """Check if click is on the menu bar row within window bounds."""
         return (my == self.menu_bar_row(win_y) and win_x + 1 <= mx < win_x + win_w - 1)
@@ -769,6 +1113,16 @@ class Dialog:
         self._dialog_x = 0
         self._dialog_y = 0
 
+    def screen_rects(self, max_w, max_h):
+        """Screen areas painted by draw(): dialog body plus its drop shadow."""
+        x = (max_w - self.width) // 2
+        y = (max_h - self.height) // 2
+        return [
+            (x, y, self.width, self.height),
+            (x + self.width, y + 1, 2, self.height),   # Shadow, right strip
+            (x + 2, y + self.height, self.width, 1),   # Shadow, bottom strip
+        ]
+
     def draw(self, stdscr):
         max_h, max_w = stdscr.getmaxyx()
         x = (max_w - self.width) // 2
@@ -847,231 +1201,4376 @@ class Dialog:
 # File Entry
 # ═══════════════════════════════════════════════════════════
 
+def format_size(size):
+    """Human-readable size: 512B, 3.4K, 12.0M."""
+    if size > 1048576:
+        return f'{size / 1048576:.1f}M'
+    elif size > 1024:
+        return f'{size / 1024:.1f}K'
+    else:
+        return f'{size}B'
+
+
+def format_entry(name, is_dir, size=0):
+    """One File Manager row."""
+    if name == '..':
+        return '  📁 ..'
+    elif is_dir:
+        if size:  # Measured (see DiskUsage)
+            return f'  📁 {name + "/":<30} {format_size(size):>8}'
+        return f'  📁 {name}/'
+    else:
+        return f'  📄 {name:<30} {format_size(size):>8}'
+
+
 class FileEntry:
     """Represents a file or directory entry in the file manager."""
-    __slots__ = ('name', 'is_dir', 'full_path', 'size', 'display_text')
+    __slots__ = ('name', 'is_dir', 'full_path', 'size')
 
     def __init__(self, name, is_dir, full_path, size=0):
         self.name = name
         self.is_dir = is_dir
         self.full_path = full_path
         self.size = size
-        if name == '..':
-            self.display_text = '  📁 ..'
-        elif is_dir:
-            self.display_text = f'  📁 {name}/'
-        else:
-            self.display_text = f'  📄 {name:<30} {self._format_size():>8}'
 
-    def _format_size(self):
-        if self.size > 1048576:
-            return f'{self.size / 1048576:.1f}M'
-        elif self.size > 1024:
-            return f'{self.size / 1024:.1f}K'
-        else:
-            return f'{self.size}B'
+    @property
+    def display_text(self):
+        return format_entry(self.name, self.is_dir, self.size)
 
 
-# ═══════════════════════════════════════════════════════════
-# File Manager Window
-# ═══════════════════════════════════════════════════════════
+@lru_cache(maxsize=4096)
+def user_name(uid):
+    """Login name of uid, or the number if it has none. Cached: a listing
+    has few distinct owners, and each lookup may go through NSS."""
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
 
-class FileManagerWindow(Window):
-    """Interactive file manager window with directory navigation."""
 
-    def __init__(self, x, y, w, h, start_path=None):
-        super().__init__('File Manager', x, y, w, h, content=[])
-        self.current_path = os.path.realpath(start_path or os.path.expanduser('~'))
-        self.entries = []           # List[FileEntry]
-        self.selected_index = 0
-        self.show_hidden = False
-        self.error_message = None
-        self.window_menu = WindowMenu({
-            'File': [
-                ('Open       Enter', 'fm_open'),
-                ('Parent Dir  Bksp', 'fm_parent'),
-                ('─────────────',    None),
-                ('Close',            'fm_close'),
-            ],
-            'View': [
-                ('Hidden Files   H', 'fm_toggle_hidden'),
-                ('Refresh',          'fm_refresh'),
-            ],
-        })
-        self.h = max(self.h, 8)
-        self._rebuild_content()
+@lru_cache(maxsize=4096)
+def group_name(gid):
+    """Name of group gid, or the number if it has none (cached)."""
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return str(gid)
+
+
+class EntryDetails:
+    """What the detailed view shows of an entry, from one lstat()."""
+    __slots__ = ('mode', 'uid', 'gid', 'size', 'mtime', 'target')
+
+    def __init__(self, st, target=None):
+        self.mode = st.st_mode
+        self.uid = st.st_uid
+        self.gid = st.st_gid
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.target = target    # Where a symlink points
+
+    @classmethod
+    def of(cls, path):
+        """Details of path (a symlink itself, not its target), or None if
+        it cannot be stat'ed."""
+        try:
+            st = os.stat(path, follow_symlinks=False)
+            target = os.readlink(path) if stat.S_ISLNK(st.st_mode) else None
+        except OSError:
+            return None
+        return cls(st, target)
 
-    def _header_lines(self):
-        """Number of non-entry header lines at top of content."""
-        return 2  # path line + separator line
 
-    def _entry_to_content_index(self, entry_idx):
-        """Convert entry index to content list index."""
-        return self._header_lines() + entry_idx
+def format_details(name, is_dir, details, size=0):
+    """One File Manager row in the detailed view, ls -l style:
+    permissions, owner, group, size, modification time, name. A
+    directory's size is shown only when given (its measured usage)."""
+    icon = '📁' if is_dir else '📄'
+    if name == '..':
+        return f'  {icon} ..'
+    if is_dir:
+        name += '/'
+    if details is None:
+        return f'  {icon} {"?" * 10} {"?":<8} {"?":<8} {"":>8} {"":16} {name}'
+    size = (format_size(size) if size else '') if is_dir else format_size(details.size)
+    when = time.strftime('%Y-%m-%d %H:%M', time.localtime(details.mtime))
+    text = (f'  {icon} {stat.filemode(details.mode)} {user_name(details.uid):<8} '
+            f'{group_name(details.gid):<8} {size:>8} {when} {name}')
+    if details.target is not None:
+        text += f' -> {details.target}'
+    return text
 
-    def _content_to_entry_index(self, content_idx):
-        """Convert content list index to entry index, or -1 if on header."""
-        idx = content_idx - self._header_lines()
-        if 0 <= idx < len(self.entries):
-            return idx
-        return -1
 
-    def _rebuild_content(self):
-        """Scan current directory and rebuild content + entries lists."""
-        self.entries = []
-        self.content = []
-        self.error_message = None
+_DIGIT_RUNS = re.compile(r'(\d+)')
+
+
+def natural_key(name):
+    """Sort key that compares digit runs by value: 'img9' < 'img10'."""
+    parts = _DIGIT_RUNS.split(name.lower())
+    parts[1::2] = map(int, parts[1::2])
+    return tuple(parts)
+
 
-        # Header: path bar + separator
-        self.content.append(f' 📂 {self.current_path}')
-        self.content.append(' ' + '─' * (self.w - 4))
+def file_extension(name):
+    """Lower-cased extension without the dot ('' for none or a dotfile)."""
+    i = name.rfind('.')
+    return name[i + 1:].lower() if i > 0 else ''
 
-        # Parent directory entry (unless at filesystem root)
-        if self.current_path != '/' and os.path.dirname(self.current_path) != self.current_path:
-            entry = FileEntry('..', True, os.path.dirname(self.current_path))
-            self.entries.append(entry)
-            self.content.append(entry.display_text)
 
+class Bitset:
+    """n bits packed in a bytearray: one per entry of a listing, so
+    marking a million entries takes 125 KB. Inserting or deleting a bit
+    shifts the rest through an int, in C."""
+    __slots__ = ('n', 'bits')
+
+    def __init__(self, n=0):
+        self.n = n
+        self.bits = bytearray((n + 7) >> 3)
+
+    def copy(self):
+        other = Bitset()
+        other.n, other.bits = self.n, self.bits[:]
+        return other
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, j):
+        return self.bits[j >> 3] >> (j & 7) & 1
+
+    def __setitem__(self, j, on):
+        if on:
+            self.bits[j >> 3] |= 1 << (j & 7)
+        else:
+            self.bits[j >> 3] &= ~(1 << (j & 7)) & 0xFF
+
+    def __iter__(self):
+        """Indices of the bits set, in order."""
+        for k, byte in enumerate(self.bits):
+            if byte:
+                for b in range(8):
+                    if byte >> b & 1:
+                        yield k << 3 | b
+
+    def count(self):
+        return bin(int.from_bytes(self.bits, 'little')).count('1')
+
+    def _assign(self, value, n):
+        self.n = n
+        self.bits = bytearray(value.to_bytes((n + 7) >> 3, 'little'))
+
+    def insert(self, j, on=False):
+        """Insert bit j, moving bits j and up one place up."""
+        value = int.from_bytes(self.bits, 'little')
+        low = value & ((1 << j) - 1)
+        self._assign(low | value >> j << (j + 1) | int(on) << j, self.n + 1)
+
+    def delete(self, j):
+        """Remove bit j, moving the bits above it one place down."""
+        value = int.from_bytes(self.bits, 'little')
+        low = value & ((1 << j) - 1)
+        self._assign(low | value >> (j + 1) << j, self.n - 1)
+
+    def fill(self, on=True):
+        self._assign((1 << self.n) - 1 if on else 0, self.n)
+
+    def invert(self):
+        self._assign(int.from_bytes(self.bits, 'little') ^ ((1 << self.n) - 1), self.n)
+
+
+class DirListing:
+    """The entries of one directory, directories first, then files, stored
+    compactly: each group's names packed into one string with an offset
+    array, file sizes and mtimes in arrays.
+
+    No per-entry objects are kept; listing[i] builds a FileEntry on demand.
+    Row 0 is '..' when parent is given. Entries can arrive in batches
+    (extend) and are sorted once by name, case-insensitively, by sort().
+
+    Each group is shown in the order of sort_key ('name', 'natural',
+    'ext', 'size' or 'mtime', see SORT_KEYS), ties in name order. The
+    entries stay stored by name; other orders are a permutation of them,
+    computed from keys kept per entry (sizes and mtimes as scanned,
+    natural and ext keys made once). Switching columns only re-sorts.
+    Directories sort by size once set_dir_sizes() gave them one.
+
+    Entries can be marked (multi-selection) once start_marking() was
+    called: a Bitset per group, by stored index, so marks do not move
+    when the rows are re-sorted or filtered. The number and total file
+    size of the marked entries are kept up to date as marks change."""
+
+    SORT_KEYS = ('name', 'natural', 'ext', 'size', 'mtime')
+    details_of = staticmethod(EntryDetails.of)  # Full path -> EntryDetails or None
+    PATCH_NAMES = 64    # update(): patch up to this many names in place
+    DETAIL_NAMES = 4096 # details() kept for at most this many names
+
+    def __init__(self, path, dir_names=(), file_names=(), file_sizes=(), file_mtimes=(),
+                 parent=None):
+        self.path = path
+        self.parent = parent
+        self._base = 1 if parent else 0
+        self.sort_key = 'name'
+        self.reverse = False
+        self.dir_sizes = None   # Directory name -> bytes used, once measured
+        self.marks = None       # Per group: Bitset of marked entries (start_marking)
+        self.marked_count = 0
+        self.marked_bytes = 0   # Total size of the marked files
+        self._clear()
+        self.extend(dir_names, file_names, file_sizes, file_mtimes)
+
+    def _clear(self):
+        self._dirs = ''
+        self._dir_offsets = array('I', [0])
+        self._files = ''
+        self._file_offsets = array('I', [0])
+        self._sizes = array('q')
+        self._mtimes = array('d')
+        self._dir_mtimes = None     # Stat'ed on demand (see _dir_times)
+        self._keys = {}             # (sort key, group) -> keys, in name order
+        self._order = [None, None]  # Per group: row -> stored entry (None: same)
+        self._rows = [None, None]   # ... and back, built on demand
+        self._lower = None          # search_groups() cache
+        self._details = {}          # name -> EntryDetails, for the rows shown
+        self.sorted = True
+
+    def copy(self):
+        """A listing that can be re-sorted or patched independently."""
+        other = DirListing.__new__(DirListing)
+        other.__dict__.update(self.__dict__)
+        other._dir_offsets = self._dir_offsets[:]
+        other._file_offsets = self._file_offsets[:]
+        other._sizes = self._sizes[:]
+        other._mtimes = self._mtimes[:]
+        if self._dir_mtimes is not None:
+            other._dir_mtimes = self._dir_mtimes[:]
+        other._keys = {key: list(keys) for key, keys in self._keys.items()}
+        other._order = [order and order[:] for order in self._order]
+        other._rows = [None, None]
+        other._lower = None
+        other._details = dict(self._details)
+        if self.marks is not None:
+            other.marks = [marks.copy() for marks in self.marks]
+        return other
+
+    @staticmethod
+    def _pack(names, blob, offsets):
+        """Append names (each followed by a NUL) to blob; returns the new blob."""
+        if not names:
+            return blob
+        ends = accumulate((len(name) + 1 for name in names), initial=offsets[-1])
+        offsets.extend(islice(ends, 1, None))
+        return blob + '\0'.join(names) + '\0'
+
+    @staticmethod
+    def _unpack(blob):
+        return blob.split('\0')[:-1]
+
+    def extend(self, dir_names=(), file_names=(), file_sizes=(), file_mtimes=()):
+        """Add a batch of entries (unsorted until sort())."""
+        if dir_names or file_names:
+            self._keys = {}
+            self._order = [None, None]
+            self._rows = [None, None]
+            self._lower = None
+            self.sorted = False
+        if dir_names:
+            self._dir_mtimes = None
+        self._dirs = self._pack(dir_names, self._dirs, self._dir_offsets)
+        self._files = self._pack(file_names, self._files, self._file_offsets)
+        self._sizes.extend(file_sizes)
+        self._mtimes.extend(file_mtimes)
+        if len(self._mtimes) < len(self._sizes):
+            self._mtimes.extend(array('d', [0.0]) * (len(self._sizes) - len(self._mtimes)))
+        if self.marks is not None:
+            for marks, offsets in zip(self.marks, (self._dir_offsets, self._file_offsets)):
+                marks._assign(int.from_bytes(marks.bits, 'little'), len(offsets) - 1)
+
+    def sort(self, key=None, reverse=None):
+        """Order rows by key (default: the current sort_key), in reverse if
+        asked. Only the first call after new entries sorts the names."""
+        if key is not None:
+            self.sort_key = key
+        if reverse is not None:
+            self.reverse = reverse
+        if not self.sorted:
+            marked = self._marked_names()
+            dirs = self._unpack(self._dirs)
+            dirs.sort(key=str.lower)
+            files = self._unpack(self._files)
+            keys = [name.lower() for name in files]
+            order = sorted(range(len(files)), key=keys.__getitem__)
+            del keys
+            sizes, mtimes = self._sizes, self._mtimes
+            self.marks = None   # Stored anew: _remark() marks them again
+            self._clear()
+            self.extend(dirs, list(map(files.__getitem__, order)),
+                        map(sizes.__getitem__, order), map(mtimes.__getitem__, order))
+            self.sorted = True
+            self._remark(marked)
+        for group in (0, 1):
+            self._order[group] = self._sorted_order(group)
+            self._rows[group] = None
+
+    def _sorted_order(self, group):
+        """Row order of group for the current sort, None if by name."""
+        keys = self._sort_keys(group)
+        n = len(self._file_offsets if group else self._dir_offsets) - 1
+        if keys is None:
+            return array('I', range(n - 1, -1, -1)) if self.reverse else None
+        # Entries are stored by name, and the sort is stable: ties stay in name order
+        return array('I', sorted(range(n), key=keys.__getitem__, reverse=self.reverse))
+
+    def _sort_keys(self, group):
+        """Primary sort keys of group (0: directories, 1: files) in stored
+        order, or None when the name alone decides."""
+        key = self.sort_key
+        if key == 'name' or (key == 'size' and not group and not self.dir_sizes):
+            return None
+        if key == 'size' and group:
+            return self._sizes
+        if key == 'mtime':
+            return self._mtimes if group else self._dir_times()
+        keys = self._keys.get((key, group))
+        if keys is None:
+            names = self._unpack(self._files if group else self._dirs)
+            keys = self._keys[key, group] = [self._key_of(key, name) for name in names]
+        return keys
+
+    def _key_of(self, key, name):
+        """Sort key of the entry called name, for the keys kept in _keys."""
+        if key == 'natural':
+            return natural_key(name)
+        if key == 'ext':
+            return file_extension(name)
+        return self.dir_sizes.get(name, 0)  # 'size', for directories
+
+    def set_dir_sizes(self, sizes):
+        """Show and sort directories with the sizes in sizes (name -> bytes)."""
+        self.dir_sizes = sizes
+        self._keys.pop(('size', 0), None)
+        if self.sort_key == 'size':
+            self._order[0] = self._sorted_order(0)
+            self._rows[0] = None
+
+    def _dir_times(self):
+        """Directory mtimes. The scan tells directories apart by d_type
+        alone, so they are stat'ed only when first needed."""
+        if self._dir_mtimes is None:
+            self._dir_mtimes = array('d', map(self._stat_mtime, self._unpack(self._dirs)))
+        return self._dir_mtimes
+
+    def _stat_mtime(self, name):
         try:
-            raw_entries = sorted(os.listdir(self.current_path), key=str.lower)
-        except PermissionError:
-            self.error_message = 'Permission denied'
-            self.content.append('  ⛔ Permission denied')
-            self._update_title()
+            return os.stat(os.path.join(self.path, name)).st_mtime
+        except OSError:
+            return 0.0
+
+    def update(self, names, dir_names=(), file_names=(), file_sizes=(), file_mtimes=()):
+        """Replace the entries called names (a set) by the given ones:
+        names missing from the new entries are removed. Keeps the order.
+
+        A few names are patched in place (a resize is one array store, an
+        add or remove one splice); many re-sort the whole listing."""
+        if len(names) > self.PATCH_NAMES or not self.sorted:
+            marked = self._marked_names()
+            dirs = [name for name in self._unpack(self._dirs) if name not in names]
+            files = self._unpack(self._files)
+            kept = [i for i, name in enumerate(files) if name not in names]
+            sizes, mtimes = self._sizes, self._mtimes
+            self.marks = None   # Fewer entries now: _remark() marks them again
+            self._clear()
+            self.extend(dirs, list(map(files.__getitem__, kept)),
+                        map(sizes.__getitem__, kept), map(mtimes.__getitem__, kept))
+            self.extend(dir_names, file_names, file_sizes, file_mtimes)
+            self.sort()
+            self._remark(marked)
             return
-        except OSError as e:
-            self.error_message = str(e)
-            self.content.append(f'  ⛔ {e}')
-            self._update_title()
+        self._lower = None
+        file_mtimes = list(file_mtimes) + [0.0] * (len(file_names) - len(file_mtimes))
+        new_files = dict(zip(file_names, zip(file_sizes, file_mtimes)))
+        marked = []     # Marked entries that are stored again
+        for name in names:
+            self._details.pop(name, None)
+            group, j = self.find(name)
+            if group < 0:
+                continue
+            if self.marks is not None and self.marks[group][j]:
+                marked.append(name)
+            if group and name in new_files and self.sort_key not in ('size', 'mtime'):
+                # Still a file, same place: just the new stats
+                if self.marks is not None and self.marks[1][j]:
+                    self.marked_bytes -= self._sizes[j]
+                    self.marked_bytes += new_files[name][0]
+                self._sizes[j], self._mtimes[j] = new_files.pop(name)
+            else:
+                self._remove(group, j)
+        for name in dir_names:
+            self._add(0, name)
+        for name, (size, mtime) in new_files.items():
+            self._add(1, name, size, mtime)
+        for name in marked:
+            group, j = self.find(name)
+            if group >= 0:
+                self._set_mark(group, j, True)
+
+    def _remove(self, group, j):
+        """Drop stored entry j of group."""
+        if self.marks is not None:
+            self._set_mark(group, j, False)
+            self.marks[group].delete(j)
+        if group:
+            self._files = self._cut(self._files, self._file_offsets, j)
+            del self._sizes[j], self._mtimes[j]
+        else:
+            self._dirs = self._cut(self._dirs, self._dir_offsets, j)
+            if self._dir_mtimes is not None:
+                del self._dir_mtimes[j]
+        for key, keys in self._keys.items():
+            if key[1] == group:
+                del keys[j]
+        order = self._order[group]
+        if order is not None:
+            del order[order.index(j)]
+            self._order[group] = array('I', [k - (k > j) for k in order])
+            self._rows[group] = None
+
+    def _add(self, group, name, size=0, mtime=0.0):
+        """Store one entry by name and show it where the sort puts it."""
+        if not group and (self.sort_key == 'mtime' or self._dir_mtimes is not None):
+            mtime = self._stat_mtime(name)
+        if group:
+            j = self._name_position(self._files, self._file_offsets, name)
+            self._files = self._splice(self._files, self._file_offsets, j, name)
+            self._sizes.insert(j, size)
+            self._mtimes.insert(j, mtime)
+        else:
+            j = self._name_position(self._dirs, self._dir_offsets, name)
+            self._dirs = self._splice(self._dirs, self._dir_offsets, j, name)
+            if self._dir_mtimes is not None:
+                self._dir_mtimes.insert(j, mtime)
+        for (sort_key, g), keys in self._keys.items():
+            if g == group:
+                keys.insert(j, self._key_of(sort_key, name))
+        if self.marks is not None:
+            self.marks[group].insert(j)
+        order = self._order[group]
+        if order is not None:
+            order = self._order[group] = array('I', [k + (k >= j) for k in order])
+            order.insert(self._row_position(group, j), j)
+            self._rows[group] = None
+
+    @staticmethod
+    def _name_position(blob, offsets, name):
+        """Where name goes among the names of blob (after equal ones)."""
+        key = name.lower()
+        lo, hi = 0, len(offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < blob[offsets[mid]:offsets[mid + 1] - 1].lower():
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _row_position(self, group, j):
+        """Where stored entry j goes in group's row order."""
+        order = self._order[group]
+        keys = self._sort_keys(group)
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = order[mid]
+            if keys is None or keys[j] == keys[k]:
+                before = j > k if keys is None else j < k
+            else:
+                before = keys[j] > keys[k] if self.reverse else keys[j] < keys[k]
+            if before:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    @staticmethod
+    def _cut(blob, offsets, j):
+        """Remove name j from blob; returns the new blob."""
+        start, end = offsets[j], offsets[j + 1]
+        del offsets[j + 1]
+        offsets[j + 1:] = array('I', [o - (end - start) for o in offsets[j + 1:]])
+        return blob[:start] + blob[end:]
+
+    @staticmethod
+    def _splice(blob, offsets, j, name):
+        """Insert name into blob as name j; returns the new blob."""
+        pos = offsets[j]
+        offsets[j + 1:] = array('I', [o + len(name) + 1 for o in offsets[j:]])
+        return blob[:pos] + name + '\0' + blob[pos:]
+
+    def start_marking(self):
+        """Allow marking entries (all unmarked)."""
+        if self.marks is None:
+            self.marks = [Bitset(len(self._dir_offsets) - 1), Bitset(len(self._file_offsets) - 1)]
+            self.marked_count = self.marked_bytes = 0
+
+    def _set_mark(self, group, j, on):
+        """Mark or unmark stored entry j of group; True if it changed."""
+        marks = self.marks[group]
+        if marks[j] == on:
+            return False
+        marks[j] = on
+        sign = 1 if on else -1
+        self.marked_count += sign
+        if group:
+            self.marked_bytes += sign * self._sizes[j]
+        return True
+
+    def is_marked(self, i):
+        if self.marks is None or i < self._base:
+            return False
+        group, j = self._entry(i)
+        return bool(self.marks[group][j])
+
+    def mark(self, i, on=True):
+        """Mark or unmark row i ('..' cannot be); True if it changed."""
+        if i < self._base:
+            return False
+        self.start_marking()
+        return self._set_mark(*self._entry(i), on)
+
+    def mark_all(self, on=True):
+        self.start_marking()
+        for marks in self.marks:
+            marks.fill(on)
+        self.marked_count = self.count if on else 0
+        self.marked_bytes = sum(self._sizes) if on else 0
+
+    def invert_marks(self):
+        self.start_marking()
+        for marks in self.marks:
+            marks.invert()
+        self.marked_count = self.count - self.marked_count
+        self.marked_bytes = sum(self._sizes) - self.marked_bytes
+
+    def mark_matching(self, match, on=True):
+        """Mark (or unmark) the entries whose name match(name) accepts.
+        Returns how many changed."""
+        self.start_marking()
+        changed = 0
+        for group, blob in enumerate((self._dirs, self._files)):
+            for j, name in enumerate(self._unpack(blob)):
+                if match(name) and self._set_mark(group, j, on):
+                    changed += 1
+        return changed
+
+    def marked_paths(self):
+        """Full paths of the marked entries, directories first, by name."""
+        if not self.marked_count:
+            return []
+        return [os.path.join(self.path, name) for names in self._marked_names() for name in names]
+
+    def _marked_names(self):
+        """(directory names, file names) marked, or None if not marking."""
+        if self.marks is None:
+            return None
+        marked = []
+        for marks, blob in zip(self.marks, (self._dirs, self._files)):
+            names = self._unpack(blob) if marks.count() else []
+            marked.append([names[j] for j in marks] if names else [])
+        return tuple(marked)
+
+    def _remark(self, marked):
+        """Mark again the names from _marked_names() after the entries
+        were stored anew (the indices changed)."""
+        if marked is None:
             return
+        self.marks = None
+        self.start_marking()
+        for group, names in enumerate(marked):
+            if names:
+                index = {name: j for j, name in enumerate(self._unpack(self._files if group else self._dirs))}
+                for name in names:
+                    j = index.get(name)
+                    if j is not None:
+                        self._set_mark(group, j, True)
+
+    def search_groups(self):
+        """(group, lower-cased name blob, its offsets) for the directory
+        and the file group, in stored (name) order; see row(). Built on
+        first use after a change."""
+        if self._lower is None:
+            self._lower = [(0, *self._lowered(self._dirs, self._dir_offsets)),
+                           (1, *self._lowered(self._files, self._file_offsets))]
+        return self._lower
+
+    @classmethod
+    def _lowered(cls, blob, offsets):
+        lower = blob.lower()
+        if len(lower) == len(blob):
+            return lower, offsets
+        # Some letters lower-case to two characters ('İ'): own offsets
+        lower_offsets = array('I', [0])
+        return cls._pack([name.lower() for name in cls._unpack(blob)], '', lower_offsets), lower_offsets
+
+    def row(self, group, j):
+        """Row showing stored entry j of group."""
+        order = self._order[group]
+        if order is not None:
+            rows = self._rows[group]
+            if rows is None:
+                rows = self._rows[group] = array('I', bytes(4 * len(order)))
+                for i, k in enumerate(order):
+                    rows[k] = i
+            j = rows[j]
+        return j + (self.ndirs if group else self._base)
+
+    def _entry(self, i):
+        """(group, stored index) of row i (not '..')."""
+        i -= self._base
+        ndirs = len(self._dir_offsets) - 1
+        group = 0
+        if i >= ndirs:
+            group, i = 1, i - ndirs
+        order = self._order[group]
+        return group, (i if order is None else order[i])
+
+    @property
+    def ndirs(self):
+        """Rows that are directories ('..' included)."""
+        return self._base + len(self._dir_offsets) - 1
+
+    def dir_names(self):
+        """Names of the subdirectories, in name order whatever the sort."""
+        return self._unpack(self._dirs)
+
+    def file_names(self):
+        """Names of the other entries, in name order whatever the sort."""
+        return self._unpack(self._files)
+
+    @property
+    def count(self):
+        """Number of real entries (without '..')."""
+        return len(self._dir_offsets) + len(self._file_offsets) - 2
+
+    def __len__(self):
+        return self._base + self.count
+
+    def name(self, i):
+        if i < self._base:
+            return '..'
+        group, j = self._entry(i)
+        if group:
+            return self._files[self._file_offsets[j]:self._file_offsets[j + 1] - 1]
+        return self._dirs[self._dir_offsets[j]:self._dir_offsets[j + 1] - 1]
+
+    def is_dir(self, i):
+        return i < self.ndirs
+
+    def size(self, i):
+        if i < self.ndirs:
+            if self.dir_sizes and i >= self._base:
+                return self.dir_sizes.get(self.name(i), 0)
+            return 0
+        return self._sizes[self._entry(i)[1]]
+
+    def mtime(self, i):
+        """Modification time of row i (0.0 for '..')."""
+        if i < self._base:
+            return 0.0
+        group, j = self._entry(i)
+        return self._mtimes[j] if group else self._dir_times()[j]
+
+    def full_path(self, i):
+        if i < self._base:
+            return self.parent
+        return os.path.join(self.path, self.name(i))
+
+    def display_text(self, i):
+        return format_entry(self.name(i), self.is_dir(i), self.size(i))
+
+    def details(self, i):
+        """EntryDetails of row i (None if it cannot be stat'ed). Stat'ed
+        when first asked for, i.e. when the row is drawn in the detailed
+        view, and kept until the entry changes."""
+        name = self.name(i)
+        try:
+            return self._details[name]
+        except KeyError:
+            pass
+        if len(self._details) >= self.DETAIL_NAMES:
+            self._details.clear()
+        details = self._details[name] = self.details_of(self.full_path(i))
+        return details
+
+    def detail_text(self, i):
+        if i < self._base:
+            return format_details('..', True, None)
+        return format_details(self.name(i), self.is_dir(i), self.details(i), self.size(i))
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return FileEntry(self.name(i), self.is_dir(i), self.full_path(i), self.size(i))
+
+    def find(self, name):
+        """(group, stored index) of the entry called name, or (-1, -1)."""
+        for group, blob in enumerate((self._dirs, self._files)):
+            pos = blob.find(name + '\0')
+            while pos >= 0:
+                if pos == 0 or blob[pos - 1] == '\0':
+                    offsets = self._file_offsets if group else self._dir_offsets
+                    return group, bisect_right(offsets, pos) - 1
+                pos = blob.find(name + '\0', pos + 1)
+        return -1, -1
+
+    def index_of(self, name):
+        """Index of the entry called name, or -1."""
+        if name == '..':
+            return 0 if self._base else -1
+        group, j = self.find(name)
+        return -1 if group < 0 else self.row(group, j)
+
+
+class ListingRows:
+    """Window.content stand-in for a File Manager: header lines, one row
+    per DirListing entry, trailer lines. Entry rows are formatted only when
+    drawn and cached, so a redraw costs the same for 100 or 1M entries.
+    With detailed, entry rows carry the ls -l columns (detail_text).
+    Marked entries start with '*'; markers (name -> a git status
+    character, see GitStatus) go in the column after it."""
+
+    CACHE_ROWS = 512
+
+    def __init__(self, header, listing, trailer=(), detailed=False):
+        self.header = list(header)
+        self.listing = listing
+        self.trailer = list(trailer)
+        self.detailed = detailed
+        self.markers = {}
+        self._cache = {}
+
+    def invalidate(self):
+        """Forget formatted rows (the listing changed)."""
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self.header) + len(self.listing) + len(self.trailer)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < len(self.header):
+            return self.header[index]
+        i = index - len(self.header)
+        if i >= len(self.listing):
+            return self.trailer[i - len(self.listing)]
+        row = self._cache.get(i)
+        if row is None:
+            if len(self._cache) >= self.CACHE_ROWS:
+                self._cache.clear()
+            if self.detailed:
+                row = self.listing.detail_text(i)
+            else:
+                row = self.listing.display_text(i)
+            if self.listing.is_marked(i):
+                row = '*' + row[1:]
+            marker = self.markers.get(self.listing.name(i)) if self.markers else None
+            if marker:
+                row = row[0] + marker + row[2:]
+            self._cache[i] = row
+        return row
+
+
+class ListingFilter:
+    """The entries of a DirListing whose name contains text, ignoring
+    case. Reads like the DirListing (name(k), len(), k-th entry) so the
+    File Manager can show either.
+
+    Matches are listed by name, whatever the listing's sort column, and
+    names that start with text come first: entries are stored sorted by
+    name, so those are one range per group, found by bisection. The other
+    matches are found with str.find over the group's lower-cased name
+    blob, only as far as advance() is asked to go, so the first screenful
+    costs microseconds whatever the size of the directory."""
+
+    SLICE_CHARS = 1 << 20   # Blob characters searched per advance()
+    FIRST_CHARS = 1 << 16   # ... for the first screenful, while a key is handled
+
+    def __init__(self, listing, text):
+        self.listing = listing
+        self.text = text
+        self.done = False
+        self._key = text.lower()
+        self._groups = listing.search_groups()
+        self._prefix = []           # Per group: stored (lo, hi) of the prefix matches
+        self._nprefix = 0
+        self.rows = array('I')      # Listing rows of the other matches found
+        self._group = 0
+        self._pos = 0
+        for group, blob, offsets in self._groups:
+            lo = hi = 0
+            if listing.sorted:
+                lo = self._bisect(blob, offsets, self._key, False)
+                hi = self._bisect(blob, offsets, self._key, True)
+                self._nprefix += hi - lo
+            self._prefix.append((lo, hi))
+
+    @staticmethod
+    def _bisect(blob, offsets, key, past):
+        """First name >= key, or with past, first name after those
+        starting with key."""
+        lo, hi = 0, len(offsets) - 1
+        n = len(key)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = blob[offsets[mid]:offsets[mid + 1] - 1]
+            if (name[:n] <= key) if past else (name < key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def advance(self, rows=4096, chars=SLICE_CHARS):
+        """Find up to rows more matches, searching about chars characters
+        at most. Returns True once the whole listing has been searched."""
+        key = self._key
+        want = len(self.rows) + rows
+        while self._group < len(self._groups):
+            group, blob, offsets = self._groups[self._group]
+            lo, hi = self._prefix[self._group]
+            pos = self._pos
+            end = min(len(blob), pos + chars)
+            limit = min(len(blob), end + len(key) - 1)  # Matches starting before end
+            while len(self.rows) < want:
+                found = blob.find(key, pos, limit)
+                if found < 0:
+                    pos = max(pos, end)
+                    break
+                i = bisect_right(offsets, found) - 1
+                if lo <= i < hi:
+                    pos = offsets[hi]  # Prefix matches: listed already
+                    continue
+                self.rows.append(self.listing.row(group, i))
+                pos = offsets[i + 1]
+            chars -= pos - self._pos
+            self._pos = pos
+            if pos < len(blob):
+                return False
+            self._group += 1
+            self._pos = 0
+            if chars <= 0 and self._group < len(self._groups):
+                return False
+        self.done = True
+        return True
+
+    def _row(self, k):
+        """Listing row of match k."""
+        if k >= self._nprefix:
+            return self.rows[k - self._nprefix]
+        for group, (lo, hi) in enumerate(self._prefix):
+            if k < hi - lo:
+                return self.listing.row(group, lo + k)
+            k -= hi - lo
+
+    @property
+    def count(self):
+        return self._nprefix + len(self.rows)
+
+    def __len__(self):
+        return self._nprefix + len(self.rows)
+
+    def name(self, k):
+        return self.listing.name(self._row(k))
+
+    def is_dir(self, k):
+        return self.listing.is_dir(self._row(k))
+
+    def size(self, k):
+        return self.listing.size(self._row(k))
+
+    def full_path(self, k):
+        return self.listing.full_path(self._row(k))
 
-        dirs = []
-        files = []
-        for name in raw_entries:
-            if not self.show_hidden and name.startswith('.'):
+    def display_text(self, k):
+        return self.listing.display_text(self._row(k))
+
+    def details(self, k):
+        return self.listing.details(self._row(k))
+
+    def detail_text(self, k):
+        return self.listing.detail_text(self._row(k))
+
+    def is_marked(self, k):
+        return self.listing.is_marked(self._row(k))
+
+    def mark(self, k, on=True):
+        return self.listing.mark(self._row(k), on)
+
+    def mark_all(self, on=True):
+        """Mark (or unmark) every match, and only those: the rest of the
+        listing is searched first."""
+        while not self.advance():
+            pass
+        for k in range(len(self)):
+            self.mark(k, on)
+
+    def invert_marks(self):
+        while not self.advance():
+            pass
+        for k in range(len(self)):
+            self.mark(k, not self.is_marked(k))
+
+    def __getitem__(self, k):
+        if not 0 <= k < len(self):
+            raise IndexError(k)
+        return self.listing[self._row(k)]
+
+    def index_of(self, name):
+        """Position of the entry called name among the matches found, or -1."""
+        group, j = self.listing.find(name)
+        if group < 0:
+            return -1
+        k = sum(hi - lo for lo, hi in self._prefix[:group])
+        lo, hi = self._prefix[group]
+        if lo <= j < hi:
+            return k + j - lo
+        try:
+            return self._nprefix + self.rows.index(self.listing.row(group, j))
+        except ValueError:
+            return -1
+
+
+class ScanStats:
+    """Syscall accounting for one directory listing."""
+    __slots__ = ('entries', 'opens', 'stats', 'seconds')
+
+    def __init__(self):
+        self.entries = 0        # Names returned by the kernel
+        self.opens = 0          # scandir() calls (getdents batches not counted)
+        self.stats = 0          # stat/lstat calls
+        self.seconds = 0.0
+
+    @property
+    def syscalls(self):
+        return self.opens + self.stats
+
+    def summary(self):
+        return (f'{self.entries} entries, {self.syscalls} syscalls '
+                f'({self.stats} stat), {self.seconds * 1000:.0f} ms')
+
+
+def _scan_chunks(path, show_hidden, stats, size=256):
+    """Walk os.scandir(path) in chunks of about size names. Yields
+    (dir_names, others): plain directories are known from d_type alone,
+    others are DirEntry objects that still need _stat_entries()."""
+    dirs = []
+    others = []
+    stats.opens += 1
+    with os.scandir(path) as it:
+        for entry in it:
+            stats.entries += 1
+            if not show_hidden and entry.name.startswith('.'):
                 continue
-            full_path = os.path.join(self.current_path, name)
             try:
-                if os.path.isdir(full_path):
-                    dirs.append(FileEntry(name, True, full_path))
-                elif os.path.isfile(full_path):
-                    size = os.path.getsize(full_path)
-                    files.append(FileEntry(name, False, full_path, size))
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                else:
+                    others.append(entry)
             except OSError:
                 continue
+            if len(dirs) + len(others) >= size:
+                yield dirs, others
+                dirs = []
+                others = []
+    if dirs or others:
+        yield dirs, others
+
+
+def _stat_entries(entries, cancelled=None):
+    """Resolve DirEntry objects that are not plain directories: one lstat
+    per regular file (for its size), one stat per symlink (its target).
+    Fifos, sockets, devices and dangling links are skipped.
+    Returns (dir_names, file_names, file_sizes, file_mtimes, stat_calls)."""
+    dirs = []
+    files = []
+    sizes = array('q')
+    mtimes = array('d')
+    calls = 0
+    for entry in entries:
+        if cancelled is not None and cancelled.is_set():
+            break
+        try:
+            if entry.is_symlink():
+                calls += 1
+                st = entry.stat()
+                if stat.S_ISDIR(st.st_mode):
+                    dirs.append(entry.name)
+                    continue
+            elif entry.is_file(follow_symlinks=False):
+                calls += 1
+                st = entry.stat(follow_symlinks=False)
+            else:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                files.append(entry.name)
+                sizes.append(st.st_size)
+                mtimes.append(st.st_mtime)
+        except OSError:
+            continue  # Vanished meanwhile, or a dangling symlink
+    return dirs, files, sizes, mtimes, calls
+
+
+def scan_directory(path, show_hidden=False, stats=None, parent=None):
+    """List path with os.scandir into a sorted DirListing (parent: path of
+    the '..' row, if any). Raises OSError like os.scandir.
+
+    The d_type that comes with each name answers is_dir/is_file for free,
+    so a directory costs nothing extra and a regular file one lstat (for
+    its size). A symlink costs one stat to resolve its target."""
+    if stats is None:
+        stats = ScanStats()
+    start = time.perf_counter()
+    listing = DirListing(path, parent=parent)
+    for dir_names, others in _scan_chunks(path, show_hidden, stats):
+        more_dirs, files, sizes, mtimes, calls = _stat_entries(others)
+        stats.stats += calls
+        listing.extend(dir_names + more_dirs, files, sizes, mtimes)
+    listing.sort()
+    stats.seconds += time.perf_counter() - start
+    return listing
+
+
+class DirectoryLoader:
+    """Lists a directory on a worker thread.
+
+    Entries reach on_batch(loader, dirs, files, sizes, mtimes) on the UI thread
+    (through Scheduler.call_soon_threadsafe) at most every BATCH_SECONDS,
+    then on_done(loader, error) runs once. Stats go through a small thread
+    pool so a high-latency mount (NFS, FUSE) keeps several in flight.
+    After cancel() nothing more is delivered; the threads wind down alone."""
+
+    BATCH_SECONDS = 0.1
+    STAT_WORKERS = 8
+    MAX_IN_FLIGHT = 32      # Chunks queued on the pool
+
+    def __init__(self, path, show_hidden, scheduler, on_batch, on_done):
+        self.path = path
+        self.show_hidden = show_hidden
+        self.scheduler = scheduler
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.stats = ScanStats()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='dir-loader', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _post(self, callback, *args):
+        """Run callback(self, *args) on the UI thread unless cancelled by then."""
+        def deliver():
+            if not self.cancelled:
+                callback(self, *args)
+        if not self.cancelled:
+            self.scheduler.call_soon_threadsafe(deliver)
+
+    def _run(self):
+        start = time.perf_counter()
+        dirs, files, sizes, mtimes = [], [], array('q'), array('d')
+        pending = deque()
+        error = None
+
+        def collect(future):
+            more_dirs, names, sizes_, mtimes_, calls = future.result()
+            dirs.extend(more_dirs)
+            files.extend(names)
+            sizes.extend(sizes_)
+            mtimes.extend(mtimes_)
+            self.stats.stats += calls
+
+        pool = ThreadPoolExecutor(self.STAT_WORKERS, thread_name_prefix='dir-stat')
+        try:
+            last = start
+            for dir_names, others in _scan_chunks(self.path, self.show_hidden, self.stats):
+                if self.cancelled:
+                    return
+                dirs.extend(dir_names)
+                if others:
+                    try:
+                        pending.append(pool.submit(_stat_entries, others, self._cancelled))
+                    except RuntimeError:  # The interpreter is exiting
+                        return
+                while pending and (pending[0].done() or len(pending) >= self.MAX_IN_FLIGHT):
+                    collect(pending.popleft())
+                now = time.perf_counter()
+                if now - last >= self.BATCH_SECONDS and (dirs or files):
+                    self._post(self.on_batch, dirs, files, sizes, mtimes)
+                    dirs, files, sizes, mtimes = [], [], array('q'), array('d')
+                    last = now
+            while pending and not self.cancelled:
+                collect(pending.popleft())
+        except OSError as e:
+            error = e
+        finally:
+            pool.shutdown(wait=False)
+        self.stats.seconds = time.perf_counter() - start
+        if dirs or files:
+            self._post(self.on_batch, dirs, files, sizes, mtimes)
+        self._post(self.on_done, error)
 
-        for entry in dirs:
-            self.entries.append(entry)
-            self.content.append(entry.display_text)
-        for entry in files:
-            self.entries.append(entry)
-            self.content.append(entry.display_text)
-
-        if not self.entries:
-            self.content.append('  (empty directory)')
 
-        self._update_title()
-        self.selected_index = 0
-        self.scroll_offset = 0
+# ═══════════════════════════════════════════════════════════
+# Directory Cache
+# ═══════════════════════════════════════════════════════════
 
-    def _update_title(self):
-        """Update window title to show path basename and entry count."""
-        basename = os.path.basename(self.current_path) or '/'
-        count = len([e for e in self.entries if e.name != '..'])
-        self.title = f'File Manager - {basename} ({count} items)'
+# inotify(7) event bits (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_EXCL_UNLINK = 0x04000000
 
-    def draw(self, stdscr):
-        """Draw file manager with selection highlight."""
-        super().draw(stdscr)
-        if not self.visible or not self.entries:
-            return
+IN_DIR_EVENTS = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+IN_SELF_EVENTS = IN_DELETE_SELF | IN_MOVE_SELF
 
-        bx, by, bw, bh = self.body_rect()
-        sel_content_idx = self._entry_to_content_index(self.selected_index)
-        visible_start = self.scroll_offset
-        visible_end = self.scroll_offset + bh
+_INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len (then the name)
 
-        if visible_start <= sel_content_idx < visible_end:
-            screen_row = by + (sel_content_idx - self.scroll_offset)
-            sel_attr = curses.color_pair(C_FM_SELECTED) | curses.A_BOLD
-            display = self.content[sel_content_idx][:bw] if sel_content_idx < len(self.content) else ''
-            safe_addstr(stdscr, screen_row, bx, display.ljust(bw), sel_attr)
 
-        # Redraw dropdown ON TOP of selection highlight
-        if self.window_menu:
-            self.window_menu.draw_dropdown(stdscr, self.x, self.y, self.w)
+class Inotify:
+    """Bare inotify(7) through ctypes. fd is -1 where inotify is missing
+    (not Linux, no libc symbol, out of instances)."""
 
-    def navigate_to(self, path):
-        """Navigate to a new directory path."""
-        real_path = os.path.realpath(path)
-        if os.path.isdir(real_path):
-            self.current_path = real_path
-            self._rebuild_content()
+    def __init__(self):
+        self.fd = -1
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+            init = libc.inotify_init1
+        except (OSError, AttributeError):
+            return
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = max(-1, init(os.O_NONBLOCK | os.O_CLOEXEC))
+
+    def add_watch(self, path, mask):
+        """Watch descriptor for path, or -1 (e.g. fs.inotify.max_user_watches)."""
+        if self.fd < 0:
+            return -1
+        return self._add_watch(self.fd, os.fsencode(path), mask)
+
+    def rm_watch(self, wd):
+        if self.fd >= 0:
+            self._rm_watch(self.fd, wd)
+
+    def read(self):
+        """Queued events as (wd, mask, name) tuples; never blocks."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            if not data:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, size = _INOTIFY_EVENT.unpack_from(data, pos)
+                pos += _INOTIFY_EVENT.size
+                name = os.fsdecode(data[pos:pos + size].rstrip(b'\0'))
+                pos += size
+                events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def _stat_names(path, names):
+    """Classify names in path the way _stat_entries does, with a full
+    (l)stat each. Names that vanished are left out.
+    Returns (dir_names, file_names, file_sizes, file_mtimes)."""
+    dirs = []
+    files = []
+    sizes = array('q')
+    mtimes = array('d')
+    for name in names:
+        full = os.path.join(path, name)
+        try:
+            st = os.stat(full, follow_symlinks=False)
+            if stat.S_ISLNK(st.st_mode):
+                st = os.stat(full)
+        except OSError:
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            dirs.append(name)
+        elif stat.S_ISREG(st.st_mode):
+            files.append(name)
+            sizes.append(st.st_size)
+            mtimes.append(st.st_mtime)
+    return dirs, files, sizes, mtimes
+
+
+class DirChanges:
+    """Names that changed in one directory and what they are now."""
+
+    def __init__(self, path, names):
+        self.path = path
+        self.names = names
+        self.dirs, self.files, self.sizes, self.mtimes = _stat_names(path, names)
+
+    def apply(self, listing, show_hidden):
+        """Bring listing up to date (idempotent)."""
+        if show_hidden:
+            listing.update(self.names, self.dirs, self.files, self.sizes, self.mtimes)
+            return
+        visible = [i for i, name in enumerate(self.files) if not name.startswith('.')]
+        listing.update(self.names,
+                       [name for name in self.dirs if not name.startswith('.')],
+                       [self.files[i] for i in visible],
+                       [self.sizes[i] for i in visible],
+                       [self.mtimes[i] for i in visible])
+
+
+class DirectoryCache:
+    """Finished directory listings, least recently used dropped first,
+    keyed by (path, show_hidden) and kept current through inotify.
+
+    Windows register with watch(path, callback). After a burst of changes
+    settles, callback(apply) runs on the UI thread: apply(listing,
+    show_hidden) brings a listing up to date in place. apply is None when
+    the directory must be rescanned (deleted or moved, too many changes,
+    event queue overflow). Cached listings nobody is watching are just
+    dropped on change.
+
+    Without inotify (or without a scheduler to read it), a cached listing
+    is used only while the directory's mtime is unchanged; that misses
+    files changing size, but not files coming or going."""
+
+    MAX_LISTINGS = 16
+    SETTLE_SECONDS = 0.2    # Coalesce event bursts (a cp -r, a build)
+    RESCAN_NAMES = 2048     # More changed names than this: rescan instead
+
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler
+        self._listings = OrderedDict()  # (path, show_hidden) -> (listing, mtime_ns)
+        self._viewers = {}          # path -> [callback]
+        self._loading = {}          # path -> scans in progress
+        self._started = {}          # path -> mtime_ns when the first scan began
+        self._wds = {}              # path -> inotify watch descriptor
+        self._paths = {}            # watch descriptor -> path
+        self._pending = {}          # path -> changed names, or None (rescan)
+        self._timer = None
+        self.inotify = Inotify() if scheduler is not None else None
+        if self.inotify is not None and self.inotify.fd >= 0:
+            scheduler.add_reader(self.inotify.fd, self._on_events)
+
+    @property
+    def live(self):
+        """True if listings are kept current through inotify."""
+        return self.inotify is not None and self.inotify.fd >= 0
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
 
-    def navigate_parent(self):
-        """Go to parent directory, re-selecting the dir we came from."""
-        parent = os.path.dirname(self.current_path)
-        if parent != self.current_path:
-            old_name = os.path.basename(self.current_path)
-            self.navigate_to(parent)
-            for i, entry in enumerate(self.entries):
-                if entry.name == old_name:
-                    self.selected_index = i
-                    self._ensure_visible()
-                    break
+    # ── Lookup ──
 
-    def activate_selected(self):
-        """Activate currently selected entry. Returns ('dir', path) or ('file', path)."""
-        if not self.entries:
+    def get(self, path, show_hidden):
+        """Cached listing of path, or None."""
+        key = (path, show_hidden)
+        item = self._listings.get(key)
+        if item is None:
             return None
-        if self.selected_index >= len(self.entries):
+        listing, mtime = item
+        if path not in self._wds and self._mtime(path) != mtime:
+            del self._listings[key]
             return None
-        entry = self.entries[self.selected_index]
-        if entry.is_dir:
-            self.navigate_to(entry.full_path)
-            return ('dir', entry.full_path)
+        self._listings.move_to_end(key)
+        return listing
+
+    def begin(self, path):
+        """A scan of path starts: changes from now on are held back until
+        end(), then delivered, so none fall between scan and watch."""
+        self._loading[path] = self._loading.get(path, 0) + 1
+        self._started.setdefault(path, self._mtime(path))
+        self._add_watch(path)
+
+    def end(self, path, listing=None, show_hidden=False):
+        """A scan of path is over; a complete listing goes into the cache."""
+        loading = self._loading.pop(path, 1) - 1
+        if loading > 0:
+            self._loading[path] = loading
+            mtime = self._started.get(path)
         else:
-            return ('file', entry.full_path)
+            mtime = self._started.pop(path, None)
+        if listing is not None:
+            key = (path, show_hidden)
+            self._listings[key] = (listing, mtime)
+            self._listings.move_to_end(key)
+            while len(self._listings) > self.MAX_LISTINGS:
+                (old, _), _ = self._listings.popitem(last=False)
+                self._release(old)
+        if path in self._pending:
+            self._schedule()
+        self._release(path)
+
+    def invalidate(self, path):
+        """Forget the cached listings of path."""
+        for show_hidden in (False, True):
+            self._listings.pop((path, show_hidden), None)
+
+    # ── Viewers ──
+
+    def watch(self, path, callback):
+        self._viewers.setdefault(path, []).append(callback)
+        self._add_watch(path)
+
+    def unwatch(self, path, callback):
+        callbacks = self._viewers.get(path, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self._viewers.pop(path, None)
+        self._release(path)
+
+    # ── inotify ──
+
+    def _add_watch(self, path):
+        if not self.live or path in self._wds:
+            return
+        wd = self.inotify.add_watch(path, IN_DIR_EVENTS | IN_SELF_EVENTS | IN_ONLYDIR | IN_EXCL_UNLINK)
+        if wd >= 0:
+            self._wds[path] = wd
+            self._paths[wd] = path
+
+    def _release(self, path):
+        """Stop watching path once nothing needs it."""
+        if (path in self._viewers or path in self._loading
+                or (path, False) in self._listings or (path, True) in self._listings):
+            return
+        self._pending.pop(path, None)
+        wd = self._wds.pop(path, None)
+        if wd is not None:
+            del self._paths[wd]
+            self.inotify.rm_watch(wd)
+
+    def _on_events(self):
+        for wd, mask, name in self.inotify.read():
+            if mask & IN_Q_OVERFLOW:
+                for path in self._wds:
+                    self._pending[path] = None
+                continue
+            path = self._paths.get(wd)
+            if path is None:
+                continue
+            if mask & (IN_SELF_EVENTS | IN_IGNORED):
+                # Gone, or moved (the watch would follow the inode): the
+                # path gets rescanned and watched afresh
+                self._pending[path] = None
+                del self._wds[path], self._paths[wd]
+                if not mask & IN_IGNORED:
+                    self.inotify.rm_watch(wd)
+            elif name:
+                names = self._pending.setdefault(path, set())
+                if names is not None:
+                    names.add(name)
+                    if len(names) > self.RESCAN_NAMES:
+                        self._pending[path] = None
+        if self._pending:
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = self.scheduler.call_later(self.SETTLE_SECONDS, self._flush)
+
+    def _flush(self):
+        """Deliver the changes collected since the last flush."""
+        self._timer = None
+        pending, self._pending = self._pending, {}
+        for path, names in pending.items():
+            if path in self._loading:
+                self._pending[path] = names  # Delivered by end()
+                continue
+            cached = [(key[1], self._listings[key][0]) for key in ((path, False), (path, True))
+                      if key in self._listings]
+            callbacks = list(self._viewers.get(path, ()))
+            if names is None or not callbacks:
+                self.invalidate(path)
+                for callback in callbacks:
+                    callback(None)
+            else:
+                changes = DirChanges(path, names)
+                applied = set()
 
-    def select_up(self):
-        """Move selection up by one entry."""
-        if self.selected_index > 0:
-            self.selected_index -= 1
-            self._ensure_visible()
+                def apply(listing, show_hidden, changes=changes, applied=applied):
+                    if id(listing) not in applied:
+                        applied.add(id(listing))
+                        changes.apply(listing, show_hidden)
 
-    def select_down(self):
-        """Move selection down by one entry."""
-        if self.selected_index < len(self.entries) - 1:
-            self.selected_index += 1
-            self._ensure_visible()
+                for callback in callbacks:
+                    callback(apply)
+                for show_hidden, listing in cached:
+                    apply(listing, show_hidden)
+            self._release(path)
 
-    def _ensure_visible(self):
-        """Auto-scroll to keep the selected entry visible."""
-        _, _, _, bh = self.body_rect()
-        sel_content = self._entry_to_content_index(self.selected_index)
-        if sel_content < self.scroll_offset:
-            self.scroll_offset = sel_content
-        elif sel_content >= self.scroll_offset + bh:
-            self.scroll_offset = sel_content - bh + 1
+    def close(self):
+        if self._timer is not None:
+            self.scheduler.cancel(self._timer)
+            self._timer = None
+        if self.live:
+            self.scheduler.remove_reader(self.inotify.fd)
+            self.inotify.close()
 
-    def toggle_hidden(self):
-        """Toggle show/hide hidden files."""
-        self.show_hidden = not self.show_hidden
-        self._rebuild_content()
 
-    def _execute_menu_action(self, action):
-        """Execute a window menu action. Returns signal or None."""
-        if action == 'fm_open':
-            return self.activate_selected()
-        elif action == 'fm_parent':
-            self.navigate_parent()
-        elif action == 'fm_toggle_hidden':
-            self.toggle_hidden()
-        elif action == 'fm_refresh':
-            self._rebuild_content()
-        elif action == 'fm_close':
-            return ('action', 'close')
-        return None
+# ═══════════════════════════════════════════════════════════
+# Disk Usage
+# ═══════════════════════════════════════════════════════════
+
+def default_usage_cache_path():
+    """Where DiskUsageCache keeps its file: $XDG_CACHE_HOME/retrotui/du.json."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'retrotui', 'du.json')
+
+
+class DiskUsageCache:
+    """What DiskUsage learned about each directory, by (st_dev, st_ino),
+    kept in a JSON file between runs. An entry is reused while the
+    directory's mtime is the same, i.e. no entry was added, removed or
+    renamed in it; a file that only grew is noticed once its directory
+    changes (as with any du cache keyed on directory mtimes).
+
+    Entries are (mtime_ns, bytes, files, subdirectory names, hard links,
+    parent): bytes used by the directory itself and its singly-linked
+    files, (st_dev, st_ino, bytes) of the files with more than one link,
+    and the key of the directory it was found in (None for the top of a
+    run), by which prune() drops the directories that are gone."""
+
+    VERSION = 2
+
+    def __init__(self, path=None):
+        self.path = path        # None: kept in memory only
+        self.dirs = {}
+        self._loaded = path is None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the file the first time (off the UI thread: it can be big)."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                if data.get('version') != self.VERSION:
+                    return
+                for key, (mtime, used, files, subdirs, links, parent) in data['dirs'].items():
+                    dev, ino = key.split(':')
+                    self.dirs[int(dev), int(ino)] = (mtime, used, files, tuple(subdirs),
+                                                     tuple(map(tuple, links)),
+                                                     tuple(parent) if parent else None)
+            except (OSError, ValueError, TypeError, KeyError, AttributeError):
+                self.dirs.clear()  # Missing or damaged: start over
+
+    def get(self, key, mtime_ns):
+        """The entry of directory key if it has not changed since."""
+        entry = self.dirs.get(key)
+        if entry is not None and entry[0] == mtime_ns:
+            return entry
+        return None
+
+    def put(self, key, entry):
+        with self._lock:
+            self.dirs[key] = entry
+            self._dirty = True
+
+    def prune(self, visited):
+        """Drop what a complete run shows is gone: the directories last
+        found in one it visited (the set of keys) that it did not visit
+        again, and everything below those."""
+        with self._lock:
+            children = {}
+            for key, entry in self.dirs.items():
+                children.setdefault(entry[5], []).append(key)
+            gone = [key for parent in visited for key in children.get(parent, ())
+                    if key not in visited]
+            while gone:
+                key = gone.pop()
+                if self.dirs.pop(key, None) is not None:
+                    self._dirty = True
+                    gone.extend(children.get(key, ()))
+
+    def save(self):
+        """Write the file if anything changed (atomically: a temporary
+        file renamed over it)."""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = {'version': self.VERSION,
+                    'dirs': {f'{dev}:{ino}': entry for (dev, ino), entry in self.dirs.items()}}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            pass
+
+
+class DiskUsage:
+    """Measures the disk space used below path, per subdirectory, on
+    worker threads: du -x style (each subdirectory within its own
+    filesystem, symlinks not followed, blocks actually allocated).
+
+    Each directory is one task on a thread pool: lstat it and, unless the
+    cache knows it at that mtime, scandir it and lstat its files. A file
+    with several hard links counts once, in the first directory holding
+    it by path order, whatever order the workers finish in, once the
+    walk is over; until then the sizes leave such files out. A complete
+    walk also prunes the cache of the directories that are gone. The
+    sizes so far reach on_progress(usage, sizes) on the UI thread at most
+    every BATCH_SECONDS, then on_done(usage, sizes) runs once; sizes maps
+    each subdirectory name to bytes. Without a scheduler everything runs
+    in start(). After cancel() nothing more is delivered."""
+
+    BATCH_SECONDS = 0.2
+    WORKERS = 8
+    MAX_IN_FLIGHT = 64      # Directories queued on the pool
+
+    def __init__(self, path, cache, scheduler, on_progress, on_done):
+        self.path = path
+        self.cache = cache
+        self.scheduler = scheduler
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.total = 0      # Bytes used below path, all included
+        self.files = 0
+        self.dirs = 0
+        self.cached = 0     # Directories the cache answered for
+        self.errors = 0     # Directories that could not be read
+        self.seconds = 0.0
+        self.sizes = {}
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='disk-usage', daemon=True)
+
+    def start(self):
+        if self.scheduler is None:
+            self._run()
+        else:
+            self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def summary(self):
+        """'12.3G in 4567 files, 89 dirs (80 cached)'."""
+        text = f'{format_size(self.total)} in {self.files} files, {self.dirs} dirs'
+        if self.cached:
+            text += f' ({self.cached} cached)'
+        if self.errors:
+            text += f', {self.errors} unreadable'
+        return text
+
+    def _post(self, callback, *args):
+        """Run callback(self, *args) on the UI thread unless cancelled by then."""
+        def deliver():
+            if not self.cancelled:
+                callback(self, *args)
+        if self.scheduler is None:
+            deliver()
+        elif not self.cancelled:
+            self.scheduler.call_soon_threadsafe(deliver)
+
+    def _measure(self, path, dev, parent):
+        """((st_dev, st_ino), cache entry, from the cache?) of directory
+        path, found in directory parent (a key), None if it is not on
+        filesystem dev. Raises OSError."""
+        st = os.lstat(path)
+        if dev is not None and st.st_dev != dev:
+            return None
+        key = (st.st_dev, st.st_ino)
+        mtime = st.st_mtime_ns  # Taken before listing: a change meanwhile shows next time
+        entry = self.cache.get(key, mtime)
+        if entry is not None:
+            return key, entry, True
+        used = st.st_blocks * 512
+        files = 0
+        subdirs = []
+        links = []
+        with os.scandir(path) as it:
+            for item in it:
+                if self.cancelled:
+                    break
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        subdirs.append(item.name)
+                        continue
+                    st = item.stat(follow_symlinks=False)
+                except OSError:
+                    continue  # Vanished meanwhile
+                files += 1
+                if st.st_nlink > 1:
+                    links.append((st.st_dev, st.st_ino, st.st_blocks * 512))
+                else:
+                    used += st.st_blocks * 512
+        return key, (mtime, used, files, tuple(subdirs), tuple(links), parent), False
+
+    def _run(self):
+        start = last = time.perf_counter()
+        self.cache.load()
+        # (path, subdirectory of self.path, st_dev, key of the parent directory)
+        todo = deque([(self.path, None, None, None)])
+        running = {}
+        visited = set()     # Keys of the directories measured
+        linked = []         # (path, subdirectory of self.path, hard links) per directory
+        pool = ThreadPoolExecutor(self.WORKERS, thread_name_prefix='du')
+        try:
+            while (todo or running) and not self.cancelled:
+                while todo and len(running) < self.MAX_IN_FLIGHT:
+                    path, top, dev, parent = todo.popleft()
+                    running[pool.submit(self._measure, path, dev, parent)] = (path, top, parent)
+                done, _ = wait(running, self.BATCH_SECONDS, FIRST_COMPLETED)
+                for future in done:
+                    path, top, parent = running.pop(future)
+                    try:
+                        result = future.result()
+                    except OSError:
+                        self.errors += 1
+                        continue
+                    if result is None:
+                        continue  # A mount point
+                    key, entry, hit = result
+                    _, used, files, subdirs, links, _ = entry
+                    visited.add(key)
+                    if hit:
+                        self.cached += 1
+                        if parent is not None and entry[5] != parent:  # Moved
+                            self.cache.put(key, entry[:5] + (parent,))
+                    elif not self.cancelled:  # Else possibly cut short
+                        self.cache.put(key, entry)
+                    if links:
+                        linked.append((path.split(os.sep), top, links))
+                    self.dirs += 1
+                    self.files += files
+                    self.total += used
+                    if top is not None:
+                        self.sizes[top] = self.sizes.get(top, 0) + used
+                    for name in subdirs:
+                        if top is None:
+                            self.sizes.setdefault(name, 0)
+                            todo.append((os.path.join(path, name), name, None, key))
+                        else:
+                            todo.append((os.path.join(path, name), top, key[0], key))
+                now = time.perf_counter()
+                if now - last >= self.BATCH_SECONDS:
+                    self.seconds = now - start
+                    self._post(self.on_progress, dict(self.sizes))
+                    last = now
+        except RuntimeError:  # The interpreter is exiting
+            return
+        finally:
+            pool.shutdown(wait=False)
+        counted = set()     # (st_dev, st_ino) of the hard-linked files counted
+        for _, top, links in sorted(linked, key=lambda item: item[0]):
+            for dev, ino, size in links:
+                if (dev, ino) not in counted:
+                    counted.add((dev, ino))
+                    self.total += size
+                    if top is not None:
+                        self.sizes[top] += size
+        self.seconds = time.perf_counter() - start
+        self._post(self.on_done, dict(self.sizes))
+        if not self.cancelled:
+            self.cache.prune(visited)
+        self.cache.save()
+
+
+# ═══════════════════════════════════════════════════════════
+# File Operations
+# ═══════════════════════════════════════════════════════════
+
+class JobCancelled(Exception):
+    """Raised in a FileJob's thread once the job is cancelled."""
+
+
+def free_name(directory, name):
+    """name, or the first of 'name (2)', 'name (3)'... not taken in directory."""
+    if not os.path.lexists(os.path.join(directory, name)):
+        return name
+    stem, ext = os.path.splitext(name)
+    for n in count(2):
+        candidate = f'{stem} ({n}){ext}'
+        if not os.path.lexists(os.path.join(directory, candidate)):
+            return candidate
+
+
+def data_extents(fd, size):
+    """(start, end) of each run of data in the file open as fd, holes left
+    out (SEEK_DATA/SEEK_HOLE); the whole file if holes cannot be told."""
+    if not hasattr(os, 'SEEK_DATA'):
+        return [(0, size)]
+    extents = []
+    pos = 0
+    try:
+        while pos < size:
+            start = os.lseek(fd, pos, os.SEEK_DATA)
+            pos = min(size, os.lseek(fd, start, os.SEEK_HOLE))
+            extents.append((start, pos))
+    except OSError as e:
+        if e.errno != errno.ENXIO:  # ENXIO: nothing but a hole after pos
+            return [(0, size)]
+    return extents
+
+
+class FileJob:
+    """Copies, moves or deletes files and directory trees on a worker
+    thread.
+
+    Data never passes through Python: os.copy_file_range (a reflink or
+    server-side copy where the filesystem can), else os.sendfile, else
+    pread/pwrite, CHUNK bytes per call with the GIL released, so the UI
+    keeps running and pause/cancel take effect promptly. Holes of sparse
+    files are skipped and stay holes. A move within one filesystem is a
+    rename; across filesystems a copy, then the source is deleted.
+
+    Names taken in the destination get ' (2)', ' (3)'... The job stops at
+    the first error (kept in error); a file cut short is removed. Progress
+    reaches on_progress(job) on the UI thread at most every BATCH_SECONDS
+    and on_done(job) runs once, unless the job was cancelled."""
+
+    BATCH_SECONDS = 0.2
+    CHUNK = 16 << 20
+    RATE_SECONDS = 3.0      # Throughput averaged over this long
+    VERBS = {'copy': 'Copy', 'move': 'Move', 'delete': 'Delete'}
+
+    def __init__(self, op, sources, dest, scheduler, on_progress, on_done):
+        self.op = op                # 'copy', 'move' or 'delete'
+        self.sources = list(sources)
+        self.dest = dest            # Directory to copy/move into (None to delete)
+        self.scheduler = scheduler
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.total_bytes = 0        # Totals, complete once planned
+        self.total_files = 0
+        self.planned = False
+        self.done_bytes = 0
+        self.done_files = 0
+        self.rate = 0.0             # Bytes per second lately
+        self.error = None           # OSError that stopped the job
+        self._samples = deque()     # (time, done_bytes) over RATE_SECONDS
+        self._last_post = 0.0
+        self._method = 'copy_file_range' if hasattr(os, 'copy_file_range') else 'sendfile'
+        self._resume = threading.Event()
+        self._resume.set()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'file-{op}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._samples.clear()  # Don't average the pause in
+        self._resume.set()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._resume.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def status(self):
+        """Progress line: 'Copy 45% 1.2G/2.6G 310.0M/s 0:05 left'."""
+        verb = self.VERBS[self.op]
+        if not self.planned:
+            return f'{verb}: counting {self.total_files} files…'
+        if self.op == 'delete':
+            done, total = self.done_files, self.total_files
+            text = f'{verb} {done * 100 // max(1, total)}% {done}/{total} files'
+        else:
+            done, total = self.done_bytes, self.total_bytes
+            text = (f'{verb} {done * 100 // max(1, total)}% '
+                    f'{format_size(done)}/{format_size(total)}')
+        if self.paused:
+            return text + ' paused'
+        if self.op != 'delete' and self.rate > 0:
+            left = int((total - done) / self.rate)
+            text += f' {format_size(int(self.rate))}/s {left // 60}:{left % 60:02d} left'
+        return text
+
+    def _post(self, callback):
+        """Run callback(self) on the UI thread unless cancelled by then."""
+        def deliver():
+            if not self.cancelled:
+                callback(self)
+        if not self.cancelled:
+            self.scheduler.call_soon_threadsafe(deliver)
+
+    def _checkpoint(self):
+        """Wait while paused; raise JobCancelled once cancelled."""
+        self._resume.wait()
+        if self.cancelled:
+            raise JobCancelled()
+
+    def _advance(self, nbytes=0, nfiles=0):
+        """Count work done; tell the UI now and then."""
+        self.done_bytes += nbytes
+        self.done_files += nfiles
+        now = time.monotonic()
+        if now - self._last_post >= self.BATCH_SECONDS:
+            self._last_post = now
+            samples = self._samples
+            samples.append((now, self.done_bytes))
+            while now - samples[0][0] > self.RATE_SECONDS:
+                samples.popleft()
+            then, done = samples[0]
+            self.rate = (self.done_bytes - done) / (now - then) if now > then else 0.0
+            self._post(self.on_progress)
+
+    def _run(self):
+        try:
+            sources = self.sources
+            if self.op == 'move':
+                sources = [src for src in sources if not self._rename(src)]
+            self._plan(sources)
+            self.planned = True
+            for src in sources:
+                if self.op == 'delete':
+                    self._delete(src)
+                    continue
+                self._check_target(src)
+                self._copy(src, os.path.join(self.dest, free_name(self.dest, os.path.basename(src))))
+                if self.op == 'move':
+                    self._delete(src, counted=False)
+        except JobCancelled:
+            return
+        except OSError as e:
+            self.error = e
+        self._post(self.on_done)
+
+    def _check_target(self, src):
+        """Refuse to copy or move a directory into itself."""
+        if os.path.isdir(src) and not os.path.islink(src):
+            inside = os.path.join(os.path.realpath(self.dest), '')
+            if inside.startswith(os.path.join(os.path.realpath(src), '')):
+                raise OSError(errno.EINVAL, 'Cannot copy a folder into itself', src)
+
+    def _rename(self, src):
+        """Move src by renaming it, if it is on the destination's
+        filesystem. Returns False if it has to be copied."""
+        if os.path.dirname(src) == self.dest:
+            return True  # Already there
+        self._check_target(src)
+        try:
+            os.rename(src, os.path.join(self.dest, free_name(self.dest, os.path.basename(src))))
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                return False
+            raise
+        return True
+
+    def _plan(self, paths):
+        """Count the files and bytes below paths (what can be read)."""
+        for path in paths:
+            self._checkpoint()
+            try:
+                st = os.lstat(path)
+                if stat.S_ISDIR(st.st_mode):
+                    with os.scandir(path) as it:
+                        self._plan([entry.path for entry in it])
+                    continue
+            except OSError:
+                continue  # The copy or delete will report it
+            self.total_files += 1
+            if stat.S_ISREG(st.st_mode):
+                self.total_bytes += st.st_size
+            if self.total_files % 1000 == 0:
+                self._advance()
+
+    def _copy(self, src, dst):
+        """Copy src to dst (which must not exist), trees included;
+        symlinks are copied as symlinks."""
+        self._checkpoint()
+        st = os.lstat(src)
+        mode = st.st_mode
+        if stat.S_ISDIR(mode):
+            os.mkdir(dst, 0o700)  # Until it is filled
+            with os.scandir(src) as it:
+                names = [entry.name for entry in it]
+            for name in names:
+                self._copy(os.path.join(src, name), os.path.join(dst, name))
+            os.chmod(dst, stat.S_IMODE(mode))
+            os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+            return
+        if stat.S_ISREG(mode):
+            self._copy_file(src, dst, st)
+        elif stat.S_ISLNK(mode):
+            os.symlink(os.readlink(src), dst)
+        elif stat.S_ISFIFO(mode):
+            os.mkfifo(dst, stat.S_IMODE(mode))
+        # Sockets and device nodes are left out
+        self._advance(nfiles=1)
+
+    def _copy_file(self, src, dst, st):
+        fd_in = os.open(src, os.O_RDONLY)
+        try:
+            fd_out = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            try:
+                size = length = st.st_size
+                sparse = st.st_blocks * 512 < size
+                pos = 0
+                for start, end in (data_extents(fd_in, size) if sparse else [(0, size)]):
+                    self._advance(start - pos)  # A hole: nothing to copy
+                    pos = self._copy_range(fd_in, fd_out, start, end)
+                    if pos < end:
+                        length = pos    # The file ends sooner than st_size said
+                        break
+                self._advance(size - pos)
+                os.ftruncate(fd_out, length)  # Makes the trailing hole, if any
+                os.fchmod(fd_out, stat.S_IMODE(st.st_mode))
+                os.utime(fd_out, ns=(st.st_atime_ns, st.st_mtime_ns))
+            except BaseException:
+                os.close(fd_out)
+                os.unlink(dst)
+                raise
+            os.close(fd_out)
+        finally:
+            os.close(fd_in)
+
+    def _copy_range(self, fd_in, fd_out, pos, end):
+        """Copy bytes pos to end; returns where the copy stopped: end, or
+        sooner at the end of the file (it got shorter, or its st_size is
+        not its length, as in /sys)."""
+        while pos < end:
+            self._checkpoint()
+            size = min(self.CHUNK, end - pos)
+            copied = self._transfer(fd_in, fd_out, pos, size)
+            if copied == 0 and self._method != 'pwrite':
+                # copy_file_range and sendfile return 0 for some files
+                # before their end: only a read tells
+                copied = self._read_write(fd_in, fd_out, pos, size)
+            if copied == 0:
+                break
+            pos += copied
+            self._advance(copied)
+        return pos
+
+    def _transfer(self, fd_in, fd_out, pos, size):
+        """Copy size bytes at offset pos; returns how many were. Falls back
+        from copy_file_range to sendfile to pread/pwrite for the rest of
+        the job where one is not supported (old kernel, other filesystem)."""
+        if self._method == 'copy_file_range':
+            try:
+                return os.copy_file_range(fd_in, fd_out, size, pos, pos)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                    raise
+                self._method = 'sendfile'
+        if self._method == 'sendfile':
+            try:
+                os.lseek(fd_out, pos, os.SEEK_SET)
+                return os.sendfile(fd_out, fd_in, pos, size)
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                    raise
+                self._method = 'pwrite'
+        return self._read_write(fd_in, fd_out, pos, size)
+
+    @staticmethod
+    def _read_write(fd_in, fd_out, pos, size):
+        """Copy up to size bytes at offset pos with pread/pwrite."""
+        data = os.pread(fd_in, size, pos)
+        view = memoryview(data)
+        while view:
+            view = view[os.pwrite(fd_out, view, pos + len(data) - len(view)):]
+        return len(data)
+
+    def _delete(self, path, counted=True):
+        """Delete path, trees included (symlinks themselves, not their targets)."""
+        self._checkpoint()
+        if os.path.isdir(path) and not os.path.islink(path):
+            with os.scandir(path) as it:
+                children = [entry.path for entry in it]
+            for child in children:
+                self._delete(child, counted)
+            os.rmdir(path)
+        else:
+            os.unlink(path)
+            if counted:
+                self._advance(nfiles=1)
+
+
+# ═══════════════════════════════════════════════════════════
+# File Preview
+# ═══════════════════════════════════════════════════════════
+
+# (offset, magic number, description), first match wins
+MAGIC_NUMBERS = [
+    (0, b'\x7fELF', 'ELF executable'),
+    (0, b'\x89PNG\r\n\x1a\n', 'PNG image'),
+    (0, b'\xff\xd8\xff', 'JPEG image'),
+    (0, b'GIF87a', 'GIF image'),
+    (0, b'GIF89a', 'GIF image'),
+    (0, b'%PDF-', 'PDF document'),
+    (0, b'PK\x03\x04', 'Zip archive'),
+    (0, b'PK\x05\x06', 'Zip archive (empty)'),
+    (0, b'\x1f\x8b', 'gzip compressed data'),
+    (0, b'BZh', 'bzip2 compressed data'),
+    (0, b'\xfd7zXZ\x00', 'xz compressed data'),
+    (0, b'\x28\xb5\x2f\xfd', 'Zstandard compressed data'),
+    (0, b"7z\xbc\xaf'\x1c", '7-Zip archive'),
+    (0, b'Rar!\x1a\x07', 'RAR archive'),
+    (257, b'ustar', 'tar archive'),
+    (0, b'!<arch>\n', 'ar archive'),
+    (0, b'SQLite format 3\x00', 'SQLite database'),
+    (0, b'\x00asm', 'WebAssembly module'),
+    (0, b'\xca\xfe\xba\xbe', 'Java class'),
+    (0, b'OggS', 'Ogg media'),
+    (0, b'fLaC', 'FLAC audio'),
+    (0, b'ID3', 'MP3 audio'),
+    (0, b'RIFF', 'RIFF media (WAV/AVI/WebP)'),
+    (4, b'ftyp', 'MP4/QuickTime media'),
+    (0, b'\x1a\x45\xdf\xa3', 'Matroska/WebM media'),
+    (0, b'\x00\x00\x01\x00', 'Windows icon'),
+    (0, b'MZ', 'DOS/Windows executable'),
+]
+
+PREVIEW_BYTES = 1 << 13     # Read of each file: a screenful of text
+PREVIEW_LINES = 200
+
+# Bytes that do not occur in text (NUL aside); tab, newlines, form feed and
+# escape do
+_BINARY_BYTES = bytes(sorted(set(range(32)) - {9, 10, 12, 13, 27}) + [127])
+_UNPRINTABLE = re.compile('[\x00-\x08\x0b-\x1f\x7f]')
+
+
+def sniff_type(head):
+    """(description, is_text) of a file starting with head. Whether it is
+    text comes from the bytes (no NUL, few control characters): short
+    magic numbers like 'MZ' or 'RIFF' also start plain text files. Binary
+    files are named by their magic number, text by a script's interpreter
+    or its encoding."""
+    if not head:
+        return 'empty', True
+    if b'\0' in head or len(head) - len(head.translate(None, _BINARY_BYTES)) > len(head) // 10:
+        for offset, magic, description in MAGIC_NUMBERS:
+            if head.startswith(magic, offset):
+                return description, False
+        return 'data', False
+    if head.startswith(b'#!'):
+        words = head[2:].split(b'\n', 1)[0].split()
+        if words:
+            name = os.path.basename(words[0])
+            if name == b'env' and len(words) > 1:
+                name = words[1]
+            return f'{os.fsdecode(name)} script', True
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.reason != 'unexpected end of data':  # Not just cut off mid-character
+            return 'text (not UTF-8)', True
+    return ('ASCII text' if head.isascii() else 'UTF-8 text'), True
+
+
+def read_head(path):
+    """The first PREVIEW_BYTES of the regular file at path, through mmap
+    (no copy into a Python buffer besides the result). Raises OSError."""
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        length = min(os.fstat(fd).st_size, PREVIEW_BYTES)
+        if length == 0:
+            return b''
+        with mmap.mmap(fd, length, prot=mmap.PROT_READ) as m:
+            return m[:]
+    finally:
+        os.close(fd)
+
+
+class FilePreview:
+    """What the preview pane shows of a file: its type, stat() and, for
+    text, the first lines."""
+    __slots__ = ('description', 'is_text', 'st', 'lines')
+
+    def __init__(self, description, is_text, st, lines=()):
+        self.description = description
+        self.is_text = is_text      # None if the file could not be read
+        self.st = st
+        self.lines = lines
+
+    @classmethod
+    def of(cls, path, st):
+        mode = st.st_mode
+        if stat.S_ISDIR(mode):
+            return cls('directory', False, st)
+        if not stat.S_ISREG(mode):
+            kind = ('FIFO' if stat.S_ISFIFO(mode) else 'socket' if stat.S_ISSOCK(mode)
+                    else 'character device' if stat.S_ISCHR(mode) else 'block device')
+            return cls(kind, False, st)
+        try:
+            head = read_head(path)
+        except (OSError, ValueError) as e:
+            return cls(f'unreadable ({getattr(e, "strerror", None) or e})', None, st)
+        description, is_text = sniff_type(head)
+        if not is_text:
+            return cls(description, False, st)
+        text = head.decode('utf-8', 'replace')
+        lines = [_UNPRINTABLE.sub('·', line.expandtabs(4))
+                 for line in islice(text.splitlines(), PREVIEW_LINES)]
+        return cls(description, True, st, lines)
+
+
+class PreviewCache:
+    """LRU of FilePreviews keyed by (dev, inode, mtime, size), so a file is
+    read once however often it is selected, and again only once it
+    changed; get() costs a stat() otherwise. Shared by the File Managers
+    and the app's check for binary files. At most PREVIEW_BYTES of text
+    each, so SIZE previews stay under 16 MiB."""
+
+    SIZE = 2048
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self._previews = OrderedDict()
+        self.reads = 0              # Previews built (files read)
+
+    def get(self, path):
+        """FilePreview of path (a symlink's target), or None if it cannot
+        be stat'ed."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+        previews = self._previews
+        preview = previews.get(key)
+        if preview is not None:
+            previews.move_to_end(key)
+            return preview
+        self.reads += 1
+        preview = previews[key] = FilePreview.of(path, st)
+        if len(previews) > self.size:
+            previews.popitem(last=False)
+        return preview
+
+
+# ═══════════════════════════════════════════════════════════
+# Archives
+# ═══════════════════════════════════════════════════════════
+
+ARCHIVE_SUFFIXES = ('.zip', '.jar', '.whl', '.tar', '.tar.gz', '.tgz',
+                    '.tar.xz', '.txz', '.tar.bz2', '.tbz2')
+ARCHIVE_VIEW_BYTES = 1 << 22    # Shown of a member: its first 4 MiB
+
+# What a damaged or truncated archive raises while being read
+ARCHIVE_ERRORS = (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError, zlib.error, LZMAError)
+
+
+def is_archive_name(name):
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def split_archive_path(path):
+    """(archive, inner) if path is an archive file or lies inside one
+    ('/x/logs.tar.gz/2024/app.log' -> ('/x/logs.tar.gz', '2024/app.log')),
+    else None. Only names that look like archives are stat'ed."""
+    head, rest = path, []
+    while True:
+        if is_archive_name(head) and os.path.isfile(head):
+            return head, '/'.join(reversed(rest))
+        head, tail = os.path.split(head)
+        if not tail:
+            return None
+        rest.append(tail)
+
+
+class ArchiveIndex:
+    """Table of contents of a zip or tar archive, by directory: each
+    directory inside it (key '' is the top) maps to its subdirectory
+    names and its files' names, sizes and mtimes, ready for a DirListing.
+    Directories only implied by member names are filled in.
+
+    A zip's index comes from its central directory alone; a tar's from
+    one pass over its headers (for a compressed tar that pass has to
+    decompress it, once; seeking skips the data of an uncompressed one).
+    read() then streams a single member, nothing is extracted."""
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key          # ArchiveIndex.stat_key(path) when read
+        self.is_zip = False
+        self.dirs = {'': ([], [], array('q'), array('d'))}
+        self.members = {}       # Inner path -> ZipInfo or TarInfo
+
+    @staticmethod
+    def stat_key(path):
+        st = os.stat(path)
+        return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    @classmethod
+    def read_index(cls, path, cancelled=None):
+        """Index of the archive at path (None if cancelled() turned true
+        meanwhile). Raises one of ARCHIVE_ERRORS."""
+        index = cls(path, cls.stat_key(path))
+        if zipfile.is_zipfile(path):
+            index.is_zip = True
+            with zipfile.ZipFile(path) as zf:
+                for info in zf.infolist():
+                    mtime = time.mktime(info.date_time + (0, 0, -1))
+                    index._add(info.filename, info.is_dir(), info.file_size, mtime, info)
+            return index
+        try:
+            tf = tarfile.open(path, 'r:*')
+        except tarfile.ReadError:
+            raise tarfile.ReadError('Not a zip or tar archive') from None
+        with tf:
+            for n, info in enumerate(tf):
+                if cancelled is not None and n % 1024 == 0 and cancelled():
+                    return None
+                index._add(info.name, info.isdir(), info.size, info.mtime, info)
+        return index
+
+    def _add(self, name, is_dir, size, mtime, info):
+        parts = [part for part in name.split('/') if part and part != '.']
+        if not parts or '..' in parts:
+            return
+        leaf = None if is_dir else parts.pop()
+        parent = ''
+        for part in parts:
+            inner = f'{parent}/{part}' if parent else part
+            if inner not in self.dirs:
+                self.dirs[inner] = ([], [], array('q'), array('d'))
+                self.dirs[parent][0].append(part)
+            parent = inner
+        if leaf is not None:
+            dirs, files, sizes, mtimes = self.dirs[parent]
+            files.append(leaf)
+            sizes.append(size)
+            mtimes.append(mtime)
+            parent = f'{parent}/{leaf}' if parent else leaf
+        self.members[parent] = info
+
+    def listing(self, inner, path, show_hidden=False, parent=None):
+        """Sorted DirListing of directory inner, shown as path."""
+        try:
+            dirs, files, sizes, mtimes = self.dirs[inner]
+        except KeyError:
+            raise FileNotFoundError(errno.ENOENT, 'Not in the archive', path) from None
+        if not show_hidden:
+            dirs = [name for name in dirs if not name.startswith('.')]
+            shown = [k for k, name in enumerate(files) if not name.startswith('.')]
+            if len(shown) < len(files):
+                files = [files[k] for k in shown]
+                sizes = array('q', (sizes[k] for k in shown))
+                mtimes = array('d', (mtimes[k] for k in shown))
+        listing = DirListing(path, dirs, files, sizes, mtimes, parent=parent)
+        listing.details_of = self.details
+        listing.sort()
+        return listing
+
+    # Tar member type -> file type bits (anything else is a regular file)
+    TAR_TYPES = {tarfile.DIRTYPE: stat.S_IFDIR, tarfile.SYMTYPE: stat.S_IFLNK,
+                 tarfile.CHRTYPE: stat.S_IFCHR, tarfile.BLKTYPE: stat.S_IFBLK,
+                 tarfile.FIFOTYPE: stat.S_IFIFO}
+
+    def details(self, path):
+        """EntryDetails of the member shown as path, from its header (None
+        for a directory only implied by member names). A zip member has
+        no owner: it would be the current user's once extracted."""
+        info = self.members.get(path[len(self.path) + 1:])
+        if info is None:
+            return None
+        target = None
+        if self.is_zip:
+            mode = info.external_attr >> 16
+            if not stat.S_IFMT(mode):
+                mode |= (stat.S_IFDIR | 0o755) if info.is_dir() else (stat.S_IFREG | 0o644)
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            owner, size = (os.getuid(), os.getgid()), info.file_size
+        else:
+            mode = info.mode | self.TAR_TYPES.get(info.type, stat.S_IFREG)
+            mtime, owner, size = info.mtime, (info.uid, info.gid), info.size
+            if info.issym():
+                target = info.linkname
+        st = os.stat_result((mode, 0, 0, 1, *owner, size, mtime, mtime, mtime))
+        return EntryDetails(st, target)
+
+    def read(self, inner, limit):
+        """(data, size): up to limit bytes of member inner, decompressed as
+        they stream, and its whole size. Raises one of ARCHIVE_ERRORS."""
+        try:
+            info = self.members[inner]
+        except KeyError:
+            raise FileNotFoundError(errno.ENOENT, 'Not in the archive', inner) from None
+        if self.is_zip:
+            with zipfile.ZipFile(self.path) as zf, zf.open(info) as f:
+                return f.read(limit), info.file_size
+        with tarfile.open(self.path, 'r:*') as tf:
+            f = tf.extractfile(info)
+            if f is None:
+                raise OSError(errno.EINVAL, 'Not a regular file', inner)
+            return f.read(limit), info.size
+
+
+class ArchiveCache:
+    """Indexes of the archives opened lately, least recently used dropped
+    first, keyed by (dev, inode, mtime, size): going back into an archive
+    costs a stat, and a rewritten one is read again. Used on the UI
+    thread only; indexes are read elsewhere (ArchiveLoader) and put()."""
+
+    SIZE = 8
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self._indexes = OrderedDict()
+
+    def get(self, path):
+        """Index of the archive at path if cached and still current, or None."""
+        try:
+            key = ArchiveIndex.stat_key(path)
+        except OSError:
+            return None
+        index = self._indexes.get(key)
+        if index is not None:
+            self._indexes.move_to_end(key)
+        return index
+
+    def put(self, index):
+        self._indexes[index.key] = index
+        self._indexes.move_to_end(index.key)
+        while len(self._indexes) > self.size:
+            self._indexes.popitem(last=False)
+
+    def index(self, path):
+        """Index of the archive at path, read now unless cached."""
+        index = self.get(path)
+        if index is None:
+            index = ArchiveIndex.read_index(path)
+            self.put(index)
+        return index
+
+
+class ArchiveLoader:
+    """Reads an archive's index on a worker thread, then on_done(loader,
+    index, error) runs on the UI thread (through the scheduler). After
+    cancel() nothing is delivered and the reading stops early."""
+
+    def __init__(self, path, scheduler, on_done):
+        self.path = path
+        self.scheduler = scheduler
+        self.on_done = on_done
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='archive-loader', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _run(self):
+        index = error = None
+        try:
+            index = ArchiveIndex.read_index(self.path, lambda: self.cancelled)
+        except ARCHIVE_ERRORS as e:
+            error = e
+
+        def deliver():
+            if not self.cancelled:
+                self.on_done(self, index, error)
+        if not self.cancelled:
+            self.scheduler.call_soon_threadsafe(deliver)
+
+
+# ═══════════════════════════════════════════════════════════
+# Git Status
+# ═══════════════════════════════════════════════════════════
+
+class GitRepo:
+    """Where a work tree's repository lives: root (top of the work tree),
+    gitdir (its .git, or a linked worktree's own dir) and common (the
+    shared dir with objects and refs; gitdir unless a linked worktree)."""
+
+    def __init__(self, root, gitdir):
+        self.root = root
+        self.gitdir = gitdir
+        self.common = gitdir
+        try:
+            with open(os.path.join(gitdir, 'commondir')) as f:
+                self.common = os.path.normpath(os.path.join(gitdir, f.read().strip()))
+        except OSError:
+            pass
+
+    @classmethod
+    def find(cls, path):
+        """The GitRepo whose work tree contains path, or None. One stat
+        per directory up to the top of the work tree."""
+        if f'{os.sep}.git{os.sep}' in path + os.sep:
+            return None         # A repository's own files
+        while True:
+            dot_git = os.path.join(path, '.git')
+            if os.path.isdir(dot_git):
+                return cls(path, dot_git)
+            if os.path.isfile(dot_git):     # Linked worktree or submodule
+                try:
+                    with open(dot_git) as f:
+                        line = f.readline().strip()
+                except OSError:
+                    line = ''
+                if line.startswith('gitdir:'):
+                    return cls(path, os.path.normpath(os.path.join(path, line[7:].strip())))
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+    @property
+    def index_path(self):
+        return os.path.join(self.gitdir, 'index')
+
+    def branch(self):
+        """Name of the checked-out branch, or the short commit id."""
+        try:
+            with open(os.path.join(self.gitdir, 'HEAD')) as f:
+                head = f.read().strip()
+        except OSError:
+            return None
+        return head[16:] if head.startswith('ref: refs/heads/') else head[:7]
+
+    def head_commit(self):
+        """Id (bytes) of the commit HEAD points at; None before the first
+        commit. Loose refs, then packed-refs."""
+        with open(os.path.join(self.gitdir, 'HEAD')) as f:
+            head = f.read().strip()
+        if not head.startswith('ref: '):
+            return bytes.fromhex(head)
+        ref = head[5:]
+        try:
+            with open(os.path.join(self.common, ref)) as f:
+                return bytes.fromhex(f.read().strip())
+        except FileNotFoundError:
+            pass
+        try:
+            with open(os.path.join(self.common, 'packed-refs')) as f:
+                for line in f:
+                    sha, _, name = line.rstrip('\n').partition(' ')
+                    if name == ref:
+                        return bytes.fromhex(sha)
+        except FileNotFoundError:
+            pass
+        return None
+
+
+class GitIndex:
+    """A .git/index (formats 2 to 4) parsed into columns, in its order
+    (sorted by path bytes, so a directory's entries are one range found
+    by bisection): paths, the stat data kept for each (mtime in ns,
+    size), mode, blob id, and skip: 1 when git does not check the work
+    tree file (assume-unchanged, skip-worktree), 2 for a merge conflict
+    stage. From the cache-tree extension, trees maps directories to
+    (entry count, tree id); a count of -1 means entries below changed
+    since it was built."""
+
+    HEADER = struct.Struct('>4sII')
+    ENTRY = struct.Struct('>8x2I8xI8xI20sH')   # mtime s/ns, mode, size, id, flags
+
+    def __init__(self, key):
+        self.key = key          # stat_key(index file) when read
+        self.mtime_ns = 0       # The index file's: entries this recent are racy
+        self.paths = []
+        self.mtimes = array('q')
+        self.sizes = array('q')
+        self.modes = array('I')
+        self.ids = []
+        self.skip = bytearray()
+        self.trees = {}
+
+    stat_key = staticmethod(ArchiveIndex.stat_key)
+
+    @classmethod
+    def read(cls, path, cancelled=None):
+        """Parse the index at path (None if cancelled() turned true).
+        Raises OSError, or ValueError if it is not one this can read."""
+        index = cls(cls.stat_key(path))
+        index.mtime_ns = index.key[2]
+        with open(path, 'rb') as f:
+            data = f.read()
+        signature, version, count = cls.HEADER.unpack_from(data)
+        if signature != b'DIRC' or not 2 <= version <= 4:
+            raise ValueError('Unsupported git index')
+        unpack, paths, ids = cls.ENTRY.unpack_from, index.paths, index.ids
+        mtimes, sizes, modes, skip = index.mtimes, index.sizes, index.modes, index.skip
+        pos, name = 12, b''
+        for n in range(count):
+            if cancelled is not None and n % 4096 == 0 and cancelled():
+                return None
+            sec, nsec, mode, size, sha, flags = unpack(data, pos)
+            start = pos + 62
+            skipped = 2 if flags & 0x3000 else 1 if flags & 0x8000 else 0  # Stage, assume-valid
+            if flags & 0x4000:                              # Extended flags (v3+)
+                if not skipped and data[start] & 0x40:      # skip-worktree
+                    skipped = 1
+                start += 2
+            if version == 4:
+                c = data[start]             # Bytes to drop from the last path
+                strip = c & 0x7f
+                start += 1
+                while c & 0x80:
+                    c = data[start]
+                    strip = (strip + 1) << 7 | (c & 0x7f)
+                    start += 1
+                end = data.index(0, start)
+                name = name[:len(name) - strip] + data[start:end]
+                pos = end + 1
+            else:
+                end = data.index(0, start)
+                name = data[start:end]
+                pos += (end - pos + 8) & ~7
+            paths.append(name)
+            mtimes.append(sec * 1000000000 + nsec)
+            sizes.append(size)
+            modes.append(mode)
+            ids.append(sha)
+            skip.append(skipped)
+        while pos + 8 <= len(data) - 20:    # Extensions, then the checksum
+            signature, size = struct.unpack_from('>4sI', data, pos)
+            pos += 8
+            if signature == b'TREE':
+                index._read_trees(data, pos, pos + size)
+            pos += size
+        return index
+
+    def _read_trees(self, data, pos, end):
+        """Cache-tree extension: the directories in pre-order, each with
+        its entry count, subtree count and (when valid) tree id."""
+        stack = []      # [path prefix, subtrees still to come]
+        while pos < end:
+            nul = data.index(0, pos)
+            name = data[pos:nul]
+            space = data.index(b' ', nul)
+            newline = data.index(b'\n', space)
+            entries, subtrees = int(data[nul + 1:space]), int(data[space + 1:newline])
+            pos = newline + 1
+            sha = None
+            if entries >= 0:
+                sha = data[pos:pos + 20]
+                pos += 20
+            while stack and not stack[-1][1]:
+                stack.pop()
+            if stack:
+                stack[-1][1] -= 1
+                path = stack[-1][0] + name
+            else:
+                path = b''
+            self.trees[path] = (entries, sha)
+            stack.append([path + b'/' if path else b'', subtrees])
+
+    def range(self, prefix):
+        """(lo, hi): the entries below directory prefix ('' or ending in '/')."""
+        if not prefix:
+            return 0, len(self.paths)
+        lo = bisect_left(self.paths, prefix)
+        return lo, bisect_left(self.paths, prefix[:-1] + b'0', lo)   # '0' follows '/'
+
+
+class GitObjects:
+    """Reads objects from a repository's store: loose ones and those in
+    pack files (version 2 .idx, deltas resolved), just enough to walk
+    HEAD's trees. Pack indexes are mapped once and searched in place."""
+
+    OBJ_TREE, OBJ_OFS_DELTA, OBJ_REF_DELTA = 2, 6, 7
+    TYPES = {b'commit': 1, b'tree': 2, b'blob': 3, b'tag': 4}     # Pack type numbers
+
+    def __init__(self, objects_dir):
+        self.dir = objects_dir
+        self._packs = None      # [(idx mmap, object count, pack file)]
+
+    def close(self):
+        for idx, _, pack in self._packs or ():
+            idx.close()
+            pack.close()
+        self._packs = None
+
+    def _load_packs(self):
+        self._packs = []
+        pack_dir = os.path.join(self.dir, 'pack')
+        try:
+            names = sorted(name for name in os.listdir(pack_dir) if name.endswith('.idx'))
+        except OSError:
+            return
+        for name in names:
+            try:
+                with open(os.path.join(pack_dir, name), 'rb') as f:
+                    idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                pack = open(os.path.join(pack_dir, name[:-4] + '.pack'), 'rb')
+            except (OSError, ValueError):
+                continue
+            if idx[:8] != b'\xfftOc\x00\x00\x00\x02':
+                idx.close()
+                pack.close()
+                continue
+            self._packs.append((idx, struct.unpack_from('>I', idx, 8 + 255 * 4)[0], pack))
+
+    def read(self, sha):
+        """(type number, data) of object sha (bytes). Raises KeyError if
+        it is not in the store."""
+        hex_id = sha.hex()
+        try:
+            with open(os.path.join(self.dir, hex_id[:2], hex_id[2:]), 'rb') as f:
+                raw = zlib.decompress(f.read())
+            header, _, data = raw.partition(b'\0')
+            return self.TYPES[header.split(b' ')[0]], data
+        except FileNotFoundError:
+            pass
+        if self._packs is None:
+            self._load_packs()
+        for idx, nobjects, pack in self._packs:
+            offset = self._find(idx, nobjects, sha)
+            if offset is not None:
+                return self._unpack(pack, offset)
+        raise KeyError(hex_id)
+
+    @staticmethod
+    def _find(idx, nobjects, sha):
+        """Offset of sha in a pack, from its .idx (fan-out, then bisect)."""
+        first = sha[0]
+        lo = struct.unpack_from('>I', idx, 8 + (first - 1) * 4)[0] if first else 0
+        hi = struct.unpack_from('>I', idx, 8 + first * 4)[0]
+        ids = 8 + 256 * 4
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = idx[ids + mid * 20:ids + mid * 20 + 20]
+            if probe < sha:
+                lo = mid + 1
+            elif probe > sha:
+                hi = mid
+            else:
+                offsets = ids + nobjects * 24   # Past the ids and CRCs
+                offset = struct.unpack_from('>I', idx, offsets + mid * 4)[0]
+                if offset & 0x80000000:          # In the 64-bit table
+                    offset = struct.unpack_from('>Q', idx, offsets + nobjects * 4
+                                                + (offset & 0x7fffffff) * 8)[0]
+                return offset
+        return None
+
+    def _unpack(self, pack, offset):
+        """(type, data) of the pack entry at offset, undeltified."""
+        pack.seek(offset)
+        head = pack.read(32)
+        c = head[0]
+        kind, size, shift, pos = (c >> 4) & 7, c & 15, 4, 1
+        while c & 0x80:
+            c = head[pos]
+            size |= (c & 0x7f) << shift
+            shift += 7
+            pos += 1
+        base = None
+        if kind == self.OBJ_OFS_DELTA:
+            c = head[pos]
+            distance = c & 0x7f
+            pos += 1
+            while c & 0x80:
+                c = head[pos]
+                distance = (distance + 1) << 7 | (c & 0x7f)
+                pos += 1
+            base = self._unpack(pack, offset - distance)
+        elif kind == self.OBJ_REF_DELTA:
+            base_id = head[pos:pos + 20]
+            pos += 20
+        pack.seek(offset + pos)
+        data = self._inflate(pack, size)
+        if kind == self.OBJ_REF_DELTA:
+            base = self.read(base_id)
+        if base is not None:
+            return base[0], self._apply_delta(base[1], data)
+        return kind, data
+
+    @staticmethod
+    def _inflate(f, size):
+        inflater = zlib.decompressobj()
+        out = b''
+        while not inflater.eof and len(out) < size:
+            chunk = f.read(max(4096, size - len(out)))
+            if not chunk:
+                break
+            out += inflater.decompress(chunk)
+        return out
+
+    @staticmethod
+    def _apply_delta(base, delta):
+        """Rebuild an object from its base and a git delta (copy/insert
+        instructions after the two sizes)."""
+        pos = 0
+        for _ in range(2):              # Source and target sizes: skipped
+            while delta[pos] & 0x80:
+                pos += 1
+            pos += 1
+        out = bytearray()
+        end = len(delta)
+        while pos < end:
+            op = delta[pos]
+            pos += 1
+            if op & 0x80:               # Copy from base
+                start = length = 0
+                for k in range(4):
+                    if op & (1 << k):
+                        start |= delta[pos] << (8 * k)
+                        pos += 1
+                for k in range(3):
+                    if op & (0x10 << k):
+                        length |= delta[pos] << (8 * k)
+                        pos += 1
+                out += base[start:start + (length or 0x10000)]
+            elif op:                    # Insert the next op bytes
+                out += delta[pos:pos + op]
+                pos += op
+            else:
+                raise ValueError('Bad git delta')
+        return bytes(out)
+
+    def tree(self, sha):
+        """Entries of tree sha: name -> (mode, id)."""
+        kind, data = self.read(sha)
+        if kind != self.OBJ_TREE:
+            raise ValueError('Not a git tree')
+        entries = {}
+        pos, end = 0, len(data)
+        while pos < end:
+            space = data.index(b' ', pos)
+            nul = data.index(0, space)
+            entries[data[space + 1:nul]] = (int(data[pos:space], 8), data[nul + 1:nul + 21])
+            pos = nul + 21
+        return entries
+
+    def head_tree(self, commit, path):
+        """Entries of the tree at path (bytes, '' for the top) in commit;
+        {} if it is not there (or there is no commit yet)."""
+        if commit is None:
+            return {}
+        kind, data = self.read(commit)
+        tree = self.tree(bytes.fromhex(data[5:45].decode()))    # 'tree <id>'
+        for part in path.split(b'/') if path else ():
+            mode, sha = tree.get(part, (0, None))
+            if mode != 0o40000:
+                return {}
+            tree = self.tree(sha)
+        return tree
+
+
+def _gitignore_regex(pattern):
+    """Regex source for a .gitignore glob: '*' and '?' stop at '/', '**'
+    spans directories, [...] classes, backslash escapes."""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            j = i
+            while j < n and pattern[j] == '*':
+                j += 1
+            if j - i >= 2 and (i == 0 or pattern[i - 1] == '/'):
+                if j == n:
+                    out.append('.*')            # Trailing '**': everything inside
+                elif pattern[j] == '/':
+                    out.append('(?:.*/)?')      # '**/': any directories
+                    j += 1
+                else:
+                    out.append('[^/]*')
+            else:
+                out.append('[^/]*')
+            i = j
+            continue
+        if c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            j = pattern.find(']', j)
+            if j >= 0:
+                body = pattern[i + 1:j].replace('\\', '\\\\').replace('[', '\\[')
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                out.append(f'[{body}]')
+                i = j + 1
+                continue
+            out.append('\\[')
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class GitIgnore:
+    """The ignore rules in effect in one directory of a work tree:
+    .git/info/exclude, then each .gitignore from the top down to the
+    directory; the last rule matching a path decides, '!' re-includes.
+    When the directory itself or one above it is ignored, so is all of
+    it. (core.excludesFile is not read.)"""
+
+    def __init__(self, repo, rel):
+        self.rules = []         # (regex, negated, directories only, anchored, base)
+        self.everything = False
+        self._load(os.path.join(repo.common, 'info', 'exclude'), '')
+        self._load(os.path.join(repo.root, '.gitignore'), '')
+        base = ''
+        for part in rel.split('/') if rel else ():
+            path = base + part
+            if self.ignored(path, True):
+                self.everything = True
+                return
+            base = path + '/'
+            self._load(os.path.join(repo.root, path, '.gitignore'), base)
+
+    def _load(self, path, base):
+        try:
+            with open(path, encoding='utf-8', errors='surrogateescape') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            rule = self._compile(line)
+            if rule is not None:
+                self.rules.append(rule + (base,))
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _compile(line):
+        """(regex, negated, directories only, anchored) of a .gitignore
+        line, or None for a blank or a comment."""
+        stripped = line.rstrip(' ')
+        if stripped.endswith('\\') and len(stripped) < len(line):
+            stripped += ' '                     # 'name\ ' keeps its space
+        line = stripped
+        if not line or line.startswith('#'):
+            return None
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        anchored = '/' in line                  # Else it matches names at any depth
+        line = line.lstrip('/')
+        if not line:
+            return None
+        return re.compile(_gitignore_regex(line) + r'\Z'), negated, dir_only, anchored
+
+    def ignored(self, path, is_dir):
+        """Whether path (from the top of the work tree) is ignored."""
+        if self.everything:
+            return True
+        name = path.rpartition('/')[2]
+        for regex, negated, dir_only, anchored, base in reversed(self.rules):
+            if (dir_only and not is_dir) or not path.startswith(base):
+                continue
+            if regex.match(path[len(base):] if anchored else name):
+                return not negated
+        return False
+
+
+class GitIndexCache(ArchiveCache):
+    """Parsed .git/index files, least recently used dropped first, keyed
+    like archive indexes by the file's (dev, inode, mtime, size): an
+    index is parsed again only after git rewrote it."""
+
+    SIZE = 4
+
+    def __init__(self, size=SIZE):
+        super().__init__(size)
+
+    def index(self, path):
+        index = self.get(path)
+        if index is None:
+            index = GitIndex.read(path)
+            self.put(index)
+        return index
+
+
+class GitStatus:
+    """Git status markers ('M', 'S', '?', '!'; the first that applies) of
+    the entries of one directory of a work tree, worked out on a worker
+    thread from the repository's own files, without running git:
+
+    - tracked files come from the parsed .git/index (given when cached,
+      else read here), a range of it found by bisection;
+    - 'M' when the file's lstat differs from what the index recorded,
+      confirmed by hashing it when only its mtime moved (or it is racily
+      new), like git does; clean filters and autocrlf are not applied;
+    - 'S' when the index entry differs from HEAD's tree, read from the
+      object store; a subdirectory is 'S' when its cache-tree id differs
+      from HEAD's, or where git left that entry invalid, when the index
+      entries below it differ from HEAD's trees;
+    - '?' or '!' for names the index does not have, by the .gitignore
+      rules (a subdirectory counts as untracked only when nothing below
+      it is tracked).
+
+    on_result(status, markers, done) runs on the UI thread, first with
+    the markers above, then (done) once the subdirectories holding
+    changed files are known too, which takes an lstat per tracked file
+    below them, and those staged without a valid cache-tree entry. After
+    cancel() nothing is delivered."""
+
+    CHUNK = 256     # Entries checked between looks at the cancel flag
+
+    def __init__(self, repo, path, names, index, scheduler, on_result):
+        self.repo = repo
+        self.path = path
+        self.dir_names, self.file_names = names
+        self.index = index      # GitIndex (read by the worker if None)
+        self.read_index = index is None
+        self.scheduler = scheduler
+        self.on_result = on_result
+        self.error = None
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='git-status', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _post(self, markers, done):
+        def deliver():
+            if not self.cancelled:
+                self.on_result(self, markers, done)
+        if not self.cancelled:
+            self.scheduler.call_soon_threadsafe(deliver)
+
+    def _run(self):
+        markers = {}
+        try:
+            self._status(markers)
+        except (OSError, ValueError, KeyError, IndexError, struct.error, zlib.error) as e:
+            self.error = e
+        self._post(dict(markers), True)
+
+    def _status(self, markers):
+        repo = self.repo
+        rel = os.path.relpath(self.path, repo.root)
+        rel = '' if rel == '.' else rel
+        if self.index is None:
+            try:
+                self.index = GitIndex.read(repo.index_path, lambda: self.cancelled)
+            except FileNotFoundError:
+                self.index = GitIndex(None)     # Nothing added yet
+            if self.index is None:
+                return
+        objects = GitObjects(os.path.join(repo.common, 'objects'))
+        try:
+            self._compare(markers, rel, objects)
+        finally:
+            objects.close()
+
+    def _compare(self, markers, rel, objects):
+        """Fill markers for directory rel, reading HEAD from objects."""
+        repo, index = self.repo, self.index
+        prefix = os.fsencode(rel) + b'/' if rel else b''
+        try:
+            head = objects.head_tree(repo.head_commit(), prefix[:-1])
+        except (OSError, ValueError, KeyError, IndexError, zlib.error):
+            head = None         # Unreadable (e.g. reftable refs): no 'S'
+
+        # Direct children: files from their entries, subdirectories from
+        # the range of entries below them
+        top = os.fsencode(repo.root)
+        lo, hi = index.range(prefix)
+        subdirs = []
+        tracked = set()
+        k, start = lo, len(prefix)
+        while k < hi:
+            entry_path = index.paths[k]
+            slash = entry_path.find(b'/', start)
+            if slash < 0:
+                name = entry_path[start:]
+                if index.skip[k] == 2 or (not index.skip[k]
+                                          and self._changed(k, os.path.join(top, entry_path))):
+                    marker = 'M'        # Changed, or a merge conflict
+                elif head is not None and head.get(name) != (index.modes[k], index.ids[k]):
+                    marker = 'S'
+                else:
+                    marker = None
+                k += 1
+            else:
+                name = entry_path[start:slash]
+                end = bisect_left(index.paths, entry_path[:slash] + b'0', k, hi)
+                subdirs.append((name, k, end))
+                tree = index.trees.get(entry_path[:slash])
+                marker = None
+                if head is not None and tree is not None and tree[0] >= 0:
+                    if head.get(name) != (0o40000, tree[1]):
+                        marker = 'S'
+                k = end
+            tracked.add(os.fsdecode(name))
+            if marker is not None:
+                markers[os.fsdecode(name)] = marker
+            if self.cancelled:
+                return
+
+        ignore = GitIgnore(repo, rel)
+        base = rel + '/' if rel else ''
+        for names, is_dir in ((self.dir_names, True), (self.file_names, False)):
+            for name in names:
+                if name not in tracked and not (name == '.git' and not rel):
+                    markers[name] = '!' if ignore.ignored(base + name, is_dir) else '?'
+        self._post(dict(markers), False)
+
+        # Subdirectories holding changed files: stop at the first one.
+        # Then, where git left no valid cache-tree entry (after a reset,
+        # stash or checkout), whether their entries differ from HEAD's
+        for name, lo, hi in subdirs:
+            for k in range(lo, hi):
+                if (k - lo) % self.CHUNK == 0 and self.cancelled:
+                    return
+                if index.skip[k] == 2 or (not index.skip[k]
+                                          and self._changed(k, os.path.join(top, index.paths[k]))):
+                    markers[os.fsdecode(name)] = 'M'
+                    break
+            else:
+                tree = index.trees.get(prefix + name)
+                if head is not None and (tree is None or tree[0] < 0):
+                    mode, sha = head.get(name, (0, None))
+                    try:
+                        staged = mode != 0o40000 or self._staged(objects, prefix + name + b'/',
+                                                                 lo, hi, sha)
+                    except (OSError, ValueError, KeyError, IndexError, zlib.error):
+                        staged = False
+                    if self.cancelled:
+                        return
+                    if staged:
+                        markers[os.fsdecode(name)] = 'S'
+
+    def _staged(self, objects, prefix, lo, hi, tree_id):
+        """Whether index entries lo to hi, those below directory prefix,
+        differ from HEAD's tree tree_id there: by the cache-tree id where
+        it is valid, else entry by entry. Stops at the first difference."""
+        index = self.index
+        cached = index.trees.get(prefix[:-1])
+        if cached is not None and cached[0] >= 0:
+            return cached[1] != tree_id
+        entries = objects.tree(tree_id)
+        k, start, seen = lo, len(prefix), 0
+        while k < hi:
+            if self.cancelled:
+                return False
+            entry_path = index.paths[k]
+            slash = entry_path.find(b'/', start)
+            if slash < 0:
+                if index.skip[k] == 2 or (entries.get(entry_path[start:])
+                                          != (index.modes[k], index.ids[k])):
+                    return True
+                k += 1
+            else:
+                end = bisect_left(index.paths, entry_path[:slash] + b'0', k, hi)
+                mode, sha = entries.get(entry_path[start:slash], (0, None))
+                if mode != 0o40000 or self._staged(objects, entry_path[:slash + 1], k, end, sha):
+                    return True
+                k = end
+            seen += 1
+        return seen != len(entries)     # Else some were removed
+
+    def _changed(self, k, path):
+        """Whether the work tree file of index entry k differs from it."""
+        index = self.index
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return True         # Deleted
+        mode = index.modes[k]
+        if mode == 0o160000:
+            return False        # Submodule: not looked into
+        if stat.S_IFMT(st.st_mode) != stat.S_IFMT(mode):
+            return True
+        if stat.S_ISREG(st.st_mode) and (st.st_mode ^ mode) & 0o100:
+            return True         # Executable bit
+        if st.st_size & 0xffffffff != index.sizes[k] and index.sizes[k]:
+            return True         # (Size 0 may just be unknown: hash it)
+        mtime = index.mtimes[k]
+        seen = st.st_mtime_ns if mtime % 1000000000 else st.st_mtime_ns // 1000000000 * 1000000000
+        if seen == mtime and mtime < index.mtime_ns:
+            return False        # Same stat data, written well before the index
+        return self._hash(path, st) != index.ids[k]
+
+    @staticmethod
+    def _hash(path, st):
+        """Git blob id of the file at path (None if it cannot be read)."""
+        digest = hashlib.sha1(b'blob %d\0' % st.st_size)
+        try:
+            if stat.S_ISLNK(st.st_mode):
+                digest.update(os.readlink(path))
+            else:
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(chunk)
+        except OSError:
+            return None
+        return digest.digest()
+
+
+# ═══════════════════════════════════════════════════════════
+# Directory Tree
+# ═══════════════════════════════════════════════════════════
+
+class DirTree:
+    """A directory tree flattened into the rows it shows, for the File
+    Manager's tree pane: row i is names[i] at depths[i], and state[i]
+    says whether its subdirectories follow it (EXPANDED) or are still
+    being listed (LOADING).
+
+    Expanding a row splices its children in right after it and collapsing
+    cuts its subtree out, one slice each, so opening a directory with 50k
+    subdirectories never rebuilds the rows around it; rows are formatted
+    only when drawn. A row's path is found by walking up its parents
+    (bytearray.rfind on the depths). The tree lists nothing itself: the
+    File Manager hands it the names from the listings it shares with the
+    file list."""
+
+    COLLAPSED, EXPANDED, LOADING = 0, 1, 2
+    MAX_DEPTH = 255     # depths is a bytearray
+
+    def __init__(self, root='/'):
+        self.names = [root]
+        self.depths = bytearray(1)
+        self.state = bytearray(1)
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _shallower(depth):
+        """Pattern finding the first row at depth or above."""
+        return re.compile(b'[\\x00-' + re.escape(bytes([depth])) + b']')
+
+    def end(self, i):
+        """Row just past the subtree of row i."""
+        m = self._shallower(self.depths[i]).search(self.depths, i + 1)
+        return m.start() if m else len(self.names)
+
+    def parent(self, i):
+        """Row of the directory containing row i (-1 for the root)."""
+        depth = self.depths[i]
+        return self.depths.rfind(depth - 1, 0, i) if depth else -1
+
+    def path(self, i):
+        parts = []
+        while i > 0:
+            parts.append(self.names[i])
+            i = self.parent(i)
+        return os.path.join(self.names[0], *reversed(parts))
+
+    def children(self, i):
+        """Names of the rows directly under an expanded row i."""
+        depth = self.depths[i] + 1
+        return [self.names[j] for j in range(i + 1, self.end(i)) if self.depths[j] == depth]
+
+    def locate(self, path):
+        """(row, rest): the row of path, or of its deepest ancestor shown,
+        and the names still missing below it."""
+        parts = [part for part in path[len(self.names[0]):].split('/') if part]
+        i = 0
+        for k, name in enumerate(parts):
+            if self.state[i] != self.EXPANDED:
+                return i, parts[k:]
+            depth, j, end = self.depths[i] + 1, i + 1, self.end(i)
+            while True:
+                try:
+                    j = self.names.index(name, j, end)
+                except ValueError:
+                    return i, parts[k:]
+                if self.depths[j] == depth:
+                    break
+                j += 1
+            i = j
+        return i, []
+
+    def expand(self, i, names):
+        """Show names (already sorted) under row i; returns how many rows
+        were added. Below MAX_DEPTH a row just opens empty."""
+        if self.state[i] == self.EXPANDED:
+            return 0
+        self.state[i] = self.EXPANDED
+        depth = self.depths[i] + 1
+        if depth > self.MAX_DEPTH:
+            return 0
+        self.names[i + 1:i + 1] = names
+        self.depths[i + 1:i + 1] = bytes([depth]) * len(names)
+        self.state[i + 1:i + 1] = bytes(len(names))
+        return len(names)
+
+    def collapse(self, i):
+        """Hide the subtree of row i; returns how many rows went."""
+        end = self.end(i)
+        del self.names[i + 1:end], self.depths[i + 1:end], self.state[i + 1:end]
+        self.state[i] = self.COLLAPSED
+        return end - i - 1
+
+    def row_text(self, i):
+        return f'{"  " * self.depths[i]}{"▸▾…"[self.state[i]]} {self.names[i]}'
+
+
+# ═══════════════════════════════════════════════════════════
+# File Manager Window
+# ═══════════════════════════════════════════════════════════
+
+EMPTY_DIR_ROW = '  (empty directory)'
+
+
+class FileManagerWindow(Window):
+    """Interactive file manager window with directory navigation."""
+
+    # View menu sort entries: (label, DirListing sort key)
+    SORT_MENU = [
+        ('Sort by Name', 'name'),
+        ('Sort Natural', 'natural'),
+        ('Sort by Type', 'ext'),
+        ('Sort by Size', 'size'),
+        ('Sort by Date', 'mtime'),
+    ]
+
+    def __init__(self, x, y, w, h, start_path=None, scheduler=None, cache=None,
+                 usage_cache=None, previews=None, archives=None, git_indexes=None):
+        super().__init__('File Manager', x, y, w, h, content=[])
+        self.current_path = os.path.realpath(start_path or os.path.expanduser('~'))
+        self.archive = None         # (archive file, inner dir) while browsing one
+        self.archives = archives or ArchiveCache()
+        self.entries = DirListing(self.current_path)
+        self.view = self.entries    # What the rows show: entries or a ListingFilter
+        self.filter_text = None     # Type-ahead filter (None: not filtering)
+        self._filter_return = None  # Entry selected before the filter started
+        self.mark_prompt = None     # (mark?, glob being typed) after + or -
+        self.sort_key = 'name'      # DirListing.SORT_KEYS; choosing it again reverses
+        self.sort_reverse = False
+        self.detailed = False       # ls -l columns (permissions, owner, ...)
+        self.selected_index = 0
+        self.show_hidden = False
+        self.error_message = None
+        self.scan_stats = None      # ScanStats of the last listing
+        # With a scheduler, directories load in the background (DirectoryLoader)
+        self.scheduler = scheduler
+        self._loader = None
+        self._pending_select = None  # Name to select once the listing has it
+        # Shared DirectoryCache: revisits are instant, changes are applied live
+        self.cache = cache
+        self._watched = None        # Path registered with the cache
+        # Disk usage of the subdirectories (DiskUsage), shown as their sizes
+        self.usage_cache = usage_cache or DiskUsageCache()
+        self.usage = None           # DiskUsage of current_path, running or done
+        self.usage_running = False
+        self.usage_sizes = None     # Subdirectory name -> bytes, as measured
+        # Preview pane of the selected file (from a shared PreviewCache)
+        self.preview = False
+        self.previews = previews or PreviewCache()
+        # Directory tree pane (DirTree), its listings shared through the cache
+        self.tree = None            # DirTree while the pane is shown
+        self.tree_focus = False     # Keys move the tree cursor, not the list's
+        self.tree_index = 0
+        self.tree_scroll = 0
+        self._tree_loaders = {}     # Path -> DirectoryLoader listing it for the tree
+        self._tree_target = None    # Path the tree is being expanded down to
+        # Git markers of the entries (GitStatus) while in a work tree
+        self.git_status = True      # Overlay on (G)
+        self.git_indexes = git_indexes or GitIndexCache()
+        self.git_branch = None
+        self.git_markers = {}       # Entry name -> GitStatus marker
+        self._git_path = None       # Directory git_markers belong to
+        self._git_job = None
+        self._git_watched = None    # Repository dir registered with the cache
+        self.window_menu = WindowMenu({
+            'File': [
+                ('Open       Enter', 'fm_open'),
+                ('Parent Dir  Bksp', 'fm_parent'),
+                ('Find...        F', 'fm_find'),
+                ('─────────────',    None),
+                ('Close',            'fm_close'),
+            ],
+            'Edit': [
+                ('Copy           C', 'fm_copy'),
+                ('Cut            X', 'fm_cut'),
+                ('Paste          V', 'fm_paste'),
+                ('Delete       Del', 'fm_delete'),
+                ('─────────────',    None),
+                ('Select       Spc', 'fm_mark'),
+                ('Select All    ^A', 'fm_mark_all'),
+                ('Select...      +', 'fm_mark_glob'),
+                ('Unselect...    -', 'fm_unmark_glob'),
+                ('Invert         *', 'fm_invert_marks'),
+                ('Select None',      'fm_clear_marks'),
+            ],
+            'View': [
+                ('Hidden Files   H', 'fm_toggle_hidden'),
+                ('Details        D', 'fm_toggle_details'),
+                ('Tree           T', 'fm_toggle_tree'),
+                ('Preview        P', 'fm_toggle_preview'),
+                ('Git Status     G', 'fm_toggle_git'),
+                ('Disk Usage     U', 'fm_disk_usage'),
+                ('Refresh',          'fm_refresh'),
+                ('─────────────',    None),
+            ] + [(label, f'fm_sort_{key}') for label, key in self.SORT_MENU],
+        })
+        self._update_sort_menu()
+        self.h = max(self.h, 8)
+        self._rebuild_content()
+
+    def _header_lines(self):
+        """Number of non-entry header lines at top of content."""
+        return 2  # path line + separator line
+
+    def _entry_to_content_index(self, entry_idx):
+        """Convert entry index to content list index."""
+        return self._header_lines() + entry_idx
+
+    def _content_to_entry_index(self, content_idx):
+        """Convert content list index to entry index, or -1 if on header."""
+        idx = content_idx - self._header_lines()
+        if 0 <= idx < len(self.view):
+            return idx
+        return -1
+
+    def _rebuild_content(self, rescan=False):
+        """List the current directory and rebuild the rows: from the cache
+        unless rescan, else scanned (streaming from a worker thread when
+        there is a scheduler)."""
+        self._stop_loader()
+        self._stop_git()
+        self.error_message = None
+        if self._git_path != self.current_path:
+            self._git_path = self.current_path
+            self.git_markers, self.git_branch = {}, None
+        if self.usage is not None and self.usage.path != self.current_path:
+            self._stop_usage()
+            self.usage = self.usage_sizes = None
+
+        parent = self._parent_of(self.current_path)
+        self.entries = DirListing(self.current_path, parent=parent)
+        self.entries.sort_key, self.entries.reverse = self.sort_key, self.sort_reverse
+        self._refilter()
+        self.content = ListingRows(self._header(), self.view, detailed=self.detailed)
+        self.content.markers = self.git_markers
+        self.selected_index = 0
+        self.scroll_offset = 0
+
+        if self.archive is not None:
+            if self.cache is not None:
+                self._watch(None)
+            self._list_archive(parent)
+            return
+
+        cache = self.cache
+        if cache is not None:
+            self._watch(self.current_path)
+            if rescan:
+                cache.invalidate(self.current_path)
+            cached = cache.get(self.current_path, self.show_hidden)
+            if cached is not None and not self._sorted_like(cached):
+                cached = cached.copy()  # Other windows may show it in its order
+                cached.sort(self.sort_key, self.sort_reverse)
+            if cached is not None:
+                self.scan_stats = ScanStats()
+                self.scan_stats.entries = cached.count
+                self.entries = cached
+                self._refilter()
+                self._finish_listing()
+                return
+            cache.begin(self.current_path)
+
+        if self.scheduler is None:
+            self.scan_stats = ScanStats()
+            error = None
+            try:
+                self.entries = scan_directory(self.current_path, self.show_hidden,
+                                              self.scan_stats, parent)
+                if not self._sorted_like(self.entries):
+                    self.entries.sort(self.sort_key, self.sort_reverse)
+            except OSError as e:
+                error = e
+            self._refilter()
+            if cache is not None:
+                cache.end(self.current_path, None if error else self.entries, self.show_hidden)
+            self._finish_listing(error)
+        else:
+            self._loader = DirectoryLoader(self.current_path, self.show_hidden, self.scheduler,
+                                           self._on_scan_batch, self._on_scan_done).start()
+            self.scan_stats = self._loader.stats
+            self._update_title()
+
+    @staticmethod
+    def _parent_of(path):
+        """Path of the '..' row of path's listing (None at the root)."""
+        parent = os.path.dirname(path)
+        return parent if parent != path else None
+
+    def _header(self, report=False):
+        """Path bar + separator; the separator carries the filter being
+        typed, or else can carry the scan report."""
+        rule = '─' * (self.body_rect()[2] - 2)
+        usage = self.usage
+        if self.filter_text is not None:
+            # "─ /text_ 12 matches ───"
+            view = self.view
+            more = '+' if view is not self.entries and not view.done else ''
+            line = f'─ /{self.filter_text}_ {view.count}{more} matches '
+            rule = (line + rule[len(line):])[:len(rule)]
+        elif self.mark_prompt is not None:
+            # "─ Select: *.py_ ───"
+            on, text = self.mark_prompt
+            line = f'─ {"Select" if on else "Unselect"}: {text}_ '
+            rule = (line + rule[len(line):])[:len(rule)]
+        elif report and (usage is not None or self.scan_stats):
+            # "─── N entries, M syscalls ─", or the disk usage measured
+            if usage is None:
+                text = f' {self.scan_stats.summary()} '
+            elif usage.cancelled:
+                text = f' Stopped: {usage.summary()} '
+            elif self.usage_running:
+                text = f' Measuring… {usage.summary()} '
+            else:
+                text = f' Used {usage.summary()}, {usage.seconds:.1f} s '
+            if len(text) + 4 <= len(rule):
+                rule = rule[:len(rule) - len(text) - 2] + text + '──'
+        branch = f'  [{self.git_branch}]' if self.git_branch else ''
+        return [f' 📂 {self.current_path}{branch}', ' ' + rule]
+
+    def _finish_listing(self, error=None, cancelled=False):
+        """Final rows once the listing is complete, failed or cancelled."""
+        self._apply_usage()
+        trailer = []
+        if error is not None:
+            self.error_message = 'Permission denied' if isinstance(error, PermissionError) else str(error)
+            trailer.append(f'  ⛔ {self.error_message}')
+        elif cancelled:
+            trailer.append('  ⛔ Listing cancelled')
+        elif not self.entries:
+            trailer.append(EMPTY_DIR_ROW)
+        self.content = ListingRows(self._header(report=error is None), self.view, trailer,
+                                   detailed=self.detailed)
+        if error is None and not cancelled:
+            self._sync_tree(self.entries)
+            self.update_git_status()
+        self._reselect(self._pending_select)
+        self._pending_select = None
+        self._update_title()
+
+    def _selected_name(self):
+        """Name of the selected entry, if the user moved off the first row."""
+        if 0 < self.selected_index < len(self.view):
+            return self.view.name(self.selected_index)
+        return None
+
+    def _reselect(self, name):
+        """Select the entry called name, if present."""
+        if not name:
+            return
+        i = self.view.index_of(name)
+        if i >= 0:
+            self.selected_index = i
+            self._ensure_visible()
+            if name == self._pending_select:
+                self._pending_select = None
+
+    def _on_scan_batch(self, loader, dirs, files, sizes, mtimes):
+        """DirectoryLoader callback (UI thread): show the entries so far."""
+        keep = self._pending_select or self._selected_name()
+        self.entries.extend(dirs, files, sizes, mtimes)
+        self._refilter()
+        self.content.invalidate()  # Files moved down past the new directories
+        self._reselect(keep)
+        self._update_title()
+        self.invalidate()
+
+    def _on_scan_done(self, loader, error):
+        """DirectoryLoader callback (UI thread): sort once and finish."""
+        self._loader = None
+        keep = self._pending_select or self._selected_name()
+        self.entries.sort()
+        self._refilter()
+        if self.cache is not None:
+            self.cache.end(loader.path, None if error else self.entries, loader.show_hidden)
+        self._finish_listing(error)
+        self._reselect(keep)
+        self.invalidate()
+
+    def _stop_loader(self):
+        if self._loader is not None:
+            self._loader.cancel()
+            if self.cache is not None and isinstance(self._loader, DirectoryLoader):
+                self.cache.end(self._loader.path)  # Partial: not cached
+            self._loader = None
+
+    def _watch(self, path):
+        """Follow changes to path (and stop following the previous one)."""
+        if self._watched == path:
+            return
+        if self._watched is not None:
+            self.cache.unwatch(self._watched, self._on_dir_changed)
+        self._watched = path
+        if path is not None:
+            self.cache.watch(path, self._on_dir_changed)
+
+    def _on_dir_changed(self, apply):
+        """DirectoryCache callback (UI thread): entries were added, removed
+        or modified; keep the same entry selected."""
+        keep = self._selected_name()
+        if apply is None:
+            self._pending_select = keep
+            self._rebuild_content(rescan=True)
+        else:
+            apply(self.entries, self.show_hidden)
+            self._refilter()
+            self.content.invalidate()
+            if not self.error_message and self.content.trailer in ([], [EMPTY_DIR_ROW]):
+                self.content.trailer = [] if self.entries else [EMPTY_DIR_ROW]
+            self.selected_index = min(self.selected_index, max(0, len(self.view) - 1))
+            self._reselect(keep)
+            self._update_title()
+            self._sync_tree(self.entries)
+            self.update_git_status()
+        self.invalidate()
+
+    def _list_archive(self, parent):
+        """List the directory current_path names inside self.archive, from
+        the archive's index: the shared ArchiveCache's, else read once (on
+        a worker thread when there is a scheduler) and cached."""
+        archive, inner = self.archive
+        index = self.archives.get(archive)
+        self.scan_stats = None
+        if index is None and self.scheduler is not None:
+            self._loader = ArchiveLoader(archive, self.scheduler, self._on_archive_read).start()
+            self._update_title()
+            return
+        error = None
+        try:
+            if index is None:
+                index = self.archives.index(archive)
+            self.entries = index.listing(inner, self.current_path, self.show_hidden, parent)
+            if not self._sorted_like(self.entries):
+                self.entries.sort(self.sort_key, self.sort_reverse)
+        except ARCHIVE_ERRORS as e:
+            error = e
+        self._refilter()
+        self._finish_listing(error)
+
+    def _on_archive_read(self, loader, index, error):
+        """ArchiveLoader callback (UI thread): list from the new index."""
+        self._loader = None
+        if index is not None:
+            self.archives.put(index)
+            self._rebuild_content()
+        else:
+            self._finish_listing(error)
+        self.invalidate()
+
+    def cancel_loading(self):
+        """Stop a background listing, keeping the entries loaded so far."""
+        if self._loader is None:
+            return False
+        keep = self._selected_name()
+        self._stop_loader()
+        self.entries.sort()
+        self._refilter()
+        self._finish_listing(cancelled=True)
+        self._reselect(keep)
+        return True
+
+    def close(self):
+        self._stop_loader()
+        self._stop_usage()
+        self._stop_tree_loaders()
+        self._stop_git()
+        if self.cache is not None:
+            self._watch(None)
+            self._watch_git(None)
+
+    def measure_usage(self):
+        """Measure the disk usage of every subdirectory (DiskUsage): the
+        sizes fill in as they are counted, then the listing is sorted by
+        size, largest first. Not inside an archive."""
+        if self.archive is not None:
+            return
+        self._stop_usage()
+        self.usage_sizes = {}
+        self.usage_running = True
+        self.usage = DiskUsage(self.current_path, self.usage_cache, self.scheduler,
+                               self._on_usage, self._on_usage_done)
+        self.usage.start()
+
+    def _on_usage(self, usage, sizes):
+        """DiskUsage callback (UI thread): the sizes counted so far."""
+        self.usage_sizes = sizes
+        self._apply_usage()
+        self.content.header = self._header(report=self._loader is None and not self.error_message)
+        self.invalidate()
+
+    def _on_usage_done(self, usage, sizes):
+        self.usage_running = False
+        self._on_usage(usage, sizes)
+        self._sort_by('size', True)
+
+    def _stop_usage(self):
+        """Stop measuring, keeping the sizes counted so far."""
+        if not self.usage_running:
+            return False
+        self.usage_running = False
+        self.usage.cancel()
+        self.content.header = self._header(report=self._loader is None and not self.error_message)
+        self.invalidate()
+        return True
+
+    def _apply_usage(self):
+        """Show the measured sizes on the directories of the listing."""
+        if self.usage_sizes is None or self._loader is not None:
+            return  # A listing still loading gets them when it is finished
+        keep = self._selected_name()
+        if self.entries.dir_sizes is None:
+            self.entries = self.entries.copy()  # The cache's copy stays without
+        self.entries.set_dir_sizes(self.usage_sizes)
+        self._refilter()
+        self._reselect(keep)
+
+    def update_git_status(self):
+        """Work out the git markers of the entries again (GitStatus, on a
+        worker thread) when the directory is in a work tree and the
+        overlay is on. The repository's dir is watched meanwhile, so that
+        git add, commit or checkout refresh them."""
+        self._stop_git()
+        repo = None
+        if self.git_status and self.archive is None and self.scheduler is not None:
+            repo = GitRepo.find(self.current_path)
+        if self.cache is not None:
+            self._watch_git(repo.gitdir if repo else None)
+        branch = repo.branch() if repo else None
+        if branch != self.git_branch:
+            self.git_branch = branch
+            self.content.header = self._header(report=self._loader is None and not self.error_message)
+        if repo is None:
+            self._set_git_markers({})
+            return
+        self.content.markers = self.git_markers
+        self._git_job = GitStatus(repo, self.current_path,
+                                  (self.entries.dir_names(), self.entries.file_names()),
+                                  self.git_indexes.get(repo.index_path), self.scheduler,
+                                  self._on_git_status).start()
+
+    def _on_git_status(self, job, markers, done):
+        """GitStatus callback (UI thread): show the markers; keep the index
+        it read for the next directory."""
+        if job.read_index and job.index is not None and job.index.key is not None:
+            self.git_indexes.put(job.index)
+            job.read_index = False
+        if done:
+            self._git_job = None
+        self._set_git_markers(markers)
+
+    def _set_git_markers(self, markers):
+        self.git_markers = markers
+        self.content.markers = markers
+        self.content.invalidate()
+        self.invalidate()
+
+    def _stop_git(self):
+        if self._git_job is not None:
+            self._git_job.cancel()
+            self._git_job = None
+
+    def _watch_git(self, gitdir):
+        """Follow changes to the repository's dir (and stop following the
+        previous one)."""
+        if self._git_watched == gitdir:
+            return
+        if self._git_watched is not None:
+            self.cache.unwatch(self._git_watched, self._on_git_changed)
+        self._git_watched = gitdir
+        if gitdir is not None:
+            self.cache.watch(gitdir, self._on_git_changed)
+
+    def _on_git_changed(self, apply):
+        """DirectoryCache callback (UI thread): the index, HEAD or the like
+        changed."""
+        if self._loader is None:
+            self.update_git_status()
+
+    def toggle_git_status(self):
+        """Show or hide the git markers."""
+        self.git_status = not self.git_status
+        self.update_git_status()
+
+    def _update_title(self):
+        """Update window title to show path basename and entry count."""
+        basename = os.path.basename(self.current_path) or '/'
+        count = self.entries.count
+        if self._loader is not None:
+            self.title = f'File Manager - {basename} (loading {count}…)'
+        elif self.entries.marked_count:
+            self.title = (f'File Manager - {basename} ({count} items, {self.entries.marked_count} '
+                          f'selected, {format_size(self.entries.marked_bytes)})')
+        else:
+            self.title = f'File Manager - {basename} ({count} items)'
+
+    def draw_contents(self, stdscr):
+        """Draw file manager with selection highlight."""
+        super().draw_contents(stdscr)
+        if self.tree is not None:
+            self._draw_tree(stdscr)
+        if not self.view:
+            return
+
+        bx, by, bw, bh = self.body_rect()
+        sel_content_idx = self._entry_to_content_index(self.selected_index)
+        visible_start = self.scroll_offset
+        visible_end = self.scroll_offset + bh
+
+        if self.entries.marked_count:
+            mark_attr = curses.color_pair(C_WIN_BODY) | curses.A_BOLD
+            for row in range(min(bh, len(self.content) - visible_start)):
+                entry_idx = self._content_to_entry_index(visible_start + row)
+                if entry_idx >= 0 and self.view.is_marked(entry_idx):
+                    safe_addstr(stdscr, by + row, bx, self.content[visible_start + row][:bw], mark_attr)
+
+        if visible_start <= sel_content_idx < visible_end:
+            screen_row = by + (sel_content_idx - self.scroll_offset)
+            sel_attr = curses.color_pair(C_FM_SELECTED) | curses.A_BOLD
+            display = self.content[sel_content_idx][:bw] if sel_content_idx < len(self.content) else ''
+            safe_addstr(stdscr, screen_row, bx, display.ljust(bw), sel_attr)
+        if self.preview:
+            self._draw_preview(stdscr)
+
+    def _preview_rect(self):
+        """(x, y, w, h) of the preview pane: the right half of the body,
+        short of the scrollbar column, with a separator to its left."""
+        bx, by, bw, bh = self.body_rect()
+        pw = (bw - 2) // 2
+        return (bx + bw - 1 - pw, by, pw, bh)
+
+    def _preview_lines(self, width):
+        """(text, attr) lines of the preview of the selected entry: its
+        name, type and metadata, then the first lines of a text file.
+        Previews come from the PreviewCache, so moving the selection over
+        files seen before does not read them again."""
+        if not 0 <= self.selected_index < len(self.view):
+            return []
+        entry = self.view[self.selected_index]
+        if entry.name == '..':
+            return []
+        attr = curses.color_pair(C_WIN_BODY)
+        lines = [(entry.name, attr | curses.A_BOLD)]
+        if self.archive is not None:
+            where = f'in {os.path.basename(self.archive[0])}'
+            return lines + [(where, attr)] + ([] if entry.is_dir else [(format_size(entry.size), attr)])
+        preview = self.previews.get(entry.full_path)
+        if preview is None:
+            return lines + [('cannot be read', attr)]
+        st = preview.st
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(st.st_mtime))
+        lines += [(preview.description, attr),
+                  (f'{stat.filemode(st.st_mode)} {user_name(st.st_uid)} {group_name(st.st_gid)}', attr),
+                  (f'{format_size(st.st_size)}  {when}', attr)]
+        if preview.lines:
+            lines.append(('─' * width, attr))
+            lines += [(line, attr) for line in preview.lines]
+        return lines
+
+    def body_rect(self):
+        """The file list's area: the body right of the tree pane, if shown."""
+        bx, by, bw, bh = super().body_rect()
+        tw = self._tree_width(bw)
+        return (bx + tw + 1, by, bw - tw - 1, bh) if tw else (bx, by, bw, bh)
+
+    def _tree_width(self, bw):
+        """Columns of the tree pane (0: hidden, or no room for it)."""
+        if self.tree is None or bw < 36:
+            return 0
+        return min(32, bw // 3)
+
+    def _tree_rect(self):
+        bx, by, bw, bh = super().body_rect()
+        return (bx, by, self._tree_width(bw), bh)
+
+    def _draw_tree(self, stdscr):
+        tx, ty, tw, th = self._tree_rect()
+        if tw < 1:
+            return
+        attr = curses.color_pair(C_WIN_BODY)
+        safe_vline(stdscr, ty, tx + tw, '│', th, attr)
+        for row in range(th):
+            i = self.tree_scroll + row
+            text = self.tree.row_text(i)[:tw] if i < len(self.tree) else ''
+            if i == self.tree_index:
+                sel_attr = (curses.color_pair(C_FM_SELECTED) | curses.A_BOLD if self.tree_focus
+                            else attr | curses.A_REVERSE)
+                safe_addstr(stdscr, ty + row, tx, text.ljust(tw), sel_attr)
+            else:
+                safe_addstr(stdscr, ty + row, tx, text.ljust(tw), attr)
+
+    def toggle_tree(self):
+        """Show the directory tree pane, opened down to the current
+        directory, or hide it."""
+        if self.tree is None:
+            self._reset_tree()
+            self.tree_focus = True
+        else:
+            self._stop_tree_loaders()
+            self.tree = None
+            self.tree_focus = False
+        self.content.header = self._header(report=self._loader is None and not self.error_message)
+        self._ensure_visible()
+        self.invalidate()
+
+    def _reset_tree(self):
+        self._stop_tree_loaders()
+        self.tree = DirTree()
+        self.tree_index = self.tree_scroll = 0
+        self._reveal_in_tree(self.current_path)
+
+    def _stop_tree_loaders(self):
+        for path, loader in self._tree_loaders.items():
+            loader.cancel()
+            if self.cache is not None:
+                self.cache.end(path)    # Partial: not cached
+        self._tree_loaders.clear()
+        self._tree_target = None
+
+    def _tree_listing(self, path):
+        """Listing of path for the tree, from the cache the file list uses
+        too (or the file list itself), so no directory is read twice.
+        Otherwise it is scanned; the result goes into the cache and, when
+        the scan runs in the background, to _tree_listed (None is
+        returned meanwhile). An unreadable directory lists as empty."""
+        if path == self.current_path and self._loader is None and not self.error_message:
+            return self.entries
+        cache = self.cache
+        cached = cache.get(path, self.show_hidden) if cache is not None else None
+        if cached is not None:
+            return cached
+        if cache is not None:
+            cache.begin(path)
+        listing = DirListing(path, parent=self._parent_of(path))
+        if self.scheduler is None:
+            try:
+                listing = scan_directory(path, self.show_hidden, parent=listing.parent)
+            except OSError:
+                listing = None
+            if cache is not None:
+                cache.end(path, listing, self.show_hidden)
+            return listing or DirListing(path)
+
+        def on_batch(loader, dirs, files, sizes, mtimes):
+            listing.extend(dirs, files, sizes, mtimes)
+
+        def on_done(loader, error):
+            del self._tree_loaders[path]
+            listing.sort()
+            if cache is not None:
+                cache.end(path, None if error else listing, loader.show_hidden)
+            self._tree_listed(path, DirListing(path) if error else listing)
+
+        self._tree_loaders[path] = DirectoryLoader(path, self.show_hidden, self.scheduler,
+                                                   on_batch, on_done).start()
+        return None
+
+    def _tree_listed(self, path, listing):
+        """A background listing for the tree is in: open its row."""
+        i, rest = self.tree.locate(path)
+        if not rest and self.tree.state[i] == DirTree.LOADING:
+            self.tree.state[i] = DirTree.COLLAPSED
+            self._expanded(i, self.tree.expand(i, listing.dir_names()))
+        self._continue_reveal()
+        self.invalidate()
+
+    def expand_tree_row(self, i):
+        """Open row i: its subdirectories are listed only now."""
+        if self.tree.state[i] != DirTree.COLLAPSED:
+            return
+        listing = self._tree_listing(self.tree.path(i))
+        if listing is None:
+            self.tree.state[i] = DirTree.LOADING
+        else:
+            self._expanded(i, self.tree.expand(i, listing.dir_names()))
+
+    def collapse_tree_row(self, i):
+        if self.tree.state[i] != DirTree.EXPANDED:
+            return
+        end = self.tree.end(i)
+        removed = self.tree.collapse(i)
+        if i < self.tree_index < end:
+            self.tree_index = i
+        elif self.tree_index >= end:
+            self.tree_index -= removed
+        self._tree_ensure_visible()
+
+    def _expanded(self, i, added):
+        """Keep the tree cursor on its row after rows went in under row i."""
+        if self.tree_index > i:
+            self.tree_index += added
+            self._tree_ensure_visible()
+
+    def _sync_tree(self, listing):
+        """The file list has a fresh listing: if the tree shows that
+        directory open, bring its children up to date."""
+        if self.tree is None:
+            return
+        i, rest = self.tree.locate(listing.path)
+        if rest or self.tree.state[i] != DirTree.EXPANDED:
+            return
+        names = listing.dir_names()
+        if self.tree.children(i) != names:
+            self.collapse_tree_row(i)
+            self._expanded(i, self.tree.expand(i, names))
+
+    def _reveal_in_tree(self, path):
+        """Open the tree down to path and put its cursor there."""
+        self._tree_target = path
+        self._continue_reveal()
+
+    def _continue_reveal(self):
+        """Expand the next ancestor of the target; resumed by _tree_listed
+        while one is being listed in the background."""
+        target = self._tree_target
+        if self.tree is None or target is None:
+            return
+        while True:
+            i, rest = self.tree.locate(target)
+            if not rest or self.tree.state[i] != DirTree.COLLAPSED:
+                break
+            self.expand_tree_row(i)
+        if rest and self.tree.state[i] == DirTree.LOADING:
+            return
+        self._tree_target = None   # Found, or as deep as it goes (hidden, gone)
+        self.tree_index = i
+        self._tree_ensure_visible()
+
+    def _tree_ensure_visible(self):
+        _, _, _, th = self._tree_rect()
+        if self.tree_index < self.tree_scroll:
+            self.tree_scroll = self.tree_index
+        elif self.tree_index >= self.tree_scroll + th:
+            self.tree_scroll = self.tree_index - th + 1
+
+    def _tree_key(self, key):
+        """Keys for the focused tree. True if key was one of them."""
+        tree, i = self.tree, self.tree_index
+        _, _, _, th = self._tree_rect()
+        if key == curses.KEY_UP:
+            self.tree_index = max(0, i - 1)
+        elif key == curses.KEY_DOWN:
+            self.tree_index = min(len(tree) - 1, i + 1)
+        elif key == curses.KEY_PPAGE:
+            self.tree_index = max(0, i - max(1, th - 2))
+        elif key == curses.KEY_NPAGE:
+            self.tree_index = min(len(tree) - 1, i + max(1, th - 2))
+        elif key == curses.KEY_HOME:
+            self.tree_index = 0
+        elif key == curses.KEY_END:
+            self.tree_index = len(tree) - 1
+        elif key == curses.KEY_RIGHT:
+            if tree.state[i] == DirTree.COLLAPSED:
+                self.expand_tree_row(i)
+            elif tree.state[i] == DirTree.EXPANDED and tree.end(i) > i + 1:
+                self.tree_index = i + 1
+        elif key == curses.KEY_LEFT:
+            if tree.state[i] == DirTree.EXPANDED:
+                self.collapse_tree_row(i)
+            elif i > 0:
+                self.tree_index = tree.parent(i)
+        elif key in (curses.KEY_ENTER, 10, 13):
+            self.tree_focus = False
+            self.navigate_to(tree.path(i))
+        elif key == 27:
+            self.tree_focus = False
+        else:
+            return False
+        self._tree_ensure_visible()
+        return True
+
+    def _tree_click(self, mx, my):
+        """Click in the tree pane: the marker opens or closes a row, the
+        name shows that directory in the file list."""
+        tx, ty, tw, th = self._tree_rect()
+        i = self.tree_scroll + (my - ty)
+        self.tree_focus = True
+        if i >= len(self.tree):
+            return
+        self.tree_index = i
+        marker_x = tx + 2 * self.tree.depths[i]
+        if mx <= marker_x + 1:
+            if self.tree.state[i] == DirTree.EXPANDED:
+                self.collapse_tree_row(i)
+            else:
+                self.expand_tree_row(i)
+        else:
+            self.navigate_to(self.tree.path(i))
+
+    def _draw_preview(self, stdscr):
+        px, py, pw, ph = self._preview_rect()
+        if pw < 1:
+            return
+        attr = curses.color_pair(C_WIN_BODY)
+        safe_vline(stdscr, py, px - 1, '│', ph, attr)
+        for row in range(ph):
+            safe_addstr(stdscr, py + row, px, ' ' * pw, attr)
+        for row, (text, line_attr) in enumerate(self._preview_lines(pw)[:ph]):
+            safe_addstr(stdscr, py + row, px, text[:pw], line_attr)
+
+    def navigate_to(self, path):
+        """Navigate to a new directory path, or into an archive (a path
+        inside one shows that directory of it)."""
+        real_path = os.path.realpath(path)
+        archive = None
+        if not os.path.isdir(real_path):
+            archive = split_archive_path(real_path)
+            if archive is None:
+                return
+        self.current_path = real_path
+        self.archive = archive
+        self.filter_text = None
+        self._rebuild_content()
+        if self.tree is not None:
+            self._reveal_in_tree(real_path)
+
+    def navigate_parent(self):
+        """Go to parent directory, re-selecting the dir we came from."""
+        parent = os.path.dirname(self.current_path)
+        if parent != self.current_path:
+            # Selected as soon as the (possibly background) listing has it
+            self._pending_select = os.path.basename(self.current_path)
+            self.navigate_to(parent)
+
+    def activate_selected(self):
+        """Activate currently selected entry. Returns ('dir', path),
+        ('file', path) or ('member', path) for a file inside an archive.
+        An archive opens like a directory."""
+        if not self.view:
+            return None
+        if self.selected_index >= len(self.view):
+            return None
+        entry = self.view[self.selected_index]
+        if entry.is_dir or (self.archive is None and is_archive_name(entry.name)):
+            self.navigate_to(entry.full_path)
+            return ('dir', entry.full_path)
+        elif self.archive is not None:
+            return ('member', entry.full_path)
+        else:
+            return ('file', entry.full_path)
+
+    def selected_paths(self):
+        """Full paths of the marked entries, else of the one under the
+        cursor ('..' is not one)."""
+        if self.entries.marked_count:
+            return self.entries.marked_paths()
+        if 0 <= self.selected_index < len(self.view):
+            entry = self.view[self.selected_index]
+            if entry.name != '..':
+                return [entry.full_path]
+        return []
+
+    def _file_op(self, op):
+        """('copy'|'cut'|'delete', paths) for the app, or ('paste', into).
+        Archives are browsed read-only."""
+        if self.archive is not None:
+            return None
+        if op == 'paste':
+            return ('paste', self.current_path)
+        paths = self.selected_paths()
+        return (op, paths) if paths else None
+
+    def select_up(self):
+        """Move selection up by one entry."""
+        if self.selected_index > 0:
+            self.selected_index -= 1
+            self._ensure_visible()
+
+    def select_down(self):
+        """Move selection down by one entry."""
+        if self.selected_index < len(self.view) - 1:
+            self.selected_index += 1
+            self._ensure_visible()
+
+    def _ensure_visible(self):
+        """Auto-scroll to keep the selected entry visible."""
+        _, _, _, bh = self.body_rect()
+        sel_content = self._entry_to_content_index(self.selected_index)
+        if sel_content < self.scroll_offset:
+            self.scroll_offset = sel_content
+        elif sel_content >= self.scroll_offset + bh:
+            self.scroll_offset = sel_content - bh + 1
+
+    def _refilter(self):
+        """Point view at the entries, or at those matching filter_text.
+        Only the first screenful is searched now; the rest in the background."""
+        if not self.filter_text:
+            self.view = self.entries
+        else:
+            self.view = ListingFilter(self.entries, self.filter_text)
+            self.view.advance(rows=self.body_rect()[3], chars=ListingFilter.FIRST_CHARS)
+            self._more_matches(self.view)
+        if isinstance(self.content, ListingRows):
+            self.content.listing = self.view
+            self.content.invalidate()
+
+    def _more_matches(self, view):
+        """Keep searching view, a slice per scheduler turn, while it is shown."""
+        if view is not self.view or view.done:
+            return
+        if self.scheduler is None:
+            while not view.advance():
+                pass
+        else:
+            self.scheduler.call_later(0, lambda: self._on_more_matches(view))
+
+    def _on_more_matches(self, view):
+        if view is self.view:
+            view.advance()
+            self.content.header = self._header()
+            self.invalidate()
+            self._more_matches(view)
+
+    def start_filter(self):
+        """Enter type-ahead mode: typed characters narrow the listing."""
+        if self.filter_text is None:
+            self._filter_return = self._selected_name()
+            self.entries.search_groups()  # Build the index before the first key
+            self.set_filter('')
+
+    def set_filter(self, text):
+        """Show only the entries whose name contains text (prefixes first)."""
+        self.filter_text = text
+        self._refilter()
+        self.content.header = self._header()
+        self.selected_index = 0
+        self.scroll_offset = 0
+
+    def clear_filter(self):
+        """Leave type-ahead mode, back on the entry selected before it."""
+        self.filter_text = None
+        self._refilter()
+        self.content.header = self._header(report=self._loader is None and not self.error_message)
+        self.selected_index = 0
+        self.scroll_offset = 0
+        self._reselect(self._filter_return)
+        self._filter_return = None
+
+    def _marking(self):
+        """Get the listing ready for marks: the window's own copy, as the
+        cached one may be shown by other windows. False while loading."""
+        if self._loader is not None:
+            return False
+        if self.entries.marks is None:
+            self.entries = self.entries.copy()
+            self.entries.start_marking()
+            self._refilter()
+        return True
+
+    def _marks_changed(self):
+        self.content.invalidate()
+        self._update_title()
+        self.invalidate()
+
+    def toggle_mark(self):
+        """Mark or unmark the entry under the cursor, then move down."""
+        if self._marking() and self.selected_index < len(self.view):
+            i = self.selected_index
+            self.view.mark(i, not self.view.is_marked(i))
+            self._marks_changed()
+            self.select_down()
+
+    def mark_move(self, down):
+        """Shift+Up/Down: extend the marks from the cursor to the next row."""
+        if self._marking() and self.selected_index < len(self.view):
+            self.view.mark(self.selected_index)
+            if down:
+                self.select_down()
+            else:
+                self.select_up()
+            self.view.mark(self.selected_index)
+            self._marks_changed()
+
+    def mark_all(self):
+        """Mark every row shown: all entries, or the filter's matches."""
+        if self._marking():
+            self.view.mark_all()
+            self._marks_changed()
+
+    def invert_marks(self):
+        if self._marking():
+            self.view.invert_marks()
+            self._marks_changed()
+
+    def clear_marks(self):
+        """Unmark everything; False if nothing was marked."""
+        if not self.entries.marked_count:
+            return False
+        self.entries.mark_all(False)
+        self._marks_changed()
+        return True
+
+    def mark_matching(self, pattern, on=True):
+        """Mark (or unmark) the entries whose name matches a glob."""
+        match = name_matcher(pattern)
+        if match is not None and self._marking():
+            self.entries.mark_matching(match, on)
+            self._marks_changed()
+
+    def start_mark_prompt(self, on=True):
+        """Ask for a glob to mark (or unmark) in the separator line."""
+        if self.filter_text is None:
+            self.mark_prompt = (on, '')
+            self.content.header = self._header()
+
+    def _sorted_like(self, listing):
+        return (listing.sort_key, listing.reverse) == (self.sort_key, self.sort_reverse)
+
+    def set_sort(self, key):
+        """Order entries by key (see DirListing.SORT_KEYS); the current key
+        again flips the direction. Re-sorts the listing in memory."""
+        if key == self.sort_key:
+            self._sort_by(key, not self.sort_reverse)
+        else:
+            self._sort_by(key, False)
+
+    def _sort_by(self, key, reverse):
+        self.sort_key, self.sort_reverse = key, reverse
+        keep = self._selected_name()
+        self.entries = self.entries.copy()  # The cache's copy keeps its order
+        self.entries.sort(self.sort_key, self.sort_reverse)
+        self._refilter()
+        self.selected_index = 0
+        self._reselect(keep)
+        self._update_sort_menu()
+        self.invalidate()
+
+    def _update_sort_menu(self):
+        """Mark the current sort entry with its direction."""
+        labels = {}
+        for label, key in self.SORT_MENU:
+            if key == self.sort_key:
+                label = f'{label:<13} {"▼" if self.sort_reverse else "▲"}'
+            labels[f'fm_sort_{key}'] = label
+        self.window_menu.items['View'] = [(labels.get(action, label), action)
+                                          for label, action in self.window_menu.items['View']]
+
+    def toggle_preview(self):
+        """Show or hide the preview pane."""
+        self.preview = not self.preview
+        self.invalidate()
+
+    def refresh(self):
+        """Scan the directory again, keeping the selection."""
+        self._pending_select = self._selected_name()
+        self._rebuild_content(rescan=True)
+
+    def toggle_hidden(self):
+        """Toggle show/hide hidden files."""
+        self.show_hidden = not self.show_hidden
+        self._rebuild_content()
+        if self.tree is not None:
+            self._reset_tree()
+
+    def toggle_details(self):
+        """Switch between the name/size rows and the detailed columns.
+        Only the rows drawn are stat'ed for them."""
+        self.detailed = not self.detailed
+        self.content.detailed = self.detailed
+        self.content.invalidate()
+        self.invalidate()
+
+    def _execute_menu_action(self, action):
+        """Execute a window menu action. Returns signal or None."""
+        if action == 'fm_open':
+            return self.activate_selected()
+        elif action == 'fm_parent':
+            self.navigate_parent()
+        elif action == 'fm_find':
+            return ('action', 'find')
+        elif action in ('fm_copy', 'fm_cut', 'fm_paste', 'fm_delete'):
+            return self._file_op(action[3:])
+        elif action == 'fm_mark':
+            self.toggle_mark()
+        elif action == 'fm_mark_all':
+            self.mark_all()
+        elif action in ('fm_mark_glob', 'fm_unmark_glob'):
+            self.start_mark_prompt(action == 'fm_mark_glob')
+        elif action == 'fm_invert_marks':
+            self.invert_marks()
+        elif action == 'fm_clear_marks':
+            self.clear_marks()
+        elif action == 'fm_toggle_hidden':
+            self.toggle_hidden()
+        elif action == 'fm_toggle_details':
+            self.toggle_details()
+        elif action == 'fm_toggle_preview':
+            self.toggle_preview()
+        elif action == 'fm_toggle_tree':
+            self.toggle_tree()
+        elif action == 'fm_toggle_git':
+            self.toggle_git_status()
+        elif action == 'fm_disk_usage':
+            self.measure_usage()
+        elif action == 'fm_refresh':
+            self.refresh()
+        elif action.startswith('fm_sort_'):
+            self.set_sort(action[8:])
+        elif action == 'fm_close':
+            return ('action', 'close')
+        return None
 
     def handle_click(self, mx, my):
         """Handle a click within the window body. Returns action result or None."""
@@ -1083,20 +5582,569 @@ class FileManagerWindow(Window):
                     return self._execute_menu_action(action)
                 return None
 
+        tx, ty, tw, th = self._tree_rect()
+        if tw and tx <= mx < tx + tw and ty <= my < ty + th:
+            self._tree_click(mx, my)
+            return None
+        bx, by, bw, bh = self.body_rect()
+        if not (bx <= mx < bx + bw and by <= my < by + bh):
+            return None
+        self.tree_focus = False
+        if self.preview and mx >= self._preview_rect()[0] - 1:
+            return None
+        content_idx = self.scroll_offset + (my - by)
+        entry_idx = self._content_to_entry_index(content_idx)
+        if entry_idx >= 0:
+            self.selected_index = entry_idx
+            return self.activate_selected()
+        return None
+
+    def handle_key(self, key):
+        """Handle keyboard input for the file manager.
+        Returns ('file', path) if a file is opened, else None."""
+        # Window menu keyboard handling
+        if self.window_menu and self.window_menu.active:
+            action = self.window_menu.handle_key(key)
+            if action == 'close_menu':
+                return None
+            if action:
+                return self._execute_menu_action(action)
+            return None
+
+        # Select/unselect prompt: Enter applies the glob, Escape drops it
+        if self.mark_prompt is not None:
+            on, text = self.mark_prompt
+            if key in (curses.KEY_ENTER, 10, 13, 27):
+                self.mark_prompt = None
+                self.content.header = self._header(report=self._loader is None and not self.error_message)
+                if key != 27:
+                    self.mark_matching(text, on)
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                self.mark_prompt = (on, text[:-1])
+                self.content.header = self._header()
+            elif 32 <= key < 127:
+                self.mark_prompt = (on, text + chr(key))
+                self.content.header = self._header()
+            return None
+
+        # Type-ahead filter: printable keys edit it, Escape leaves it
+        if self.filter_text is not None:
+            if key == 27:
+                self.clear_filter()
+                return None
+            if key in (curses.KEY_BACKSPACE, 127, 8):
+                if self.filter_text:
+                    self.set_filter(self.filter_text[:-1])
+                else:
+                    self.clear_filter()
+                return None
+            if 32 <= key < 127:
+                self.set_filter(self.filter_text + chr(key))
+                return None
+
+        if self.tree_focus and self._tree_rect()[2] and self._tree_key(key):
+            return None
+
+        if key == curses.KEY_UP:
+            self.select_up()
+        elif key == curses.KEY_DOWN:
+            self.select_down()
+        elif key in (curses.KEY_ENTER, 10, 13):
+            return self.activate_selected()
+        elif key in (curses.KEY_BACKSPACE, 127, 8):
+            self.navigate_parent()
+        elif key == ord('/'):
+            self.start_filter()
+        elif key == 27:  # Escape: stop a directory that is still loading, or measuring
+            self.cancel_loading() or self._stop_usage() or self.clear_marks()
+        elif key == curses.KEY_PPAGE:
+            _, _, _, bh = self.body_rect()
+            for _ in range(max(1, bh - 2)):
+                self.select_up()
+        elif key == curses.KEY_NPAGE:
+            _, _, _, bh = self.body_rect()
+            for _ in range(max(1, bh - 2)):
+                self.select_down()
+        elif key == curses.KEY_HOME:
+            self.selected_index = 0
+            self._ensure_visible()
+        elif key == curses.KEY_END:
+            if self.view:
+                self.selected_index = len(self.view) - 1
+                self._ensure_visible()
+        elif key == ord('h') or key == ord('H'):
+            self.toggle_hidden()
+        elif key == ord('d') or key == ord('D'):
+            self.toggle_details()
+        elif key == ord('p') or key == ord('P'):
+            self.toggle_preview()
+        elif key == ord('t') or key == ord('T'):
+            self.toggle_tree()
+        elif key == ord('g') or key == ord('G'):
+            self.toggle_git_status()
+        elif key == curses.KEY_LEFT and self._tree_rect()[2]:
+            self.tree_focus = True
+        elif key == ord('f') or key == ord('F'):
+            return ('action', 'find')
+        elif key == ord('u') or key == ord('U'):
+            self.measure_usage()
+        elif key in (ord('c'), ord('C')):
+            return self._file_op('copy')
+        elif key in (ord('x'), ord('X')):
+            return self._file_op('cut')
+        elif key in (ord('v'), ord('V')):
+            return self._file_op('paste')
+        elif key == curses.KEY_DC:
+            return self._file_op('delete')
+        elif key in (ord(' '), curses.KEY_IC):
+            self.toggle_mark()
+        elif key in (curses.KEY_SF, curses.KEY_SR):  # Shift+Down / Shift+Up
+            self.mark_move(key == curses.KEY_SF)
+        elif key == 1:  # Ctrl+A
+            self.mark_all()
+        elif key == ord('+'):
+            self.start_mark_prompt(True)
+        elif key == ord('-'):
+            self.start_mark_prompt(False)
+        elif key == ord('*'):
+            self.invert_marks()
+        return None
+
+
+# ═══════════════════════════════════════════════════════════
+# Find
+# ═══════════════════════════════════════════════════════════
+
+def name_matcher(pattern, regex=False, ignore_case=True):
+    """Function telling whether a file name matches pattern: a regex
+    (searched anywhere in the name) or a glob. A glob without wildcards
+    matches names containing it. None for an empty pattern (any name).
+    Raises re.error for a bad regex."""
+    if not pattern:
+        return None
+    flags = re.IGNORECASE if ignore_case else 0
+    if regex:
+        return re.compile(pattern, flags).search
+    if not any(c in pattern for c in '*?['):
+        pattern = f'*{pattern}*'
+    return re.compile(fnmatch.translate(pattern), flags).match
+
+
+class CaselessBytes:
+    """Literal bytes looked for in any (ASCII) case, searched like a bytes
+    regex. re.IGNORECASE costs re its fast literal search (~15x slower);
+    lower-casing each slice and using bytes.find is ~5x faster than that."""
+
+    def __init__(self, text):
+        self.text = text.lower()
+
+    def search(self, data, pos=0, endpos=None):
+        """True if found in data[pos:endpos], else None."""
+        return data[pos:endpos].lower().find(self.text) >= 0 or None
+
+
+def content_pattern(text, regex=False, ignore_case=True):
+    """Bytes regex (or CaselessBytes) for the text to look for inside
+    files, or None."""
+    if not text:
+        return None
+    data = os.fsencode(text)
+    if not regex and ignore_case:
+        return CaselessBytes(data)
+    return re.compile(data if regex else re.escape(data), re.IGNORECASE if ignore_case else 0)
+
+
+CONTENT_SLICE = 1 << 18
+
+
+def file_contains(path, pattern, cancelled=None):
+    """Whether the regular file at path has a match for pattern (a bytes
+    regex or CaselessBytes). The file is mapped rather than read: pages
+    come in as the search advances (a regex reads them in place,
+    CaselessBytes copies each slice to lower-case it). It is searched in
+    slices of about CONTENT_SLICE bytes ending at line breaks, so other
+    threads (the UI) get the GIL in between. A line longer than two
+    slices is cut with an overlap of the literal's length, or searched
+    to its end by a regex, so matches within a line are all found.
+    Raises OSError."""
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)  # Never block on a FIFO
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            return False
+        if st.st_size == 0:
+            return pattern.search(b'') is not None
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as data:
+            if hasattr(data, 'madvise'):
+                data.madvise(mmap.MADV_SEQUENTIAL)
+            pos, size = 0, len(data)
+            literal = pattern.text if isinstance(pattern, CaselessBytes) else None
+            while pos < size:
+                if cancelled is not None and cancelled.is_set():
+                    return False
+                end = next_pos = data.find(b'\n', pos + CONTENT_SLICE, pos + 2 * CONTENT_SLICE) + 1
+                if end <= 0 and literal is not None:
+                    # A long line: the next slice starts early enough to
+                    # catch a match across the cut
+                    end = next_pos = min(size, pos + 2 * CONTENT_SLICE)
+                    if end < size:
+                        next_pos = max(pos + 1, end - len(literal) + 1)
+                elif end <= 0:
+                    end = next_pos = data.find(b'\n', pos + 2 * CONTENT_SLICE) + 1 or size
+                if pattern.search(data, pos, end):
+                    return True
+                pos = next_pos
+            return False
+    finally:
+        os.close(fd)
+
+
+class FileSearch:
+    """Searches the tree below root on worker threads.
+
+    Each directory is one task on a thread pool: scandir it, match file
+    names (then contents, when asked) and hand back its subdirectories,
+    which become more tasks, so a deep or slow tree keeps several
+    directories in flight. Symlinked directories are not followed.
+    Contents are matched by one thread at a time: matching holds the GIL
+    throughout, so more at once would not go faster, only starve the UI.
+
+    Matching paths reach on_batch(search, paths) on the UI thread (through
+    Scheduler.call_soon_threadsafe) at most every BATCH_SECONDS, then
+    on_done(search) runs once. After cancel() nothing more is delivered."""
+
+    BATCH_SECONDS = 0.1
+    WORKERS = 8
+    MAX_IN_FLIGHT = 64      # Directories queued on the pool
+
+    def __init__(self, root, match_name, text_pattern, scheduler, on_batch, on_done):
+        self.root = root
+        self.match_name = match_name      # name_matcher() result, or None
+        self.text_pattern = text_pattern  # content_pattern() result, or None
+        self.scheduler = scheduler
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.dirs = 0       # Directories searched
+        self.files = 0      # Files seen
+        self.errors = 0     # Directories or files that could not be read
+        self.seconds = 0.0
+        self._cancelled = threading.Event()
+        self._content_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='file-search', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _post(self, callback, *args):
+        """Run callback(self, *args) on the UI thread unless cancelled by then."""
+        def deliver():
+            if not self.cancelled:
+                callback(self, *args)
+        if not self.cancelled:
+            self.scheduler.call_soon_threadsafe(deliver)
+
+    def _search_dir(self, path):
+        """One directory: (subdirectories, matching files, files, errors)."""
+        subdirs, found, files, errors = [], [], 0, 0
+        if self.cancelled:
+            return subdirs, found, files, errors
+        match_name, pattern = self.match_name, self.text_pattern
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if self.cancelled:
+                        break
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                    except OSError:
+                        pass
+                    files += 1
+                    if match_name is not None and not match_name(entry.name):
+                        continue
+                    if pattern is not None:
+                        try:
+                            if not entry.is_file():
+                                continue
+                            with self._content_lock:
+                                if not file_contains(entry.path, pattern, self._cancelled):
+                                    continue
+                        except (OSError, ValueError):
+                            errors += 1
+                            continue
+                    found.append(entry.path)
+        except OSError:
+            errors += 1
+        return subdirs, found, files, errors
+
+    def _run(self):
+        start = last = time.perf_counter()
+        todo = deque([self.root])
+        running = set()
+        found = []
+        pool = ThreadPoolExecutor(self.WORKERS, thread_name_prefix='find')
+        try:
+            while (todo or running) and not self.cancelled:
+                while todo and len(running) < self.MAX_IN_FLIGHT:
+                    running.add(pool.submit(self._search_dir, todo.popleft()))
+                done, running = wait(running, self.BATCH_SECONDS, FIRST_COMPLETED)
+                for future in done:
+                    subdirs, paths, files, errors = future.result()
+                    todo.extend(subdirs)
+                    found.extend(paths)
+                    self.dirs += 1
+                    self.files += files
+                    self.errors += errors
+                now = time.perf_counter()
+                if now - last >= self.BATCH_SECONDS:
+                    self.seconds = now - start
+                    self._post(self.on_batch, found)  # Also refreshes the counts
+                    found = []
+                    last = now
+        except RuntimeError:  # The interpreter is exiting
+            return
+        finally:
+            pool.shutdown(wait=False)
+        self.seconds = time.perf_counter() - start
+        if found:
+            self._post(self.on_batch, found)
+        self._post(self.on_done)
+
+
+class SearchResults:
+    """Paths found by a FileSearch, as ListingRows rows relative to root."""
+
+    def __init__(self, root):
+        self.paths = []
+        self._skip = len(os.path.join(root, ''))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def display_text(self, i):
+        return f'  📄 {self.paths[i][self._skip:]}'
+
+    def is_marked(self, i):
+        return False
+
+
+class FindWindow(Window):
+    """Finds files below a directory by name (glob or regex) and, if
+    asked, by content. Matches stream in while the search runs; Enter
+    opens the selected one."""
+
+    FIELDS = ('Name', 'Text')   # Pattern fields, then the results
+
+    def __init__(self, x, y, w, h, root, scheduler):
+        super().__init__('Find', x, y, w, h, content=[])
+        self.root = root
+        self.scheduler = scheduler
+        self.fields = ['', '']      # Name pattern, text to look for in files
+        self.focus = 0              # Index in FIELDS, or len(FIELDS): the results
+        self.regex = False
+        self.ignore_case = True
+        self.search = None
+        self.running = False
+        self.status = 'Type a name or text, Enter to search'
+        self.results = SearchResults(root)
+        self.selected_index = 0
+        self.window_menu = WindowMenu({
+            'File': [
+                ('Search     Enter', 'find_start'),
+                ('Stop      Escape', 'find_stop'),
+                ('Open',             'find_open'),
+                ('─────────────',    None),
+                ('Close',            'find_close'),
+            ],
+            'Options': [],
+        })
+        self._update_options_menu()
+        self.h = max(self.h, 10)
+        self.content = ListingRows(self._header(), self.results)
+        self._update_title()
+
+    def _header_lines(self):
+        return 4  # folder, two fields, separator
+
+    def _header(self):
+        """Folder, pattern fields (the focused one with a cursor) and a
+        separator carrying the search status."""
+        lines = [f' 📂 {self.root}']
+        for i, label in enumerate(self.FIELDS):
+            if i == self.focus:
+                lines.append(f' ▸ {label}: {self.fields[i]}_')
+            else:
+                lines.append(f'   {label}: {self.fields[i]}')
+        line = f'─ {self.status} '
+        rule = '─' * (self.w - 4)
+        lines.append(' ' + (line + rule[len(line):])[:len(rule)])
+        return lines
+
+    def _refresh_header(self):
+        self.content.header = self._header()
+        self.invalidate()
+
+    def _update_title(self):
+        count = len(self.results)
+        self.title = f'Find - {os.path.basename(self.root) or "/"} ({count} found)'
+
+    def _update_options_menu(self):
+        self.window_menu.items['Options'] = [
+            (f'Regex       {"[x]" if self.regex else "[ ]"}', 'find_regex'),
+            (f'Ignore Case {"[x]" if self.ignore_case else "[ ]"}', 'find_case'),
+        ]
+
+    def _summary(self):
+        search = self.search
+        text = f'{len(self.results)} found in {search.dirs} dirs, {search.files} files'
+        if search.errors:
+            text += f', {search.errors} unreadable'
+        return text
+
+    def start_search(self):
+        """Search again with the current fields and options."""
+        self.stop_search()
+        try:
+            match_name = name_matcher(self.fields[0], self.regex, self.ignore_case)
+            pattern = content_pattern(self.fields[1], self.regex, self.ignore_case)
+        except re.error as e:
+            self.status = f'Bad pattern: {e}'
+            self._refresh_header()
+            return
+        self.results = SearchResults(self.root)
+        self.content = ListingRows(self._header(), self.results)
+        self.selected_index = 0
+        self.scroll_offset = 0
+        self.search = FileSearch(self.root, match_name, pattern, self.scheduler,
+                                 self._on_found, self._on_done).start()
+        self.running = True
+        self.status = 'Searching…'
+        self.focus = len(self.FIELDS)
+        self._refresh_header()
+        self._update_title()
+
+    def stop_search(self):
+        """Cancel a running search, keeping what it found so far."""
+        if not self.running:
+            return False
+        self.running = False
+        self.search.cancel()
+        self.status = f'Stopped: {self._summary()}'
+        self._refresh_header()
+        return True
+
+    def _on_found(self, search, paths):
+        """FileSearch callback (UI thread): more matches, fresh counts."""
+        self.results.paths.extend(paths)
+        self.status = f'Searching… {self._summary()}'
+        self._refresh_header()
+        self._update_title()
+
+    def _on_done(self, search):
+        self.running = False
+        self.status = f'{self._summary()}, {search.seconds:.1f} s'
+        self._refresh_header()
+        self._update_title()
+
+    def close(self):
+        if self.search is not None:
+            self.search.cancel()
+
+    def draw_contents(self, stdscr):
+        """Draw the fields and results with the selection highlighted."""
+        super().draw_contents(stdscr)
+        if not self.results or self.focus < len(self.FIELDS):
+            return
+        bx, by, bw, bh = self.body_rect()
+        row = self._header_lines() + self.selected_index - self.scroll_offset
+        if 0 <= row < bh:
+            sel_attr = curses.color_pair(C_FM_SELECTED) | curses.A_BOLD
+            display = self.content[self._header_lines() + self.selected_index][:bw]
+            safe_addstr(stdscr, by + row, bx, display.ljust(bw), sel_attr)
+
+    def _ensure_visible(self):
+        """Auto-scroll to keep the selected result visible."""
+        _, _, _, bh = self.body_rect()
+        sel_content = self._header_lines() + self.selected_index
+        if sel_content < self.scroll_offset:
+            self.scroll_offset = sel_content
+        elif sel_content >= self.scroll_offset + bh:
+            self.scroll_offset = sel_content - bh + 1
+
+    def select_up(self):
+        if self.focus == len(self.FIELDS) and self.selected_index > 0:
+            self.selected_index -= 1
+            self._ensure_visible()
+
+    def select_down(self):
+        if self.focus == len(self.FIELDS) and self.selected_index < len(self.results) - 1:
+            self.selected_index += 1
+            self._ensure_visible()
+
+    def set_focus(self, focus):
+        self.focus = focus
+        if focus < len(self.FIELDS):
+            self.scroll_offset = 0
+        self._refresh_header()
+
+    def activate_selected(self):
+        """Open the selected result: returns ('file', path) or None."""
+        if 0 <= self.selected_index < len(self.results):
+            return ('file', self.results.paths[self.selected_index])
+        return None
+
+    def _execute_menu_action(self, action):
+        """Execute a window menu action. Returns signal or None."""
+        if action == 'find_start':
+            self.start_search()
+        elif action == 'find_stop':
+            self.stop_search()
+        elif action == 'find_open':
+            return self.activate_selected()
+        elif action == 'find_regex':
+            self.regex = not self.regex
+            self._update_options_menu()
+        elif action == 'find_case':
+            self.ignore_case = not self.ignore_case
+            self._update_options_menu()
+        elif action == 'find_close':
+            return ('action', 'close')
+        return None
+
+    def handle_click(self, mx, my):
+        """Handle a click within the window body. Returns action result or None."""
+        if self.window_menu:
+            if self.window_menu.on_menu_bar(mx, my, self.x, self.y, self.w) or self.window_menu.active:
+                action = self.window_menu.handle_click(mx, my, self.x, self.y, self.w)
+                if action:
+                    return self._execute_menu_action(action)
+                return None
+
         bx, by, bw, bh = self.body_rect()
         if not (bx <= mx < bx + bw and by <= my < by + bh):
             return None
-        content_idx = self.scroll_offset + (my - by)
-        entry_idx = self._content_to_entry_index(content_idx)
-        if entry_idx >= 0:
-            self.selected_index = entry_idx
+        line = self.scroll_offset + (my - by)
+        if 1 <= line <= len(self.FIELDS):
+            self.set_focus(line - 1)
+            return None
+        i = line - self._header_lines()
+        if 0 <= i < len(self.results):
+            self.set_focus(len(self.FIELDS))
+            self.selected_index = i
             return self.activate_selected()
         return None
 
     def handle_key(self, key):
-        """Handle keyboard input for the file manager.
-        Returns ('file', path) if a file is opened, else None."""
-        # Window menu keyboard handling
+        """Handle keyboard input. Returns ('file', path) to open a result, else None."""
         if self.window_menu and self.window_menu.active:
             action = self.window_menu.handle_key(key)
             if action == 'close_menu':
@@ -1105,31 +6153,51 @@ class FileManagerWindow(Window):
                 return self._execute_menu_action(action)
             return None
 
-        if key == curses.KEY_UP:
+        if key == 27:  # Escape: stop a running search
+            self.stop_search()
+        elif key == 18:  # Ctrl+R
+            self._execute_menu_action('find_regex')
+        elif self.focus < len(self.FIELDS):
+            # Editing a pattern field
+            text = self.fields[self.focus]
+            if key in (curses.KEY_ENTER, 10, 13):
+                self.start_search()
+            elif key == curses.KEY_UP:
+                self.set_focus(max(0, self.focus - 1))
+            elif key == curses.KEY_DOWN:
+                if self.focus + 1 < len(self.FIELDS) or self.results:
+                    self.set_focus(self.focus + 1)
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                self.fields[self.focus] = text[:-1]
+                self._refresh_header()
+            elif 32 <= key < 127:
+                self.fields[self.focus] = text + chr(key)
+                self._refresh_header()
+        elif key in (curses.KEY_ENTER, 10, 13):
+            return self.activate_selected()
+        elif key == curses.KEY_UP:
+            if self.selected_index == 0:
+                self.set_focus(len(self.FIELDS) - 1)
             self.select_up()
         elif key == curses.KEY_DOWN:
             self.select_down()
-        elif key in (curses.KEY_ENTER, 10, 13):
-            return self.activate_selected()
-        elif key in (curses.KEY_BACKSPACE, 127, 8):
-            self.navigate_parent()
         elif key == curses.KEY_PPAGE:
             _, _, _, bh = self.body_rect()
-            for _ in range(max(1, bh - 2)):
+            for _ in range(max(1, bh - 6)):
                 self.select_up()
         elif key == curses.KEY_NPAGE:
             _, _, _, bh = self.body_rect()
-            for _ in range(max(1, bh - 2)):
+            for _ in range(max(1, bh - 6)):
                 self.select_down()
         elif key == curses.KEY_HOME:
             self.selected_index = 0
             self._ensure_visible()
         elif key == curses.KEY_END:
-            if self.entries:
-                self.selected_index = len(self.entries) - 1
+            if self.results:
+                self.selected_index = len(self.results) - 1
                 self._ensure_visible()
-        elif key == ord('h') or key == ord('H'):
-            self.toggle_hidden()
+        elif key in (curses.KEY_BACKSPACE, 127, 8):
+            self.set_focus(0)
         return None
 
 
@@ -1145,6 +6213,7 @@ class NotepadWindow(Window):
         super().__init__(title, x, y, w, h, content=[])
         self.buffer = ['']  # list[str] — one string per logical line
         self.filepath = filepath
+        self.name = None    # Title of text loaded without a file (load_text)
         self.modified = False
         self.cursor_line = 0
         self.cursor_col = 0
@@ -1190,6 +6259,14 @@ class NotepadWindow(Window):
         self.modified = False
         self._wrap_stale = True
 
+    def load_text(self, name, text):
+        """Show text that has no file of its own (a member of an archive),
+        titled name."""
+        self.name = name
+        self.buffer = text.split('\n')
+        self._wrap_stale = True
+        self._update_title()
+
     def _save_file(self):
         """Save buffer to file. Returns True on success, error string on failure."""
         if not self.filepath:
@@ -1279,14 +6356,10 @@ class NotepadWindow(Window):
         if self.cursor_col < 0:
             self.cursor_col = 0
 
-    def draw(self, stdscr):
-        """Draw notepad with buffer, cursor, and status bar."""
-        if not self.visible:
-            return
-
-        # Update title with modified indicator
-        if self.filepath:
-            filename = os.path.basename(self.filepath)
+    def _update_title(self):
+        """Update window title with modified indicator."""
+        if self.filepath or self.name:
+            filename = os.path.basename(self.filepath) if self.filepath else self.name
             prefix = '* ' if self.modified else ''
             self.title = f'Notepad - {prefix}{filename}'
         elif self.modified:
@@ -1294,6 +6367,13 @@ class NotepadWindow(Window):
         else:
             self.title = 'Notepad'
 
+    def render_state(self):
+        self._update_title()
+        return super().render_state()
+
+    def draw_contents(self, stdscr):
+        """Draw notepad with buffer, cursor, and status bar."""
+        self._update_title()
         body_attr = self.draw_frame(stdscr)
         bx, by, bw, bh = self.body_rect()
         body_h = bh - 1  # Last row is status bar
@@ -1338,9 +6418,8 @@ class NotepadWindow(Window):
         if total_lines > body_h and body_h > 1:
             sb_x = bx + bw - 1
             thumb_pos = int(self.view_top / max(1, total_lines - body_h) * (body_h - 1))
-            for i in range(body_h):
-                ch = '█' if i == thumb_pos else '░'
-                safe_addstr(stdscr, by + i, sb_x, ch, curses.color_pair(C_SCROLLBAR))
+            safe_vline(stdscr, by, sb_x, '░', body_h, curses.color_pair(C_SCROLLBAR))
+            safe_addstr(stdscr, by + thumb_pos, sb_x, '█', curses.color_pair(C_SCROLLBAR))
 
         # Status bar (inside window, last body row)
         status_y = by + bh - 1
@@ -1349,10 +6428,6 @@ class NotepadWindow(Window):
         status = f' Ln {self.cursor_line + 1}, Col {self.cursor_col + 1}{wrap_flag}{mod_flag}'
         safe_addstr(stdscr, status_y, bx, status.ljust(bw)[:bw], curses.color_pair(C_STATUS))
 
-        # Window menu dropdown (on top of body content)
-        if self.window_menu:
-            self.window_menu.draw_dropdown(stdscr, self.x, self.y, self.w)
-
     def _execute_menu_action(self, action):
         """Execute a window menu action. Returns signal or None."""
         if action == 'np_toggle_wrap':
@@ -1597,6 +6672,497 @@ def get_system_info():
     return info
 
 
+# ═══════════════════════════════════════════════════════════
+# Event Loop Scheduler
+# ═══════════════════════════════════════════════════════════
+
+class Scheduler:
+    """Timers and fd readers for the main loop.
+
+    Instead of polling, the loop blocks in select() on stdin, registered
+    readers and a self-pipe until the next timer deadline. The self-pipe
+    doubles as the signal wakeup fd (SIGWINCH) and lets worker threads
+    hand callbacks to the UI thread via call_soon_threadsafe()."""
+
+    def __init__(self):
+        self._timers = []            # heap of [deadline, seq, callback]
+        self._seq = 0
+        self._readers = {}           # fd -> callback
+        self._pending = deque()      # callbacks queued from other threads
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+
+    def call_at(self, deadline, callback):
+        """Run callback once time.monotonic() reaches deadline. Returns a handle."""
+        self._seq += 1
+        timer = [deadline, self._seq, callback]
+        heapq.heappush(self._timers, timer)
+        return timer
+
+    def call_later(self, delay, callback):
+        """Run callback after delay seconds. Returns a handle."""
+        return self.call_at(time.monotonic() + delay, callback)
+
+    def cancel(self, timer):
+        """Cancel a timer returned by call_at()/call_later()."""
+        timer[2] = None
+
+    def call_soon_threadsafe(self, callback):
+        """Queue callback for the UI thread and wake the loop (any thread)."""
+        self._pending.append(callback)
+        self.wake()
+
+    def wake(self):
+        """Interrupt a blocking wait()."""
+        try:
+            os.write(self.wake_w, b'\0')
+        except OSError:
+            pass  # Pipe full: a wakeup is already pending
+
+    def add_reader(self, fd, callback):
+        """Call callback() whenever fd becomes readable."""
+        self._readers[fd] = callback
+
+    def remove_reader(self, fd):
+        self._readers.pop(fd, None)
+
+    def timeout(self):
+        """Seconds until the next timer, 0 if work is pending, None if idle."""
+        if self._pending:
+            return 0
+        while self._timers and self._timers[0][2] is None:
+            heapq.heappop(self._timers)
+        if not self._timers:
+            return None
+        return max(0, self._timers[0][0] - time.monotonic())
+
+    def run_due(self):
+        """Run queued callbacks and timers whose deadline has passed."""
+        while self._pending:
+            self._pending.popleft()()
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, callback = heapq.heappop(self._timers)
+            if callback is not None:
+                callback()
+
+    def wait(self, input_fd, timeout):
+        """Block until input, a reader, a wakeup or the timeout.
+        Returns True if input_fd is readable."""
+        fds = [input_fd, self.wake_r, *self._readers]
+        try:
+            ready, _, _ = select.select(fds, [], [], timeout)
+        except (OSError, ValueError):
+            return True  # Let the caller poll input instead of spinning here
+        if self.wake_r in ready:
+            try:
+                while os.read(self.wake_r, 512):
+                    pass
+            except OSError:
+                pass
+        for fd in ready:
+            callback = self._readers.get(fd)
+            if callback:
+                callback()
+        return input_fd in ready
+
+    def close(self):
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+
+# Button flags that end or complete a gesture (never coalesced away)
+MOUSE_BUTTON_EVENTS = 0
+for _n in range(1, 5):
+    for _f in ('RELEASED', 'CLICKED', 'DOUBLE_CLICKED', 'TRIPLE_CLICKED'):
+        MOUSE_BUTTON_EVENTS |= getattr(curses, f'BUTTON{_n}_{_f}', 0)
+
+
+def is_motion_event(bstate):
+    """True for pure pointer motion (drag/hover), as opposed to clicks/releases."""
+    return bool(bstate & curses.REPORT_MOUSE_POSITION) and not (bstate & MOUSE_BUTTON_EVENTS)
+
+
+def coalesce_events(events):
+    """Collapse runs of consecutive motion events into the latest position.
+
+    events: list of ('key', code) / ('mouse', getmouse() tuple) / ('resize', None).
+    Keys, clicks and releases keep their order; only a motion event directly
+    followed by another motion event is dropped."""
+    out = []
+    for event in events:
+        if (event[0] == 'mouse' and is_motion_event(event[1][4]) and out
+                and out[-1][0] == 'mouse' and is_motion_event(out[-1][1][4])):
+            out[-1] = event
+        else:
+            out.append(event)
+    return out
+
+
+# ═══════════════════════════════════════════════════════════
+# Compositor (damage tracking)
+# ═══════════════════════════════════════════════════════════
+
+class Layer:
+    """One z-ordered piece of the screen handed to the compositor."""
+    __slots__ = ('key', 'rects', 'signature', 'paint', 'name')
+
+    def __init__(self, key, rects, signature, paint, name=None):
+        self.key = key                # Stable identity across frames
+        self.rects = rects            # Screen areas this layer paints
+        self.signature = signature    # Anything that changes its look
+        self.paint = paint            # paint(scr, clip_rect)
+        self.name = name or str(key)  # Label in profiler traces
+
+
+def clipped(draw):
+    """Wrap a draw(scr) function as a layer painter that honours the clip rect."""
+    return lambda scr, clip: draw(ClipView(scr, clip))
+
+
+class Compositor:
+    """Repaints only the damaged regions of the screen.
+
+    Every frame the app describes the screen as a bottom-to-top list of
+    layers. A layer that appeared, vanished, moved, changed z-order or
+    changed signature damages its old and new rects.
+
+    Every layer is opaque over its rects, so each damaged rect is filled
+    front-to-back: a layer paints only the pieces not already covered by
+    layers above it. Fully hidden windows are never painted (nor their pads
+    re-rendered) and the work per frame is bounded by screen area."""
+
+    MAX_RECTS = 24   # Beyond this, collapse damage into one bounding rect
+
+    def __init__(self, debug=False):
+        self.debug = debug           # Outline repainted rects on screen
+        self.profiler = None         # FrameProfiler timing each layer paint
+        self.full = True             # Next frame repaints everything
+        self._damage = []
+        self._prev = {}              # key -> (rects, signature)
+        self._prev_order = []
+        self._debug_rects = []
+
+    def damage_rect(self, rect):
+        """Force a screen area to be repainted next frame."""
+        self._damage.append(rect)
+
+    def damage_all(self):
+        """Force a full repaint next frame (resize, external program...)."""
+        self.full = True
+
+    def _collect(self, layers):
+        """Diff layers against the previous frame, returning damaged rects."""
+        damage = self._damage
+        self._damage = []
+        prev = self._prev
+        keys = set()
+        for layer in layers:
+            keys.add(layer.key)
+            old = prev.get(layer.key)
+            if old is None:
+                damage.extend(layer.rects)
+            elif old[0] != layer.rects or old[1] != layer.signature:
+                damage.extend(old[0])
+                damage.extend(layer.rects)
+        for key, (rects, _) in prev.items():
+            if key not in keys:
+                damage.extend(rects)
+
+        # Z-order changes among surviving layers expose different pixels
+        order = [layer.key for layer in layers if layer.key in prev]
+        prev_order = [key for key in self._prev_order if key in keys]
+        if order != prev_order:
+            by_key = {layer.key: layer for layer in layers}
+            for key, old_key in zip(order, prev_order):
+                if key != old_key:
+                    damage.extend(by_key[key].rects)
+
+        self._prev = {layer.key: (layer.rects, layer.signature) for layer in layers}
+        self._prev_order = [layer.key for layer in layers]
+        return damage
+
+    def _coalesce(self, rects, bounds):
+        """Clip rects to the screen and merge the ones that overlap."""
+        out = []
+        for rect in rects:
+            rect = rect_intersect(rect, bounds)
+            if rect is None:
+                continue
+            merged = True
+            while merged:
+                merged = False
+                for i, other in enumerate(out):
+                    if rect_intersect(rect, other):
+                        rect = rect_union(rect, other)
+                        out.pop(i)
+                        merged = True
+                        break
+            out.append(rect)
+        if len(out) > self.MAX_RECTS:
+            bbox = out[0]
+            for rect in out[1:]:
+                bbox = rect_union(bbox, rect)
+            out = [bbox]
+        return out
+
+    def _paint_visible(self, scr, layers, rect):
+        """Fill rect front-to-back, painting each layer only where visible."""
+        profiler = self.profiler
+        remaining = [rect]
+        for layer in reversed(layers):
+            for lr in layer.rects:
+                uncovered = []
+                for piece in remaining:
+                    visible = rect_intersect(piece, lr)
+                    if visible is None:
+                        uncovered.append(piece)
+                    else:
+                        if profiler:
+                            start = time.perf_counter()
+                            layer.paint(scr, visible)
+                            profiler.record('paint ' + layer.name, start, time.perf_counter())
+                        else:
+                            layer.paint(scr, visible)
+                        uncovered.extend(rect_subtract(piece, lr))
+                remaining = uncovered
+            if not remaining:
+                return
+
+    def compose(self, scr, layers):
+        """Repaint damaged regions of scr. Returns the list of repainted rects."""
+        h, w = scr.getmaxyx()
+        bounds = (0, 0, w, h)
+        damage = self._collect(layers)
+        if self.full:
+            self.full = False
+            damage = [bounds]
+        rects = self._coalesce(damage, bounds)
+        if not rects:
+            return rects
+
+        # Previous debug outlines are erased together with the new damage
+        painted = self._coalesce(rects + self._debug_rects, bounds) if self.debug else rects
+        for rect in painted:
+            self._paint_visible(scr, layers, rect)
+
+        if self.debug:
+            attr = curses.color_pair(C_ICON_SEL) | curses.A_BOLD
+            outlines = [(x, y, max(rw, 2), max(rh, 2)) for x, y, rw, rh in rects]
+            for x, y, rw, rh in outlines:
+                draw_box(scr, y, x, rh, rw, attr, double=False)
+            self._debug_rects = outlines
+        return rects
+
+
+# ═══════════════════════════════════════════════════════════
+# Frame Profiler
+# ═══════════════════════════════════════════════════════════
+
+class _Phase:
+    """Context manager timing one named phase for FrameProfiler."""
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class FrameProfiler:
+    """Times each phase of a frame for the F12 overlay and the trace file.
+
+    The trace is JSON lines: one Chrome trace event ("ph": "X", times in
+    microseconds) per line. Wrap it in a list (e.g. `jq -s . trace.jsonl`)
+    to load it in chrome://tracing or Perfetto."""
+
+    def __init__(self, trace_path=None):
+        self.overlay = False
+        self.trace = open(trace_path, 'w', encoding='utf-8') if trace_path else None
+        self._origin = time.perf_counter()
+        self._frame_start = None
+        self._frame_ends = deque(maxlen=240)
+        self.phases = {}             # name -> seconds, frame in progress
+        self.last_phases = {}        # name -> seconds, last completed frame
+        self.last_frame_time = 0.0
+        self.frames = 0
+
+    def phase(self, name):
+        """`with profiler.phase('input'):` times the block under that name."""
+        return _Phase(self, name)
+
+    def record(self, name, start, end):
+        """Account end - start seconds to name (summed within a frame)."""
+        self.phases[name] = self.phases.get(name, 0.0) + (end - start)
+        if self.trace:
+            self._emit(name, start, end, 1)
+
+    def begin_frame(self):
+        self._frame_start = time.perf_counter()
+        self.phases = {}
+
+    def end_frame(self):
+        end = time.perf_counter()
+        self.last_frame_time = end - self._frame_start
+        self.last_phases = self.phases
+        self._frame_ends.append(end)
+        self.frames += 1
+        if self.trace:
+            self._emit('frame', self._frame_start, end, 0,
+                       {'frame': self.frames, 'ms': round(self.last_frame_time * 1000, 3)})
+
+    def _emit(self, name, start, end, tid, args=None):
+        event = {
+            'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+            'ts': round((start - self._origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+        }
+        if args:
+            event['args'] = args
+        self.trace.write(json.dumps(event) + '\n')
+
+    def fps(self):
+        """Frames completed during the last second."""
+        cutoff = time.perf_counter() - 1.0
+        return sum(1 for t in self._frame_ends if t >= cutoff)
+
+    def overlay_text(self):
+        """One-line summary: frame time, FPS and the slowest phase."""
+        text = f' {self.last_frame_time * 1000:6.2f} ms │ {self.fps():3d} fps '
+        if self.last_phases:
+            name, secs = max(self.last_phases.items(), key=lambda item: item[1])
+            text += f'│ {name[:24]} {secs * 1000:.2f} ms '
+        return text
+
+    def close(self):
+        if self.trace:
+            self.trace.close()
+            self.trace = None
+
+
+# ═══════════════════════════════════════════════════════════
+# Window Index (mouse hit testing)
+# ═══════════════════════════════════════════════════════════
+
+class WindowIndex:
+    """Which window owns each screen cell, plus the active/dragging/resizing
+    windows, so routing a mouse event never scans the window list.
+
+    The owner grid is patched incrementally: when a window moves, resizes,
+    is raised, shown/hidden or closed only its old and new rects are
+    recomputed, from the windows intersecting them."""
+
+    def __init__(self, windows):
+        self.windows = windows  # The app's z-ordered list (last = topmost)
+        self.cols = 0
+        self.rows = 0
+        self.grid = array('H')
+        self._slots = [None]    # slot -> window; slot 0 is the desktop
+        self._slot_of = {}      # window id -> slot
+        self._free = []
+        self._rects = {}        # window id -> rect currently in the grid
+        self.active = None
+        self.dragging = None
+        self.resizing = None
+
+    def _slot(self, win):
+        slot = self._slot_of.get(win.id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self._slots[slot] = win
+            else:
+                slot = len(self._slots)
+                self._slots.append(win)
+            self._slot_of[win.id] = slot
+        return slot
+
+    def rebuild(self, cols, rows):
+        """Recompute the whole grid (startup, terminal resize)."""
+        self.cols, self.rows = cols, rows
+        self.grid = array('H', bytes(2 * cols * rows))
+        self._rects = {}
+        for win in self.windows:
+            self._slot(win)
+            if win.visible:
+                self._rects[win.id] = (win.x, win.y, win.w, win.h)
+        self._refresh((0, 0, cols, rows))
+
+    def update(self, win):
+        """win was added, moved, resized, raised, shown or hidden."""
+        self._slot(win)
+        old = self._rects.pop(win.id, None)
+        new = (win.x, win.y, win.w, win.h) if win.visible else None
+        if new:
+            self._rects[win.id] = new
+            if self.windows and self.windows[-1] is win:
+                # Topmost (the usual case: raised, dragged): owns all of new
+                if old and old != new:
+                    for part in rect_subtract(old, new):
+                        self._refresh(part)
+                self._fill(new, self._slot_of[win.id])
+                return
+        if old and new and rect_intersect(old, new):
+            self._refresh(rect_union(old, new))
+        else:
+            for rect in (old, new):
+                if rect:
+                    self._refresh(rect)
+
+    def remove(self, win):
+        """win was closed."""
+        slot = self._slot_of.pop(win.id, None)
+        if slot is None:
+            return
+        self._slots[slot] = None
+        self._free.append(slot)
+        old = self._rects.pop(win.id, None)
+        if old:
+            self._refresh(old)
+        if self.active is win:
+            self.active = None
+        if self.dragging is win:
+            self.dragging = None
+        if self.resizing is win:
+            self.resizing = None
+
+    def owner_at(self, x, y):
+        """Topmost visible window at (x, y), or None for the desktop."""
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self._slots[self.grid[y * self.cols + x]]
+        return None
+
+    def _fill(self, rect, slot):
+        """Stamp slot over rect (clipped to the grid)."""
+        clip = rect_intersect(rect, (0, 0, self.cols, self.rows))
+        if not clip:
+            return
+        x, y, w, h = clip
+        run = array('H', [slot]) * w
+        cols = self.cols
+        for row in range(y, y + h):
+            start = row * cols + x
+            self.grid[start:start + w] = run
+
+    def _refresh(self, rect):
+        """Recompute owners inside rect, painting windows bottom to top."""
+        self._fill(rect, 0)
+        for win in self.windows:
+            wr = self._rects.get(win.id)
+            if wr:
+                area = rect_intersect(rect, wr)
+                if area:
+                    self._fill(area, self._slot_of[win.id])
+
+
 # ═══════════════════════════════════════════════════════════
 # Main Application
 # ═══════════════════════════════════════════════════════════
@@ -1604,44 +7170,104 @@ def get_system_info():
 class RetroTUI:
     """Main application class."""
 
-    def __init__(self, stdscr):
+    GPM_POLL_SECONDS = 0.03
+
+    def __init__(self, stdscr, trace_path=None, headless=False):
         self.stdscr = stdscr
+        self.headless = headless  # Benchmark stand-in screen: leave the real tty alone
         self.running = True
         self.windows = []
+        # Cell -> window owner grid + active/dragging/resizing windows
+        self.index = WindowIndex(self.windows)
         self.menu = Menu()
         self.dialog = None
         self.selected_icon = -1
         self.use_unicode = check_unicode_support()
         self.icons = ICONS if self.use_unicode else ICONS_ASCII
+        # RETROTUI_DEBUG_DAMAGE=1 outlines every repainted rect
+        self.compositor = Compositor(debug=bool(os.environ.get('RETROTUI_DEBUG_DAMAGE')))
+        # Per-phase frame timing; F12 toggles the overlay
+        self.profiler = FrameProfiler(trace_path or os.environ.get('RETROTUI_TRACE'))
+        self.compositor.profiler = self.profiler
+        # Cached desktop pattern + icons (see desktop_pad)
+        self._desktop_pad = None
+        self._desktop_size = None
+        self._desktop_icon = None
+        self._desktop_revision = 0
+        # Frames are composed in memory, then flushed to stdscr as a diff
+        self.screen = None
+        self.screen_front = None
+        self.new_screen()
 
         # Setup curses
         curses.curs_set(0)
         curses.noecho()
         curses.cbreak()
         stdscr.keypad(True)
-        stdscr.nodelay(False)
-        stdscr.timeout(500)  # 500ms for clock updates
+        stdscr.nodelay(True)  # Input is drained; blocking happens in Scheduler.wait()
+
+        # Event loop: wake on input, timers (clock) and SIGWINCH only
+        self.scheduler = Scheduler()
+        # On the Linux console ncurses reads GPM mouse events from the gpm
+        # socket, which select() on stdin never sees: poll for them
+        self.gpm_poll = (not headless and os.environ.get('TERM', '').startswith('linux')
+                         and os.path.exists('/dev/gpmctl'))
+        # Directory listings shared by File Manager windows (inotify-driven)
+        self.dir_cache = DirectoryCache(self.scheduler)
+        # Directory sizes measured by File Managers, kept between runs
+        self.usage_cache = DiskUsageCache(default_usage_cache_path())
+        # File types and previews (File Manager preview pane, binary check)
+        self.previews = PreviewCache()
+        # Indexes of the archives browsed in File Managers
+        self.archives = ArchiveCache()
+        # Parsed .git/index files, for the File Managers' git markers
+        self.git_indexes = GitIndexCache()
+        # Copy/move/delete jobs running in the background (in the taskbar),
+        # the File Manager clipboard ('copy' or 'move', paths) and the paths
+        # the Delete dialog asks about
+        self.jobs = []
+        self.clipboard = None
+        self._pending_delete = None
+        self._winch = False
+        if not headless:
+            try:
+                signal.signal(signal.SIGWINCH, self._on_sigwinch)
+                signal.set_wakeup_fd(self.scheduler.wake_w)
+            except (ValueError, OSError, AttributeError):
+                pass  # Not the main thread or no SIGWINCH on this platform
+        self._schedule_clock()
+
+        # Input queued but not dispatched yet (held back by the drag frame cap)
+        self._input_queue = []
+        self._last_frame = 0.0
+        # Max frames per second while dragging/resizing (0 = uncapped)
+        try:
+            self.drag_fps = max(0, int(os.environ.get('RETROTUI_DRAG_FPS', '60')))
+        except ValueError:
+            self.drag_fps = 60
 
         # Disable XON/XOFF flow control so Ctrl+Q/Ctrl+S reach the app
-        try:
-            fd = sys.stdin.fileno()
-            attrs = termios.tcgetattr(fd)
-            attrs[0] &= ~termios.IXON   # Disable XON/XOFF output control
-            attrs[0] &= ~termios.IXOFF   # Disable XON/XOFF input control
-            termios.tcsetattr(fd, termios.TCSANOW, attrs)
-        except (termios.error, ValueError, OSError):
-            pass  # Not a real terminal or unsupported
+        if not headless:
+            try:
+                fd = sys.stdin.fileno()
+                attrs = termios.tcgetattr(fd)
+                attrs[0] &= ~termios.IXON   # Disable XON/XOFF output control
+                attrs[0] &= ~termios.IXOFF   # Disable XON/XOFF input control
+                termios.tcsetattr(fd, termios.TCSANOW, attrs)
+            except (termios.error, ValueError, OSError):
+                pass  # Not a real terminal or unsupported
 
         # Enable mouse
         curses.mousemask(
             curses.ALL_MOUSE_EVENTS |
             curses.REPORT_MOUSE_POSITION
         )
-        # Enable SGR extended mouse mode for better coordinate support
-        # Use 1002 (button-event tracking) — reports motion only while button held
-        # This gives us implicit release detection: motion events stop when released
-        print('\033[?1002h', end='', flush=True)  # Button-event tracking (drag)
-        print('\033[?1006h', end='', flush=True)  # SGR extended mode
+        if not headless:
+            # Enable SGR extended mouse mode for better coordinate support
+            # Use 1002 (button-event tracking) — reports motion only while button held
+            # This gives us implicit release detection: motion events stop when released
+            print('\033[?1002h', end='', flush=True)  # Button-event tracking (drag)
+            print('\033[?1006h', end='', flush=True)  # SGR extended mode
 
         init_colors()
 
@@ -1668,27 +7294,68 @@ class RetroTUI:
         ]
         win = Window('Welcome to RetroTUI', w // 2 - 25, h // 2 - 10, 50, 20,
                       content=welcome_content)
-        win.active = True
         self.windows.append(win)
+        self.focus_window(win)
+        self.index.rebuild(w, h)
+
+    def new_screen(self):
+        """(Re)create the back buffer and the copy of what stdscr holds."""
+        h, w = self.stdscr.getmaxyx()
+        self.screen = FrameBuffer(h, w)
+        self.screen_front = FrameBuffer(h, w)  # stdscr starts out blank
 
     def cleanup(self):
         """Restore terminal state."""
-        print('\033[?1002l', end='', flush=True)
-        print('\033[?1006l', end='', flush=True)
+        if not self.headless:
+            print('\033[?1002l', end='', flush=True)
+            print('\033[?1006l', end='', flush=True)
+            try:
+                signal.set_wakeup_fd(-1)
+                signal.signal(signal.SIGWINCH, signal.SIG_DFL)
+            except (ValueError, OSError, AttributeError):
+                pass
+        for win in self.windows:
+            win.close()  # Stops directory loaders
+        for job in self.jobs:
+            job.cancel()  # Removes the file being written
+        for job in self.jobs:
+            job.join(1.0)
+        self.dir_cache.close()
+        self.scheduler.close()
+        self.profiler.close()
+
+    def _schedule_clock(self):
+        """Wake up at the next wall-clock second so the menu bar clock ticks.
+        The compositor repaints only the menu bar (its signature has the time)."""
+        self.scheduler.call_later(1.0 - time.time() % 1.0 + 0.001, self._schedule_clock)
+
+    def _on_sigwinch(self, signum, frame):
+        """SIGWINCH handler: the wakeup fd interrupts select(); just flag it."""
+        self._winch = True
+
+    def _poll_resize(self):
+        """Tell curses about a new terminal size (queues KEY_RESIZE)."""
+        self._winch = False
+        try:
+            cols, lines = os.get_terminal_size(sys.__stdout__.fileno())
+        except (OSError, ValueError):
+            return
+        if curses.is_term_resized(lines, cols):
+            curses.resizeterm(lines, cols)
 
-    def draw_desktop(self):
+    def draw_desktop(self, scr):
         """Draw the desktop background pattern."""
-        h, w = self.stdscr.getmaxyx()
+        h, w = scr.getmaxyx()
         attr = curses.color_pair(C_DESKTOP)
         pattern = DESKTOP_PATTERN
 
         for row in range(1, h - 1):
             line = (pattern * (w // len(pattern) + 1))[:w - 1]
-            safe_addstr(self.stdscr, row, 0, line, attr)
+            safe_addstr(scr, row, 0, line, attr)
 
-    def draw_icons(self):
+    def draw_icons(self, scr):
         """Draw desktop icons (3x4 art + label)."""
-        h, w = self.stdscr.getmaxyx()
+        h, w = scr.getmaxyx()
         start_x = 3
         start_y = 3
         spacing_y = 5  # 3 lines art + 1 label + 1 gap
@@ -1701,37 +7368,139 @@ class RetroTUI:
             attr = curses.color_pair(C_ICON_SEL if is_sel else C_ICON) | curses.A_BOLD
             # Draw 3-line art
             for row, line in enumerate(icon['art']):
-                safe_addstr(self.stdscr, y + row, start_x, line, attr)
+                safe_addstr(scr, y + row, start_x, line, attr)
             # Draw label centered below art
             label = icon['label'].center(len(icon['art'][0]))
-            safe_addstr(self.stdscr, y + 3, start_x, label, attr)
+            safe_addstr(scr, y + 3, start_x, label, attr)
 
-    def draw_taskbar(self):
-        """Draw taskbar row with minimized window buttons."""
+    def invalidate_desktop(self):
+        """Drop the cached desktop layer (terminal resize, theme change)."""
+        self._desktop_pad = None
+        self._desktop_revision += 1
+
+    def desktop_pad(self):
+        """Desktop pattern + icons, rendered once into an off-screen pad.
+        Only the icons are redrawn when the selection changes."""
         h, w = self.stdscr.getmaxyx()
-        taskbar_y = h - 2
-        minimized = [win for win in self.windows if win.minimized]
-        if not minimized:
-            return
-        attr = curses.color_pair(C_TASKBAR)
-        safe_addstr(self.stdscr, taskbar_y, 0, ' ' * (w - 1), attr)
-        x = 1
-        for win in minimized:
-            label = win.title[:15]
-            btn = f'[{label}]'
-            if x + len(btn) >= w - 1:
+        pad = self._desktop_pad
+        if pad is None or self._desktop_size != (h, w):
+            pad = new_pad(h, w)
+            self._desktop_pad = pad
+            self._desktop_size = (h, w)
+            self._desktop_icon = None
+            self.draw_desktop(pad)
+        if self._desktop_icon != self.selected_icon:
+            self.draw_icons(pad)
+            self._desktop_icon = self.selected_icon
+        return pad
+
+    def paint_desktop(self, scr, clip):
+        """Blit the exposed part of the cached desktop into scr."""
+        x, y, w, h = clip
+        try:
+            self.desktop_pad().overwrite(scr, y, x, y, x, y + h - 1, x + w - 1)
+        except curses.error:
+            pass
+
+    def _taskbar_layout(self, w):
+        """Buttons on the taskbar row: (windows, jobs), lists of (item, x,
+        label). Jobs are right-aligned, each ending in its pause (‖, or ▸
+        to resume) and cancel (×) buttons; minimized windows fill from the
+        left up to them."""
+        jobs = []
+        right = w - 1
+        for job in reversed(self.jobs):
+            label = f'[{job.status()[:48]} {"▸" if job.paused else "‖"} ×]'
+            if right - len(label) < 1:
                 break
-            safe_addstr(self.stdscr, taskbar_y, x, btn, attr | curses.A_BOLD)
-            x += len(btn) + 1
+            right -= len(label)
+            jobs.append((job, right, label))
+            right -= 1
+        windows = []
+        x = 1
+        for win in self.windows:
+            if win.minimized:
+                label = f'[{win.title[:15]}]'
+                if x + len(label) >= right:
+                    break
+                windows.append((win, x, label))
+                x += len(label) + 1
+        return windows, jobs
+
+    def draw_taskbar(self, scr):
+        """Draw taskbar row: minimized window buttons and file jobs."""
+        h, w = scr.getmaxyx()
+        windows, jobs = self._taskbar_layout(w)
+        attr = curses.color_pair(C_TASKBAR)
+        safe_addstr(scr, h - 2, 0, ' ' * (w - 1), attr)
+        for _, x, label in windows + jobs:
+            safe_addstr(scr, h - 2, x, label, attr | curses.A_BOLD)
 
-    def draw_statusbar(self):
+    def draw_statusbar(self, scr):
         """Draw the bottom status bar."""
-        h, w = self.stdscr.getmaxyx()
+        h, w = scr.getmaxyx()
         attr = curses.color_pair(C_STATUS)
         visible = sum(1 for win in self.windows if win.visible)
         total = len(self.windows)
         status = f' RetroTUI v0.3.2 │ Windows: {visible}/{total} │ Mouse: Enabled │ Ctrl+Q: Exit'
-        safe_addstr(self.stdscr, h - 1, 0, status.ljust(w - 1), attr)
+        safe_addstr(scr, h - 1, 0, status.ljust(w - 1), attr)
+
+    def build_layers(self):
+        """Describe the current screen as bottom-to-top compositor layers."""
+        h, w = self.stdscr.getmaxyx()
+        layers = [Layer('desktop', [(0, 1, w, h - 2)],
+                        (self.selected_icon, self._desktop_revision), self.paint_desktop)]
+
+        for win in self.windows:
+            if win.visible:
+                layers.append(Layer(('win', win.id), win.screen_rects(), win.render_state(),
+                                    win.paint, f'{type(win).__name__}#{win.id}'))
+
+        menu = self.menu
+        clock = time.strftime('%H:%M:%S')
+        layers.append(Layer('menubar', [(0, 0, w, 1)],
+                            (menu.active, menu.selected_menu, clock),
+                            clipped(lambda scr: menu.draw_bar(scr, w))))
+        if menu.active:
+            layers.append(Layer('dropdown', [menu.get_dropdown_rect()],
+                                (menu.selected_menu, menu.selected_item),
+                                clipped(menu.draw_dropdown)))
+
+        minimized = tuple(win.title for win in self.windows if win.minimized)
+        if minimized or self.jobs:
+            jobs = tuple((job.status(), job.paused) for job in self.jobs)
+            layers.append(Layer('taskbar', [(0, h - 2, w, 1)], (minimized, jobs),
+                                clipped(self.draw_taskbar)))
+        visible = sum(1 for win in self.windows if win.visible)
+        layers.append(Layer('statusbar', [(0, h - 1, w, 1)], (visible, len(self.windows)),
+                            clipped(self.draw_statusbar)))
+
+        if self.dialog:
+            dialog = self.dialog
+            layers.append(Layer('dialog', dialog.screen_rects(w, h),
+                                (id(dialog), dialog.selected),
+                                clipped(dialog.draw)))
+
+        if self.profiler.overlay:
+            text = self.profiler.overlay_text()
+            ox = max(0, w - len(text) - 1)
+            layers.append(Layer('profiler', [(ox, 1, len(text), 1)], text,
+                                clipped(lambda scr: safe_addstr(
+                                    scr, 1, ox, text, curses.color_pair(C_MENU_SEL) | curses.A_BOLD))))
+        return layers
+
+    def render_frame(self):
+        """Repaint damaged screen regions and push them to the terminal."""
+        with self.profiler.phase('layers'):
+            layers = self.build_layers()
+        with self.profiler.phase('compose'):
+            self.compositor.compose(self.screen, layers)
+        with self.profiler.phase('flush'):
+            self.screen.flush(self.stdscr, self.screen_front)
+            self.stdscr.noutrefresh()
+        with self.profiler.phase('doupdate'):
+            curses.doupdate()
+        self._last_frame = time.monotonic()
 
     def get_icon_at(self, mx, my):
         """Return icon index at mouse position, or -1."""
@@ -1746,29 +7515,43 @@ class RetroTUI:
                 return i
         return -1
 
+    def focus_window(self, win):
+        """Give win the keyboard focus without changing the z-order.
+        Only the focused window may keep its window menu open."""
+        prev = self.index.active
+        if prev is not None and prev is not win:
+            prev.active = False
+            if prev.window_menu:
+                prev.window_menu.active = False
+        win.active = True
+        self.index.active = win
+
     def set_active_window(self, win):
         """Set a window as active (bring to front)."""
-        for w in self.windows:
-            w.active = False
-        win.active = True
+        self.focus_window(win)
         # Move to end of list (top of z-order)
-        self.windows.remove(win)
-        self.windows.append(win)
+        if self.windows[-1] is not win:
+            self.windows.remove(win)
+            self.windows.append(win)
+        self.index.update(win)
 
     def close_window(self, win):
         """Close a window."""
+        win.close()
         self.windows.remove(win)
+        self.index.remove(win)
         if self.windows:
-            self.windows[-1].active = True
+            self.focus_window(self.windows[-1])
 
     def execute_action(self, action):
         """Execute a menu/icon action."""
         h, w = self.stdscr.getmaxyx()
 
         if action == 'exit':
+            jobs = f'\n{len(self.jobs)} file operation(s) will be cancelled.' if self.jobs else ''
             self.dialog = Dialog(
                 'Exit RetroTUI',
-                'Are you sure you want to exit?\n\nAll windows will be closed.',
+                f'Are you sure you want to exit?\n\nAll windows will be closed.{jobs}',
                 ['Yes', 'No'],
                 width=44
             )
@@ -1790,14 +7573,32 @@ class RetroTUI:
                    'Enter     - Activate selection\n'
                    'Ctrl+Q    - Exit\n'
                    'F10       - Open menu\n'
+                   'F12       - Frame timing overlay\n'
                    'Arrow keys - Navigate\n'
                    'PgUp/PgDn - Scroll content\n\n'
                    'File Manager:\n\n'
                    'Up/Down   - Move selection\n'
-                   'Enter     - Open dir/file\n'
+                   'Enter     - Open dir/file/archive\n'
                    'Backspace - Parent directory\n'
                    'H         - Toggle hidden files\n'
+                   'D         - Detailed view\n'
+                   'T         - Directory tree (Left: focus it)\n'
+                   'P         - Preview pane\n'
+                   'G         - Git markers (M S ? !)\n'
+                   'F         - Find files below\n'
+                   'U         - Disk usage of subdirs\n'
+                   'Space/Ins - Select (Shift+Up/Down too)\n'
+                   '+ / -     - Select/unselect by glob\n'
+                   '* / ^A    - Invert / select all\n'
+                   'C/X/V     - Copy/cut/paste\n'
+                   'Delete    - Delete (asks first)\n'
+                   '/         - Filter as you type\n'
                    'Home/End  - First/last entry\n\n'
+                   'Find:\n\n'
+                   'Up/Down   - Fields/results\n'
+                   'Enter     - Search / open\n'
+                   'Escape    - Stop search\n'
+                   'Ctrl+R    - Toggle regex\n\n'
                    'Notepad Editor:\n\n'
                    'Arrows    - Move cursor\n'
                    'Home/End  - Start/end of line\n'
@@ -1818,7 +7619,26 @@ class RetroTUI:
         elif action == 'filemanager':
             offset_x = 15 + len(self.windows) * 2
             offset_y = 3 + len(self.windows) * 1
-            win = FileManagerWindow(offset_x, offset_y, 58, 22)
+            win = FileManagerWindow(offset_x, offset_y, 58, 22, scheduler=self.scheduler,
+                                    cache=self.dir_cache, usage_cache=self.usage_cache,
+                                    previews=self.previews, archives=self.archives,
+                                    git_indexes=self.git_indexes)
+            self.windows.append(win)
+            self.set_active_window(win)
+
+        elif action == 'find':
+            # Below the File Manager it was asked from, else home
+            active = self.index.active
+            if isinstance(active, FileManagerWindow):
+                root = active.current_path
+                if active.archive is not None:
+                    root = os.path.dirname(active.archive[0])
+            else:
+                root = os.path.expanduser('~')
+            offset_x = 16 + len(self.windows) * 2
+            offset_y = 3 + len(self.windows) * 1
+            win = FindWindow(offset_x, offset_y, min(70, w - 4), min(22, h - 4), root,
+                             self.scheduler)
             self.windows.append(win)
             self.set_active_window(win)
 
@@ -1932,29 +7752,32 @@ class RetroTUI:
                 self.stdscr.refresh()
             except curses.error:
                 pass
+            self.compositor.damage_all()
 
     def open_file_viewer(self, filepath):
         """Open file in best viewer: ASCII video or Notepad."""
-        h, w = self.stdscr.getmaxyx()
         filename = os.path.basename(filepath)
 
         if is_video_file(filepath):
             self.play_ascii_video(filepath)
             return
 
-        # Check if file seems to be binary
-        try:
-            with open(filepath, 'rb') as f:
-                chunk = f.read(1024)
-                if b'\x00' in chunk:
-                    self.dialog = Dialog('Binary File',
-                        f'{filename}\n\nThis appears to be a binary file\nand cannot be displayed as text.',
-                        ['OK'], width=48)
-                    return
-        except OSError:
-            pass
+        # Check if file seems to be binary (usually known from its preview)
+        preview = self.previews.get(filepath)
+        if preview is not None and preview.is_text is False and stat.S_ISREG(preview.st.st_mode):
+            self._binary_file_dialog(filename, preview.description)
+            return
+
+        self._open_notepad(filepath=filepath)
 
-        # Create NotepadWindow with file
+    def _binary_file_dialog(self, filename, description):
+        self.dialog = Dialog('Binary File',
+            f'{filename}\n\nThis appears to be a binary file\n({description})\nand cannot be displayed as text.',
+            ['OK'], width=48)
+
+    def _open_notepad(self, filepath=None):
+        """Create a NotepadWindow (with file, if given) and focus it."""
+        h, w = self.stdscr.getmaxyx()
         offset_x = 18 + len(self.windows) * 2
         offset_y = 3 + len(self.windows)
         win_w = min(70, w - 4)
@@ -1962,25 +7785,135 @@ class RetroTUI:
         win = NotepadWindow(offset_x, offset_y, win_w, win_h, filepath=filepath)
         self.windows.append(win)
         self.set_active_window(win)
+        return win
+
+    def open_archive_member(self, path):
+        """Show a file inside an archive in Notepad (read-only: it has no
+        path to save to). Only that member is read, decompressed as it
+        streams and at most ARCHIVE_VIEW_BYTES of it, on a worker thread:
+        reaching a member deep in a large .tar.gz takes a while."""
+        archive, inner = split_archive_path(path)
+        try:
+            index = self.archives.index(archive)
+        except ARCHIVE_ERRORS as e:
+            self._on_member_read(path, None, 0, e)
+            return
+
+        def read():
+            data, size, error = None, 0, None
+            try:
+                data, size = index.read(inner, ARCHIVE_VIEW_BYTES)
+            except ARCHIVE_ERRORS as e:
+                error = e
+            self.scheduler.call_soon_threadsafe(lambda: self._on_member_read(path, data, size, error))
+        threading.Thread(target=read, name='archive-member', daemon=True).start()
+
+    def _on_member_read(self, path, data, size, error):
+        name = os.path.basename(path)
+        if error is not None:
+            self.dialog = Dialog('Open Error', f'{name}\n\n{error}', ['OK'], width=50)
+            return
+        description, is_text = sniff_type(data[:PREVIEW_BYTES])
+        if not is_text:
+            self._binary_file_dialog(name, description)
+            return
+        if size > len(data):    # Cut at a line end, then say so
+            data = data[:data.rfind(b'\n') + 1] or data
+        text = data.decode('utf-8', errors='replace')
+        if size > len(data):
+            text += f'… (first {format_size(len(data))} of {format_size(size)})'
+        self._open_notepad().load_text(name, text)
+
+    def start_job(self, op, sources, dest=None):
+        """Start copying/moving sources into dest, or deleting them."""
+        job = FileJob(op, sources, dest, self.scheduler,
+                      self._on_job_progress, self._on_job_done)
+        self.jobs.append(job)
+        return job.start()
+
+    def cancel_job(self, job):
+        job.cancel()
+        self.jobs.remove(job)
+
+    def _on_job_progress(self, job):
+        """Nothing to do: the taskbar layer's state has the new counts."""
+
+    def _on_job_done(self, job):
+        self.jobs.remove(job)
+        error = job.error
+        if error is not None:
+            where = f'\n\n{error.filename}' if error.filename else ''
+            self.dialog = Dialog(f'{FileJob.VERBS[job.op]} Error',
+                                 f'{error.strerror or error}{where}', ['OK'], width=50)
+        if not self.dir_cache.live:
+            for win in self.windows:
+                if isinstance(win, FileManagerWindow):
+                    win.refresh()
+
+    def handle_window_result(self, win, result):
+        """Act on what a window's click or key handler returned."""
+        if not result:
+            return
+        kind = result[0]
+        if kind == 'file':
+            self.open_file_viewer(result[1])
+        elif kind == 'member':
+            self.open_archive_member(result[1])
+        elif kind == 'action':
+            if result[1] == 'close':
+                self.close_window(win)
+            else:
+                self.execute_action(result[1])
+        elif kind == 'save_error':
+            self.dialog = Dialog('Save Error', result[1], ['OK'], width=50)
+        elif kind in ('copy', 'cut'):
+            self.clipboard = ('move' if kind == 'cut' else 'copy', result[1])
+        elif kind == 'paste':
+            if self.clipboard:
+                op, paths = self.clipboard
+                self.start_job(op, paths, result[1])
+                if op == 'move':
+                    self.clipboard = None  # The sources are gone
+        elif kind == 'delete':
+            paths = result[1]
+            what = (os.path.basename(paths[0]) if len(paths) == 1
+                    else f'these {len(paths)} items')
+            self._pending_delete = paths
+            self.dialog = Dialog('Delete', f'Delete {what}?\n\nThis cannot be undone.',
+                                 ['Delete', 'Cancel'], width=50)
+
+    def handle_dialog_choice(self, dialog, button):
+        """Act on the button chosen in dialog (which is then closed)."""
+        if dialog.title == 'Exit RetroTUI' and button == 'Yes':
+            self.running = False
+        elif dialog.title == 'Delete':
+            if button == 'Delete':
+                self.start_job('delete', self._pending_delete)
+            self._pending_delete = None
 
     def handle_taskbar_click(self, mx, my):
         """Handle click on taskbar row. Returns True if handled."""
         h, w = self.stdscr.getmaxyx()
-        taskbar_y = h - 2
-        if my != taskbar_y:
-            return False
-        minimized = [win for win in self.windows if win.minimized]
-        if not minimized:
+        if my != h - 2:
             return False
-        x = 1
-        for win in minimized:
-            label = win.title[:15]
-            btn_w = len(label) + 2  # [label]
-            if x <= mx < x + btn_w:
+        windows, jobs = self._taskbar_layout(w)
+        for win, x, label in windows:
+            if x <= mx < x + len(label):
                 win.toggle_minimize()
                 self.set_active_window(win)
                 return True
-            x += btn_w + 1
+        for job, x, label in jobs:
+            end = x + len(label)
+            if not x <= mx < end:
+                continue
+            if mx == end - 4:
+                if job.paused:
+                    job.resume()
+                else:
+                    job.pause()
+            elif mx == end - 2:
+                self.cancel_job(job)
+            return True
         return False
 
     def handle_mouse(self, event):
@@ -1995,10 +7928,8 @@ class RetroTUI:
             if bstate & (curses.BUTTON1_CLICKED | curses.BUTTON1_PRESSED | curses.BUTTON1_DOUBLE_CLICKED):
                 result = self.dialog.handle_click(mx, my)
                 if result >= 0:
-                    btn_text = self.dialog.buttons[result]
-                    if self.dialog.title == 'Exit RetroTUI' and btn_text == 'Yes':
-                        self.running = False
-                    self.dialog = None
+                    dialog, self.dialog = self.dialog, None
+                    self.handle_dialog_choice(dialog, dialog.buttons[result])
             return
 
         # Menu bar click
@@ -2008,40 +7939,38 @@ class RetroTUI:
                 self.execute_action(action)
             return
 
+        index = self.index
+
         # Window dragging — check FIRST, before menu/window clicks
-        any_dragging = any(w.dragging for w in self.windows)
-        if any_dragging:
+        win = index.dragging
+        if win:
             stop_flags = (curses.BUTTON1_CLICKED | curses.BUTTON1_RELEASED |
                           curses.BUTTON1_DOUBLE_CLICKED)
             if bstate & stop_flags:
-                for win in self.windows:
-                    win.dragging = False
+                win.dragging = False
+                index.dragging = None
                 return
-            for win in self.windows:
-                if win.dragging:
-                    h, w = self.stdscr.getmaxyx()
-                    new_x = mx - win.drag_offset_x
-                    new_y = my - win.drag_offset_y
-                    win.x = max(0, min(new_x, w - win.w))
-                    win.y = max(1, min(new_y, h - win.h - 1))
-                    return
+            h, w = self.stdscr.getmaxyx()
+            new_x = mx - win.drag_offset_x
+            new_y = my - win.drag_offset_y
+            win.x = max(0, min(new_x, w - win.w))
+            win.y = max(1, min(new_y, h - win.h - 1))
+            index.update(win)
             return
 
         # Window resizing — parallel to dragging
-        any_resizing = any(w.resizing for w in self.windows)
-        if any_resizing:
+        win = index.resizing
+        if win:
             stop_flags = (curses.BUTTON1_CLICKED | curses.BUTTON1_RELEASED |
                           curses.BUTTON1_DOUBLE_CLICKED)
             if bstate & stop_flags:
-                for win in self.windows:
-                    win.resizing = False
-                    win.resize_edge = None
+                win.resizing = False
+                win.resize_edge = None
+                index.resizing = None
                 return
-            for win in self.windows:
-                if win.resizing:
-                    h, w = self.stdscr.getmaxyx()
-                    win.apply_resize(mx, my, w, h)
-                    return
+            h, w = self.stdscr.getmaxyx()
+            win.apply_resize(mx, my, w, h)
+            index.update(win)
             return
 
         # Menu dropdown handling (when menu is active)
@@ -2065,13 +7994,23 @@ class RetroTUI:
             if self.handle_taskbar_click(mx, my):
                 return
 
-        # Check windows (reverse z-order for top window first)
-        for win in reversed(self.windows):
-            if not win.visible:
-                continue
+        click_flags = curses.BUTTON1_CLICKED | curses.BUTTON1_PRESSED | curses.BUTTON1_DOUBLE_CLICKED
 
-            click_flags = curses.BUTTON1_CLICKED | curses.BUTTON1_PRESSED | curses.BUTTON1_DOUBLE_CLICKED
+        # Only the active window can have its menu open
+        win = index.active
+        if win and win.visible and win.window_menu and win.window_menu.active:
+            # Window menu hover tracking
+            if bstate & curses.REPORT_MOUSE_POSITION:
+                if win.window_menu.handle_hover(mx, my, win.x, win.y, win.w):
+                    return
+            # Click outside window with active menu — close menu
+            elif not win.contains(mx, my) and (bstate & click_flags):
+                win.window_menu.active = False
+                # Don't return — let click reach the window below
 
+        # Topmost window under the pointer
+        win = index.owner_at(mx, my)
+        if win:
             # Close button [×]
             if win.on_close_button(mx, my) and (bstate & click_flags):
                 self.close_window(win)
@@ -2081,6 +8020,7 @@ class RetroTUI:
             if win.on_minimize_button(mx, my) and (bstate & click_flags):
                 self.set_active_window(win)
                 win.toggle_minimize()
+                index.update(win)
                 # Activate next visible window
                 visible = [w for w in self.windows if w.visible]
                 if visible:
@@ -2092,6 +8032,7 @@ class RetroTUI:
                 self.set_active_window(win)
                 h, w = self.stdscr.getmaxyx()
                 win.toggle_maximize(w, h)
+                index.update(win)
                 return
 
             # Border resize (check before title bar to capture corners)
@@ -2100,6 +8041,7 @@ class RetroTUI:
                 if edge:
                     win.resizing = True
                     win.resize_edge = edge
+                    index.resizing = win
                     self.set_active_window(win)
                     return
 
@@ -2109,10 +8051,12 @@ class RetroTUI:
                     self.set_active_window(win)
                     h, w = self.stdscr.getmaxyx()
                     win.toggle_maximize(w, h)
+                    index.update(win)
                     return
                 elif bstate & curses.BUTTON1_PRESSED:
                     if not win.maximized:
                         win.dragging = True
+                        index.dragging = win
                         win.drag_offset_x = mx - win.x
                         win.drag_offset_y = my - win.y
                     self.set_active_window(win)
@@ -2121,52 +8065,31 @@ class RetroTUI:
                     self.set_active_window(win)
                     return
 
-            # Window menu hover tracking
-            if (bstate & curses.REPORT_MOUSE_POSITION) and win.window_menu and win.window_menu.active:
-                if win.window_menu.handle_hover(mx, my, win.x, win.y, win.w):
-                    return
-
-            # Click outside window with active menu — close menu
-            if win.window_menu and win.window_menu.active and not win.contains(mx, my):
-                if bstate & click_flags:
-                    win.window_menu.active = False
-                    # Don't return — let click propagate to other windows
-
-            if win.contains(mx, my):
-                if bstate & click_flags:
-                    self.set_active_window(win)
-                    # Close other windows' menus when clicking on a different window
-                    for other_win in self.windows:
-                        if other_win is not win and other_win.window_menu and other_win.window_menu.active:
-                            other_win.window_menu.active = False
-                    # Delegate click to window if it has a handler
-                    if hasattr(win, 'handle_click'):
-                        result = win.handle_click(mx, my)
-                        if result and result[0] == 'file':
-                            self.open_file_viewer(result[1])
-                        elif result and result[0] == 'action':
-                            if result[1] == 'close':
-                                self.close_window(win)
-                            else:
-                                self.execute_action(result[1])
-                        elif result and result[0] == 'save_error':
-                            self.dialog = Dialog('Save Error', result[1], ['OK'], width=50)
-                    return
-                # Scroll wheel
-                if bstate & curses.BUTTON4_PRESSED:  # Scroll up
-                    if hasattr(win, 'select_up'):
-                        for _ in range(3):
-                            win.select_up()
-                    else:
-                        win.scroll_up()
-                    return
-                if bstate & 0x200000:  # Scroll down (BUTTON5)
-                    if hasattr(win, 'select_down'):
-                        for _ in range(3):
-                            win.select_down()
-                    else:
-                        win.scroll_down()
-                    return
+            if bstate & click_flags:
+                # Also closes the previous window's menu
+                self.set_active_window(win)
+                # Delegate click to window if it has a handler
+                if hasattr(win, 'handle_click'):
+                    win.invalidate()
+                    self.handle_window_result(win, win.handle_click(mx, my))
+                return
+            # Scroll wheel
+            if bstate & curses.BUTTON4_PRESSED:  # Scroll up
+                win.invalidate()
+                if hasattr(win, 'select_up'):
+                    for _ in range(3):
+                        win.select_up()
+                else:
+                    win.scroll_up()
+                return
+            if bstate & 0x200000:  # Scroll down (BUTTON5)
+                win.invalidate()
+                if hasattr(win, 'select_down'):
+                    for _ in range(3):
+                        win.select_down()
+                else:
+                    win.scroll_down()
+                return
 
         # Desktop icons — check double-click FIRST (bstate includes CLICKED on double-click)
         if bstate & curses.BUTTON1_DOUBLE_CLICKED:
@@ -2191,10 +8114,8 @@ class RetroTUI:
         if self.dialog:
             result = self.dialog.handle_key(key)
             if result >= 0:
-                btn_text = self.dialog.buttons[result]
-                if self.dialog.title == 'Exit RetroTUI' and btn_text == 'Yes':
-                    self.running = False
-                self.dialog = None
+                dialog, self.dialog = self.dialog, None
+                self.handle_dialog_choice(dialog, dialog.buttons[result])
             return
 
         # Global shortcuts
@@ -2202,9 +8123,13 @@ class RetroTUI:
             self.execute_action('exit')
             return
 
+        if key == curses.KEY_F12:  # Frame time / FPS overlay
+            self.profiler.overlay = not self.profiler.overlay
+            return
+
         # F10: window menu (if active window has one) or global menu
         if key == curses.KEY_F10:
-            active_win = next((w for w in self.windows if w.active), None)
+            active_win = self.index.active
             if active_win and active_win.window_menu:
                 wm = active_win.window_menu
                 wm.active = not wm.active
@@ -2220,14 +8145,15 @@ class RetroTUI:
                 self.menu.selected_item = 0
             return
 
-        # Escape: close window menu, then global menu
+        # Escape: close window menu, then global menu, else the active window's
         if key == 27:
-            active_win = next((w for w in self.windows if w.active), None)
+            active_win = self.index.active
             if active_win and active_win.window_menu and active_win.window_menu.active:
                 active_win.window_menu.active = False
+                return
             elif self.menu.active:
                 self.menu.active = False
-            return
+                return
 
         # Menu navigation
         if self.menu.active:
@@ -2260,27 +8186,18 @@ class RetroTUI:
         if key == 9:  # Tab
             visible_windows = [w for w in self.windows if w.visible]
             if visible_windows:
-                current = next((i for i, w in enumerate(visible_windows) if w.active), -1)
+                active = self.index.active
+                current = visible_windows.index(active) if active in visible_windows else -1
                 next_idx = (current + 1) % len(visible_windows)
-                for w in self.windows:
-                    w.active = False
-                visible_windows[next_idx].active = True
+                self.focus_window(visible_windows[next_idx])
             return
 
         # Delegate to active window
-        active_win = next((w for w in self.windows if w.active), None)
+        active_win = self.index.active
         if active_win:
+            active_win.invalidate()
             if hasattr(active_win, 'handle_key'):
-                result = active_win.handle_key(key)
-                if result and result[0] == 'file':
-                    self.open_file_viewer(result[1])
-                elif result and result[0] == 'action':
-                    if result[1] == 'close':
-                        self.close_window(active_win)
-                    else:
-                        self.execute_action(result[1])
-                elif result and result[0] == 'save_error':
-                    self.dialog = Dialog('Save Error', result[1], ['OK'], width=50)
+                self.handle_window_result(active_win, active_win.handle_key(key))
             else:
                 # Default scroll behavior for regular windows
                 if key == curses.KEY_UP or key == curses.KEY_PPAGE:
@@ -2288,76 +8205,351 @@ class RetroTUI:
                 elif key == curses.KEY_DOWN or key == curses.KEY_NPAGE:
                     active_win.scroll_down()
 
+    def handle_resize(self):
+        """Terminal was resized: reclamp windows and repaint everything."""
+        curses.update_lines_cols()
+        self.stdscr.erase()
+        self.new_screen()
+        self.invalidate_desktop()
+        self.compositor.damage_all()
+        # Reclamp windows to new terminal size
+        new_h, new_w = self.stdscr.getmaxyx()
+        for win in self.windows:
+            win.x = max(0, min(win.x, new_w - min(win.w, new_w)))
+            win.y = max(1, min(win.y, new_h - min(win.h, new_h) - 1))
+        self.index.rebuild(new_w, new_h)
+
+    def read_input(self):
+        """Drain every key/mouse event curses has queued, without dispatching."""
+        events = []
+        while True:
+            try:
+                key = self.stdscr.getch()
+            except curses.error:
+                break
+            if key == -1:
+                break
+            elif key == curses.KEY_MOUSE:
+                try:
+                    events.append(('mouse', curses.getmouse()))
+                except curses.error:
+                    pass
+            elif key == curses.KEY_RESIZE:
+                events.append(('resize', None))
+            else:
+                events.append(('key', key))
+        return events
+
+    def dispatch_event(self, event):
+        """Route one event from read_input() to its handler."""
+        kind, data = event
+        if kind == 'mouse':
+            self.handle_mouse(data)
+        elif kind == 'resize':
+            self.handle_resize()
+        else:
+            self.handle_key(data)
+
+    def _frame_hold(self):
+        """Seconds to hold input back while dragging at the frame cap, or 0."""
+        if not self.drag_fps:
+            return 0
+        if not (self.index.dragging or self.index.resizing):
+            return 0
+        return max(0, self._last_frame + 1.0 / self.drag_fps - time.monotonic())
+
     def run(self):
-        """Main event loop."""
+        """Main event loop: draw, sleep until something happens, dispatch."""
+        input_fd = sys.stdin.fileno()
         try:
+            profiler = self.profiler
             while self.running:
-                # Clear and redraw
-                self.stdscr.erase()
-                self.draw_desktop()
-                self.draw_icons()
+                profiler.begin_frame()
+                with profiler.phase('timers'):
+                    self.scheduler.run_due()
+                if self._input_queue and not self._frame_hold():
+                    with profiler.phase('input'):
+                        events = coalesce_events(self._input_queue)
+                        self._input_queue = []
+                        for event in events:
+                            if not self.running:
+                                break
+                            self.dispatch_event(event)
+                if not self._input_queue:
+                    # Repaint only what changed since the last frame
+                    self.render_frame()
+                profiler.end_frame()
+
+                timeout = self.scheduler.timeout()
+                if self.gpm_poll:
+                    timeout = min(self.GPM_POLL_SECONDS, timeout if timeout is not None else 1)
+                if self._input_queue:
+                    hold = self._frame_hold()
+                    timeout = hold if timeout is None else min(timeout, hold)
+                self.scheduler.wait(input_fd, timeout)
+                if self._winch:
+                    self._poll_resize()
+                self._input_queue.extend(self.read_input())
+        finally:
+            self.cleanup()
 
-                # Draw windows
-                for win in self.windows:
-                    win.draw(self.stdscr)
 
-                # Menu bar (on top)
-                h, w = self.stdscr.getmaxyx()
-                self.menu.draw_bar(self.stdscr, w)
-                self.menu.draw_dropdown(self.stdscr)
+# ═══════════════════════════════════════════════════════════
+# Headless Benchmark
+# ═══════════════════════════════════════════════════════════
 
-                # Taskbar (minimized windows)
-                self.draw_taskbar()
+class RenderStats:
+    """Counters for what one benchmark run pushed to the (recording) stdscr."""
+    __slots__ = ('calls', 'cells', 'bytes')
 
-                # Status bar
-                self.draw_statusbar()
+    def __init__(self):
+        self.calls = 0          # addnstr calls reaching stdscr
+        self.cells = 0          # characters written by those calls
+        self.bytes = 0          # UTF-8 size of those characters
 
-                # Dialog on top of everything
-                if self.dialog:
-                    self.dialog.draw(self.stdscr)
 
-                self.stdscr.noutrefresh()
-                curses.doupdate()
+class RecordingScreen:
+    """Stand-in for stdscr that records what flushing a frame costs."""
 
-                # Handle input
-                try:
-                    key = self.stdscr.getch()
-                except curses.error:
-                    continue
+    def __init__(self, h, w, stats):
+        self.h = h
+        self.w = w
+        self.stats = stats
 
-                if key == -1:
-                    continue
-                elif key == curses.KEY_MOUSE:
-                    try:
-                        event = curses.getmouse()
-                        self.handle_mouse(event)
-                    except curses.error:
-                        pass
-                elif key == curses.KEY_RESIZE:
-                    curses.update_lines_cols()
-                    # Reclamp windows to new terminal size
-                    new_h, new_w = self.stdscr.getmaxyx()
-                    for win in self.windows:
-                        win.x = max(0, min(win.x, new_w - min(win.w, new_w)))
-                        win.y = max(1, min(win.y, new_h - min(win.h, new_h) - 1))
-                else:
-                    self.handle_key(key)
+    def getmaxyx(self):
+        return (self.h, self.w)
+
+    def addnstr(self, y, x, text, n, attr=0):
+        if y < 0 or y >= self.h or x < 0 or x >= self.w:
+            raise curses.error('addnstr() returned ERR')
+        text = text[:min(n, self.w - x)]
+        stats = self.stats
+        stats.calls += 1
+        stats.cells += len(text)
+        stats.bytes += len(text.encode('utf-8', 'replace'))
+
+    def getch(self):
+        return -1
+
+    def erase(self):
+        pass
+
+    clear = refresh = noutrefresh = erase
+
+    def keypad(self, flag):
+        pass
+
+    nodelay = keypad
+
+
+class HeadlessCurses:
+    """Context manager that swaps the curses calls RetroTUI makes for no-ops,
+    so the app can run against a RecordingScreen without a terminal."""
+
+    NOOPS = ('curs_set', 'noecho', 'cbreak', 'mousemask', 'start_color',
+             'use_default_colors', 'init_color', 'init_pair', 'doupdate',
+             'update_lines_cols', 'resizeterm', 'def_prog_mode', 'reset_prog_mode')
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.saved = {}
+
+    def __enter__(self):
+        fakes = {name: (lambda *args, **kwargs: None) for name in self.NOOPS}
+        fakes['can_change_color'] = lambda: False
+        fakes['color_pair'] = lambda n: n << 8
+        fakes['is_term_resized'] = lambda lines, cols: False
+        fakes['COLORS'] = 8
+        for name, fake in fakes.items():
+            self.saved[name] = getattr(curses, name, None)
+            setattr(curses, name, fake)
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self.saved.items():
+            setattr(curses, name, original)
+        return False
+
+
+def _bench_drag(app, tmpdir):
+    """Drag a window back and forth across the whole screen."""
+    h, w = app.stdscr.getmaxyx()
+    win = app.windows[-1]
+    yield
+    app.handle_mouse((0, win.x + 2, win.y, 0, curses.BUTTON1_PRESSED))
+    yield
+    for step in range(400):
+        x = (step * 3) % max(1, w - win.w)
+        y = 1 + step % max(1, h - win.h - 2)
+        app.handle_mouse((0, x + 2, y, 0, curses.REPORT_MOUSE_POSITION))
+        yield
+    app.handle_mouse((0, win.x + 2, win.y, 0, curses.BUTTON1_RELEASED))
+    yield
+
+
+def _bench_notepad_scroll(app, tmpdir):
+    """Scroll a 100k-line Notepad buffer line by line and page by page."""
+    h, w = app.stdscr.getmaxyx()
+    win = NotepadWindow(2, 2, w - 4, h - 4)
+    win.buffer = [f'{i:06d} The quick brown fox jumps over the lazy dog.' for i in range(100000)]
+    app.windows.append(win)
+    app.set_active_window(win)
+    yield
+    for _ in range(300):
+        app.handle_key(curses.KEY_DOWN)
+        yield
+    for _ in range(200):
+        app.handle_key(curses.KEY_NPAGE)
+        yield
+
+
+def _bench_filemanager(app, tmpdir):
+    """Open a 50k-entry directory in the File Manager and page through it."""
+    path = os.path.join(tmpdir, 'fm50k')
+    os.mkdir(path)
+    for i in range(50000):
+        os.close(os.open(os.path.join(path, f'file_{i:05d}.txt'), os.O_CREAT | os.O_WRONLY, 0o644))
+    yield
+    h, w = app.stdscr.getmaxyx()
+    win = FileManagerWindow(4, 2, min(80, w - 6), h - 4, start_path=path)
+    app.windows.append(win)
+    app.set_active_window(win)
+    yield
+    for _ in range(200):
+        app.handle_key(curses.KEY_NPAGE)
+        yield
+
+
+def _bench_cycle_windows(app, tmpdir):
+    """Open 50 windows and cycle focus through all of them."""
+    for _ in range(50):
+        app.execute_action('new_window')
+    yield
+    for _ in range(200):
+        app.handle_key(9)  # Tab
+        yield
+
+
+BENCH_SCENARIOS = {
+    'drag': _bench_drag,
+    'notepad-scroll': _bench_notepad_scroll,
+    'filemanager-50k': _bench_filemanager,
+    'cycle-windows': _bench_cycle_windows,
+}
+
+
+def _run_scenario(name, rows, cols, track_alloc=False):
+    """Run one scenario. Each step (input + the frame it triggers) is timed;
+    the code before a scenario's first yield is untimed setup."""
+    stats = RenderStats()
+    frames = 0
+    elapsed = 0.0
+    alloc = 0
+    with HeadlessCurses(stats), tempfile.TemporaryDirectory(prefix='retrotui-bench-') as tmpdir:
+        app = RetroTUI(RecordingScreen(rows, cols, stats), headless=True)
+        try:
+            steps = BENCH_SCENARIOS[name](app, tmpdir)
+            next(steps)
+            app.render_frame()
+            base = [stats.calls, stats.cells, stats.bytes]
+            if track_alloc:
+                tracemalloc.start()
+            while True:
+                if track_alloc:
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                start = time.perf_counter()
+                try:
+                    next(steps)
+                except StopIteration:
+                    break
+                app.render_frame()
+                elapsed += time.perf_counter() - start
+                if track_alloc:
+                    alloc += tracemalloc.get_traced_memory()[1] - before
+                frames += 1
         finally:
-            self.cleanup()
+            if track_alloc:
+                tracemalloc.stop()
+            app.cleanup()
+
+    frames = max(frames, 1)
+    calls, cells, nbytes = (
+        total - first for total, first in zip([stats.calls, stats.cells, stats.bytes], base))
+    return {
+        'scenario': name,
+        'frames': frames,
+        'seconds': round(elapsed, 4),
+        'fps': round(frames / elapsed, 1) if elapsed else 0.0,
+        'calls_per_frame': round(calls / frames, 1),
+        'cells_per_frame': round(cells / frames, 1),
+        'bytes_per_frame': round(nbytes / frames, 1),
+        'alloc_kib_per_frame': round(alloc / frames / 1024, 2) if track_alloc else None,
+    }
+
+
+def run_benchmark(names=None, rows=90, cols=300, json_path=None):
+    """Run headless scenarios and print a report. Returns the result dicts.
+
+    Timing and allocation are measured in separate passes so tracemalloc
+    overhead does not skew the frame rate."""
+    names = names or list(BENCH_SCENARIOS)
+    results = []
+    for name in names:
+        result = _run_scenario(name, rows, cols)
+        if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+            result['alloc_kib_per_frame'] = _run_scenario(
+                name, rows, cols, track_alloc=True)['alloc_kib_per_frame']
+        results.append(result)
+
+    header = (f'{"scenario":<18}{"frames":>7}{"fps":>9}{"calls/f":>9}'
+              f'{"cells/f":>9}{"bytes/f":>9}{"KiB/f":>8}')
+    print(f'RetroTUI headless benchmark — {cols}x{rows}, Python {sys.version.split()[0]}')
+    print(header)
+    print('─' * len(header))
+    for r in results:
+        alloc = '-' if r['alloc_kib_per_frame'] is None else f'{r["alloc_kib_per_frame"]:.1f}'
+        print(f'{r["scenario"]:<18}{r["frames"]:>7}{r["fps"]:>9.1f}{r["calls_per_frame"]:>9.1f}'
+              f'{r["cells_per_frame"]:>9.1f}{r["bytes_per_frame"]:>9.1f}{alloc:>8}')
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows, 'cols': cols, 'python': sys.version.split()[0],
+                       'results': results}, f, indent=2)
+    return results
 
 
 # ═══════════════════════════════════════════════════════════
 # Entry Point
 # ═══════════════════════════════════════════════════════════
 
-def main(stdscr):
-    app = RetroTUI(stdscr)
+def main(stdscr, trace_path=None):
+    app = RetroTUI(stdscr, trace_path=trace_path)
     app.run()
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='RetroTUI — Windows 3.1 style desktop for the Linux console')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write per-phase frame timings as JSON lines (also RETROTUI_TRACE)')
+    parser.add_argument('--bench', nargs='*', metavar='SCENARIO',
+                        choices=sorted(BENCH_SCENARIOS),
+                        help='run headless rendering benchmarks (all if none given) and exit')
+    parser.add_argument('--bench-size', default='300x90', metavar='COLSxROWS',
+                        help='virtual screen size for --bench (default: 300x90)')
+    parser.add_argument('--bench-json', metavar='FILE',
+                        help='also write --bench results as JSON')
+    return parser.parse_args(argv)
+
+
 if __name__ == '__main__':
+    args = parse_args()
+    if args.bench is not None:
+        cols, _, rows = args.bench_size.partition('x')
+        run_benchmark(args.bench, rows=int(rows), cols=int(cols), json_path=args.bench_json)
+        sys.exit(0)
     try:
-        curses.wrapper(main)
+        curses.wrapper(main, args.trace)
     except KeyboardInterrupt:
         pass
     except Exception as e:
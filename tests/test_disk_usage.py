@@ -0,0 +1,57 @@
+"""DiskUsage and its cache between runs."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import retrotui  # noqa: E402
+
+
+class DiskUsageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.cache_path = os.path.join(self.root, 'du.json')
+        self.tree = os.path.join(self.root, 'tree')
+        for top in 'abc':
+            for sub in range(3):
+                os.makedirs(os.path.join(self.tree, top, f'd{sub}'))
+        for n in range(10):
+            path = os.path.join(self.tree, 'c', 'd0', f'f{n}')
+            with open(path, 'wb') as f:
+                f.write(b'x' * 8192)
+            os.link(path, os.path.join(self.tree, 'a', f'l{n}'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def measure(self):
+        cache = retrotui.DiskUsageCache(self.cache_path)
+        sizes = []
+        usage = retrotui.DiskUsage(self.tree, cache, None, lambda *args: None,
+                                   lambda usage, measured: sizes.append(measured))
+        usage.start()
+        return usage, sizes[0], cache
+
+    def test_hard_links_charged_in_path_order(self):
+        first = self.measure()[1]
+        for _ in range(3):
+            self.assertEqual(self.measure()[1], first)
+        self.assertGreater(first['a'], first['c'])
+
+    def test_cache_drops_directories_that_are_gone(self):
+        usage, _, cache = self.measure()
+        self.assertEqual(len(cache.dirs), 13)
+        shutil.rmtree(os.path.join(self.tree, 'b'))
+        usage, _, cache = self.measure()
+        self.assertEqual(len(cache.dirs), 9)
+        usage, _, cache = self.measure()
+        self.assertEqual(usage.cached, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""Git status without git: index, objects and ignore rules, checked
+against the git command where it is installed."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import retrotui  # noqa: E402
+
+
+class Inline:
+    """Scheduler stand-in running callbacks right away."""
+
+    def call_soon_threadsafe(self, callback):
+        callback()
+
+
+def git_status(path):
+    """Markers GitStatus gives to the entries of path, once done."""
+    repo = retrotui.GitRepo.find(path)
+    listing = retrotui.scan_directory(path, True)
+    results = []
+    job = retrotui.GitStatus(repo, path, (listing.dir_names(), listing.file_names()), None,
+                             Inline(), lambda job, markers, done: results.append(markers))
+    job.start()
+    job._thread.join()
+    return results[-1]
+
+
+@unittest.skipUnless(shutil.which('git'), 'git is not installed')
+class GitRepoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tmp.name)
+        self.git('init', '-q')
+        self.git('config', 'user.email', 'test@example.com')
+        self.git('config', 'user.name', 'Test')
+        for path in ('top.txt', 'sub/a.txt', 'sub/deep/b.txt', 'other/c.txt'):
+            self.write(path, path * 3)
+        self.git('add', '.')
+        self.git('commit', '-qm', 'first')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def git(self, *args):
+        return subprocess.run(['git', '-C', self.root, *args], check=True,
+                              capture_output=True).stdout
+
+    def write(self, path, text):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def test_clean_after_stash_and_reset(self):
+        self.write('sub/a.txt', 'changed')
+        self.git('stash', '-q')
+        self.git('stash', 'pop', '-q')
+        self.git('checkout', '--', '.')
+        self.assertEqual(self.git('status', '--porcelain'), b'')
+        self.assertEqual(git_status(self.root), {})
+        self.write('sub/deep/b.txt', 'changed')
+        self.git('add', 'sub')
+        self.git('reset', '-q')
+        self.git('checkout', '--', '.')
+        self.assertEqual(git_status(self.root), {})
+
+    def test_markers(self):
+        self.write('top.txt', 'modified')
+        self.write('sub/deep/b.txt', 'staged')
+        self.git('add', 'sub/deep/b.txt')
+        self.write('new.txt', 'untracked')
+        self.write('.gitignore', '*.log\n')
+        self.write('x.log', 'ignored')
+        self.assertEqual(git_status(self.root), {'top.txt': 'M', 'sub': 'S', 'new.txt': '?',
+                                                 '.gitignore': '?', 'x.log': '!'})
+        self.assertEqual(git_status(os.path.join(self.root, 'sub')), {'deep': 'S'})
+
+    def test_index_versions(self):
+        for version in ('2', '4'):
+            self.git('update-index', '--index-version', version)
+            index = retrotui.GitIndex.read(os.path.join(self.root, '.git', 'index'))
+            listed = [line.split(b'\t')[1] for line in self.git('ls-files', '-s').splitlines()]
+            self.assertEqual(index.paths, listed)
+            self.assertEqual(index.range(b'sub/'), (1, 3))
+
+    def test_packed_objects(self):
+        for n in range(3):
+            self.write('sub/a.txt', 'line\n' * 50 + str(n))
+            self.git('commit', '-qam', f'change {n}')
+        self.git('gc', '-q')
+        repo = retrotui.GitRepo.find(self.root)
+        objects = retrotui.GitObjects(os.path.join(repo.common, 'objects'))
+        try:
+            tree = objects.head_tree(repo.head_commit(), b'sub')
+        finally:
+            objects.close()
+        listed = {}
+        for line in self.git('ls-tree', 'HEAD', 'sub/').splitlines():
+            info, path = line.split(b'\t')
+            mode, _, sha = info.split()
+            listed[path[4:]] = (int(mode, 8), bytes.fromhex(sha.decode()))
+        self.assertEqual(tree, listed)
+
+
+class GitIgnoreTest(unittest.TestCase):
+
+    def match(self, pattern, path):
+        regex, negated, dir_only, anchored = retrotui.GitIgnore._compile(pattern)
+        return bool(regex.match(path if anchored else path.rpartition('/')[2]))
+
+    def test_patterns(self):
+        self.assertTrue(self.match('*.log', 'a/b/x.log'))
+        self.assertFalse(self.match('*.log', 'x.logs'))
+        self.assertTrue(self.match('/build', 'build'))
+        self.assertFalse(self.match('doc/*.txt', 'doc/a/b.txt'))
+        self.assertTrue(self.match('doc/**/b.txt', 'doc/a/c/b.txt'))
+        self.assertTrue(self.match('doc/**/b.txt', 'doc/b.txt'))
+        self.assertTrue(self.match('**/tmp', 'a/tmp'))
+        self.assertTrue(self.match('logs/**', 'logs/a/b'))
+        self.assertTrue(self.match('file[0-9]', 'file7'))
+        self.assertFalse(self.match('file[!0-9]', 'file7'))
+        self.assertTrue(self.match('\\#notes', '#notes'))
+        self.assertIsNone(retrotui.GitIgnore._compile('# comment'))
+        self.assertIsNone(retrotui.GitIgnore._compile('   '))
+
+    def test_rules(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, '.git', 'info'))
+            os.makedirs(os.path.join(root, 'src'))
+            with open(os.path.join(root, '.gitignore'), 'w') as f:
+                f.write('*.log\n!keep.log\nbuild/\n')
+            with open(os.path.join(root, 'src', '.gitignore'), 'w') as f:
+                f.write('gen_*\n')
+            repo = retrotui.GitRepo.find(root)
+            ignore = retrotui.GitIgnore(repo, 'src')
+            self.assertTrue(ignore.ignored('src/x.log', False))
+            self.assertFalse(ignore.ignored('src/keep.log', False))
+            self.assertTrue(ignore.ignored('src/gen_a', False))
+            self.assertTrue(ignore.ignored('src/build', True))
+            self.assertFalse(ignore.ignored('src/build', False))
+            self.assertTrue(retrotui.GitIgnore(repo, 'src/build').everything)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""DirListing regressions (run with python -m unittest or pytest)."""
+
+import fnmatch
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import retrotui  # noqa: E402
+
+
+class MarkedUpdateTest(unittest.TestCase):
+
+    def test_delete_marked_entries_through_update(self):
+        with tempfile.TemporaryDirectory() as path:
+            for i in range(200):
+                open(os.path.join(path, f'f{i}'), 'w').close()
+            listing = retrotui.scan_directory(path)
+            listing.sort()
+            listing.mark_matching(lambda name: fnmatch.fnmatch(name, 'f1*'))
+            listing.mark_matching(lambda name: name == 'f2')
+            gone = {name for name in listing.file_names() if fnmatch.fnmatch(name, 'f1*')}
+            self.assertGreater(len(gone), listing.PATCH_NAMES)
+            for name in gone:
+                os.unlink(os.path.join(path, name))
+            retrotui.DirChanges(path, gone).apply(listing, False)
+            self.assertEqual(listing.count, 200 - len(gone))
+            self.assertEqual(listing.marked_count, 1)
+            self.assertEqual(listing.marked_paths(), [os.path.join(path, 'f2')])
+
+
+class FilteredMarksTest(unittest.TestCase):
+
+    def test_select_all_and_invert_stay_within_the_matches(self):
+        listing = retrotui.DirListing('/x', file_names=['apple', 'banana', 'grape', 'pineapple'],
+                                      file_sizes=[1, 2, 3, 4])
+        listing.sort()
+        view = retrotui.ListingFilter(listing, 'app')
+        view.mark_all()
+        self.assertEqual(listing.marked_paths(), ['/x/apple', '/x/pineapple'])
+        self.assertEqual(listing.marked_bytes, 5)
+        listing.mark(listing.index_of('grape'))
+        view.invert_marks()
+        self.assertEqual(listing.marked_paths(), ['/x/grape'])
+
+
+if __name__ == '__main__':
+    unittest.main()